@@ -123,6 +123,7 @@ def firebase_login(request):
                 
             # Use merge=True to preserve existing fields like is_super_staff
             db.db.collection('users').document(uid).set(user_data, merge=True)
+            db.invalidate_user_profiles(uid)
 
 
         # Check if user has admin permissions and sync with Django
@@ -49,6 +49,7 @@ def login(request, payload: LoginRequest):
             if not existing_profile.get("last_name"):
                 update_data["last_name"] = last_name
             db.db.collection("users").document(uid).set(update_data, merge=True)
+            db.invalidate_user_profiles(uid)
             existing_profile = db.get_user_profile(uid)
 
         profile = UserProfile(
@@ -101,8 +101,9 @@ def blog_list(request, params: Query[BlogListParams]):
 
     # Filter
     if params.search:
-        q = params.search.lower()
-        posts = [p for p in posts if q in p.get("title", "").lower()]
+        # Same ranked index as the web blog list
+        rank = {post_id: i for i, post_id in enumerate(db.search_blogs(params.search))}
+        posts = sorted((p for p in posts if p.get("id") in rank), key=lambda p: rank[p["id"]])
 
     if params.category:
         posts = [
@@ -225,7 +226,7 @@ def add_comment(request, slug: str):
         post = db.get_blog_by_slug(slug)
         if not post:
             return JsonResponse({"error": "Post not found"}, status=404)
-        db.add_blog_comment(uid, post["id"], content)
+        db.add_blog_comment(post["id"], uid, content)
         return {"success": True}
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -94,20 +94,44 @@ def analyze_booking(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@router.post("/transfer-plan/")
+def transfer_plan(request):
+    """
+    Cheapest way to get points into a loyalty program from the user's balances.
+    POST body: {"target_program": "hyatt", "points_needed": 25000}
+    """
+    uid = request.auth
+    try:
+        body = json.loads(request.body)
+        target_program = body.get('target_program', '')
+        try:
+            points_needed = int(body.get('points_needed') or 0)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'points_needed must be a number'}, status=400)
+        if not target_program or points_needed <= 0:
+            return JsonResponse({'error': 'target_program and points_needed are required'}, status=400)
+
+        return StrategyAnalysisService().plan_transfer(uid, target_program, points_needed)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
 @router.get("/strategies/")
 def list_strategies(request):
     """List user's booking strategy history."""
     uid = request.auth
     try:
         strategies = db.get_user_hotel_strategies(uid)
+        statuses = StrategyAnalysisService().get_strategy_statuses(uid, strategies)
         stale_cutoff = datetime.now(timezone.utc) - timedelta(minutes=5)
 
         results = []
         for s in strategies:
-            status = s.get('status', 'unknown')
+            status = statuses[s['id']]
 
-            # Mark stale processing strategies as failed
-            if status == 'processing':
+            # Strategies from before the job queue have no job to consult:
+            # treat long-running ones as failed
+            if status == 'processing' and not s.get('job_id'):
                 created = s.get('created_at')
                 if created and hasattr(created, 'timestamp'):
                     # Firestore DatetimeWithNanoseconds
@@ -148,6 +172,7 @@ def get_strategy(request, strategy_id: str):
             'hotel_count': strategy.get('hotel_count', 0),
             'status': strategy.get('status', 'unknown'),
             'analysis_results': strategy.get('analysis_results', []),
+            'transfer_options': strategy.get('transfer_options', {}),
             'created_at': str(strategy.get('created_at', '')),
         }
     except Exception as e:
@@ -163,7 +188,7 @@ def get_strategy_status(request, strategy_id: str):
         if not strategy:
             return JsonResponse({'error': 'Strategy not found'}, status=404)
 
-        return {'status': strategy.get('status', 'unknown')}
+        return {'status': StrategyAnalysisService().get_strategy_statuses(uid, [strategy])[strategy_id]}
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -4,6 +4,7 @@ from django.conf import settings
 from core.services import db
 from api.auth_middleware import BearerAuth
 from calculators.services import OptimizerService
+from calculators.bundle_solver import clamp_bundle_size
 import json
 import os
 
@@ -368,6 +369,33 @@ def spend_it_calculate(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+def _serialize_bundle(bundle):
+    cards = []
+    for cand in bundle["cards"]:
+        card = cand["card"]
+        cards.append({
+            "slug": cand["slug"],
+            "name": card.get("name", ""),
+            "issuer": card.get("issuer", ""),
+            "annual_fee": cand["annual_fee"],
+            "bonus_display": cand["bonus_text"],
+            "bonus_value": round(cand["bonus_value"], 2),
+            "spend_requirement": f"${int(cand['req_spend']):,} in {int(cand['req_months'])} mo" if cand["req_spend"] else "",
+            "allocated_spend": round(cand["allocated_spend"], 2),
+            "ongoing_rate": f"+${cand['ongoing_rate']:.3f}/$",
+            "net_value": round(cand["net_value"], 2),
+            "match_score": cand.get("match_score", 0),
+        })
+    return {
+        "cards": cards,
+        "net_value": round(bundle["net_value"], 2),
+        "total_spend": round(bundle["total_spend"], 2),
+        "monthly_load": round(bundle["monthly_load"], 2),
+        "gap_to_optimum": round(bundle["gap_to_optimum"], 2),
+        "gap_pct": round(bundle["gap_pct"], 1),
+    }
+
+
 @router.post("/sub-optimizer/calculate/")
 def sub_optimizer_calculate(request):
     """Calculate SUB (Sign-Up Bonus) Optimizer recommendations."""
@@ -377,6 +405,7 @@ def sub_optimizer_calculate(request):
         planned_spend = float(body.get("planned_spend", 4000))
         duration_months = int(body.get("duration_months", 3))
         sort_by = body.get("sort_by", "recommended")
+        mode = body.get("mode", "single")
 
         user_wallet_slugs = set()
         try:
@@ -385,9 +414,25 @@ def sub_optimizer_calculate(request):
         except Exception:
             pass
 
+        if mode == "combo":
+            bundle_size = clamp_bundle_size(body.get("bundle_size"))
+            try:
+                top_n = max(1, min(int(body.get("top_n") or 5), 10))
+            except (TypeError, ValueError):
+                return JsonResponse({"error": "top_n must be a number"}, status=400)
+            bundles = OptimizerService().calculate_bundles(
+                planned_spend=planned_spend,
+                duration_months=duration_months,
+                user_wallet_slugs=user_wallet_slugs,
+                uid=uid,
+                bundle_size=bundle_size,
+                top_n=top_n,
+            )
+            return {"bundles": [_serialize_bundle(b) for b in bundles], "bundle_size": bundle_size}
+
         match_scores = {}
         try:
-            match_scores = db.calculate_match_scores(uid)
+            match_scores = db.get_user_match_scores(uid)
         except Exception:
             pass
 
@@ -39,6 +39,7 @@ def card_list(request, params: Query[CardListParams]):
 
     # Get user wallet cards
     wallet_card_ids = set()
+    user_cards = None
     try:
         user_cards = db.get_user_cards(uid)
         wallet_card_ids = {card["card_id"] for card in user_cards}
@@ -48,10 +49,7 @@ def card_list(request, params: Query[CardListParams]):
     # Get match scores
     user_match_scores = {}
     try:
-        user_personality = db.get_user_assigned_personality(uid)
-        if user_personality:
-            from core.services.personalities import PersonalityMixin
-            user_match_scores = getattr(db, '_cached_match_scores', {})
+        user_match_scores = db.get_user_match_scores(uid, user_cards)
     except Exception:
         pass
 
@@ -173,7 +171,7 @@ def card_detail(request, slug: str):
         uid = request.auth  # BearerAuth returns uid string directly
         if uid:
             try:
-                scores = db.calculate_match_scores(uid)
+                scores = db.get_user_match_scores(uid)
                 card_id = card.get("id") or card.get("slug")
                 match_score = scores.get(card_id)
             except Exception:
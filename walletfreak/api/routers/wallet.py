@@ -12,7 +12,6 @@ from api.schemas.wallet import (
 )
 from api.schemas.common import SuccessResponse, ErrorResponse
 from datetime import datetime, timedelta
-from calendar import monthrange
 from cards.templatetags.card_extras import resolve_card_image_url
 import json
 
@@ -64,12 +63,8 @@ def get_wallet(request):
     total_potential_value = 0
     total_annual_fee = 0
 
-    current_year = datetime.now().year
-    current_month = datetime.now().month
-    months = [
-        "Jan", "Feb", "Mar", "Apr", "May", "Jun",
-        "Jul", "Aug", "Sep", "Oct", "Nov", "Dec",
-    ]
+    # Periods, limits and usage come from the shared benefit-period engine
+    benefit_engine = db.get_benefit_period_engine()
 
     for card in active_cards:
         try:
@@ -86,273 +81,25 @@ def get_wallet(request):
 
             total_annual_fee += card_details.get("annual_fee") or 0
 
-            anniversary_date_str = card.get("anniversary_date", "")
-            anniversary_date = None
-
-            if anniversary_date_str == "default":
-                anniversary_month = 1
-                anniversary_year = current_year - 1
-            elif anniversary_date_str:
-                try:
-                    anniversary_date = datetime.strptime(anniversary_date_str, "%Y-%m-%d")
-                    anniversary_month = anniversary_date.month
-                    anniversary_year = anniversary_date.year
-                except Exception:
-                    anniversary_month = 1
-                    anniversary_year = current_year
-            else:
-                anniversary_month = 1
-                anniversary_year = current_year
-
-            for idx, benefit in enumerate(card_details.get("benefits", [])):
+            for result in benefit_engine.card_benefits(card_details, card):
+                benefit = result["benefit"]
                 benefit_type = benefit.get("benefit_type")
-                if benefit_type in ["Protection", "Bonus", "Perk", "Lounge", "Status", "Insurance"]:
-                    continue
-
-                dollar_value = benefit.get("dollar_value")
-                if not dollar_value or dollar_value <= 0:
-                    continue
-
-                benefit_id = benefit.get("id") or str(idx)
-                frequency = benefit.get("time_category", "Annually (calendar year)")
-                benefit_usage_data = card.get("benefit_usage", {}).get(benefit_id, {})
-
-                periods = []
-                current_period_status = "empty"
-                current_period_used = 0
-                ytd_used = 0
-                period_values = benefit.get("period_values", {})
-
-                if "monthly" in frequency.lower():
-                    for m_idx, m_name in enumerate(months):
-                        period_key = f"{current_year}_{m_idx+1:02d}"
-                        period_max = period_values.get(period_key, dollar_value / 12)
-                        if anniversary_year < current_year:
-                            is_available = (m_idx + 1) <= current_month
-                        else:
-                            is_available = (m_idx + 1) >= anniversary_month and (m_idx + 1) <= current_month
-
-                        p_data = benefit_usage_data.get("periods", {}).get(period_key, {})
-                        p_used = p_data.get("used") or 0
-                        ytd_used += p_used
-                        p_full = p_data.get("is_full", False)
-
-                        status = "full" if (p_full or p_used >= period_max) else ("partial" if p_used > 0 else "empty")
-                        periods.append({
-                            "label": m_name, "key": period_key, "status": status,
-                            "is_current": (m_idx + 1) == current_month,
-                            "max_value": period_max, "is_available": is_available, "used": p_used,
-                        })
-                        if (m_idx + 1) == current_month:
-                            current_period_status = status
-                            current_period_used = p_used
-
-                elif "quarterly" in frequency.lower():
-                    curr_q = (current_month - 1) // 3 + 1
-                    anniversary_q = (anniversary_month - 1) // 3 + 1
-                    for q in range(1, 5):
-                        q_key = f"{current_year}_Q{q}"
-                        q_max = period_values.get(q_key, dollar_value / 4)
-                        if anniversary_year < current_year:
-                            q_available = q <= curr_q
-                        else:
-                            q_available = q >= anniversary_q and q <= curr_q
-                        q_data = benefit_usage_data.get("periods", {}).get(q_key, {})
-                        p_used = q_data.get("used") or 0
-                        ytd_used += p_used
-                        q_status = "full" if (q_data.get("is_full") or p_used >= q_max) else ("partial" if p_used > 0 else "empty")
-                        periods.append({
-                            "label": f"Q{q}", "key": q_key, "status": q_status,
-                            "is_current": q == curr_q, "max_value": q_max,
-                            "is_available": q_available, "used": p_used,
-                        })
-                        if q == curr_q:
-                            current_period_status = q_status
-                            current_period_used = p_used
-
-                elif "semi-annually" in frequency.lower():
-                    h1_key = f"{current_year}_H1"
-                    h2_key = f"{current_year}_H2"
-                    h1_max = period_values.get(h1_key, dollar_value / 2)
-                    h2_max = period_values.get(h2_key, dollar_value / 2)
-
-                    h1_data = benefit_usage_data.get("periods", {}).get(h1_key, {})
-                    h1_status = "full" if (h1_data.get("is_full") or (h1_data.get("used") or 0) >= h1_max) else ("partial" if (h1_data.get("used") or 0) > 0 else "empty")
-                    h1_available = current_month >= 1 if anniversary_year < current_year else (anniversary_month <= 6 and current_month >= 1)
-                    periods.append({"label": "H1", "key": h1_key, "status": h1_status, "is_current": current_month <= 6, "max_value": h1_max, "is_available": h1_available, "used": h1_data.get("used") or 0})
-
-                    h2_data = benefit_usage_data.get("periods", {}).get(h2_key, {})
-                    h2_status = "full" if (h2_data.get("is_full") or (h2_data.get("used") or 0) >= h2_max) else ("partial" if (h2_data.get("used") or 0) > 0 else "empty")
-                    h2_available = current_month >= 7 if anniversary_year < current_year else ((anniversary_month <= 6 and current_month >= 7) or (anniversary_month >= 7 and current_month >= anniversary_month))
-                    periods.append({"label": "H2", "key": h2_key, "status": h2_status, "is_current": current_month > 6, "max_value": h2_max, "is_available": h2_available, "used": h2_data.get("used") or 0})
-
-                    if current_month <= 6:
-                        current_period_status = h1_status
-                        current_period_used = h1_data.get("used") or 0
-                    else:
-                        current_period_status = h2_status
-                        current_period_used = h2_data.get("used") or 0
-                    ytd_used = (h1_data.get("used") or 0) + (h2_data.get("used") or 0)
-
-                elif "every 4 years" in frequency.lower():
-                    # Every 4 years frequency
-                    if anniversary_date:
-                        this_year_anniv = datetime(current_year, anniversary_month, anniversary_date.day)
-                        if datetime.now() < this_year_anniv:
-                            annual_start_year = current_year - 1
-                        else:
-                            annual_start_year = current_year
-                    else:
-                        annual_start_year = current_year
-
-                    base_year = anniversary_year if anniversary_year else 2020
-                    block_idx = (annual_start_year - base_year) // 4
-                    block_start_year = base_year + (block_idx * 4)
-                    block_end_year = block_start_year + 4
-
-                    period_key = f"{block_start_year}_{block_end_year}"
-
-                    if anniversary_date:
-                        reset_date_obj = datetime(block_end_year, anniversary_month, anniversary_date.day)
-                        reset_date_str = reset_date_obj.strftime("%b %d, %Y")
-                    else:
-                        reset_date_str = f"Dec 31, {block_end_year}"
-
-                    p_data = benefit_usage_data.get("periods", {}).get(period_key, {})
-                    p_used = p_data.get("used") or 0
-                    p_full = p_data.get("is_full", False)
-
-                    status = "full" if (p_full or p_used >= dollar_value) else ("partial" if p_used > 0 else "empty")
-                    periods.append({
-                        "label": f"{block_start_year}-{block_end_year}",
-                        "key": period_key, "status": status,
-                        "is_current": True, "max_value": dollar_value, "used": p_used,
-                        "reset_date": reset_date_str,
-                    })
-                    current_period_status = status
-                    current_period_used = p_used
-                    ytd_used = p_used
-
-                else:
-                    # Annual / Anniversary
-                    if "anniversary" in frequency.lower() and anniversary_date:
-                        now_date = datetime.now()
-                        this_year_anniv = datetime(current_year, anniversary_month, anniversary_date.day)
-                        if now_date < this_year_anniv:
-                            start_year = current_year - 1
-                        else:
-                            start_year = current_year
-                        period_key = str(start_year)
-                        end_year = start_year + 1
-                        reset_date_obj = datetime(end_year, anniversary_month, anniversary_date.day)
-                        reset_date_str = reset_date_obj.strftime("%b %d, %Y")
-                    else:
-                        period_key = str(current_year)
-                        reset_date_str = f"Dec 31, {current_year}"
-
-                    p_data = benefit_usage_data.get("periods", {}).get(period_key, {})
-                    p_used = p_data.get("used") or 0
-                    p_full = p_data.get("is_full", False)
-                    status = "full" if (p_full or p_used >= dollar_value) else ("partial" if p_used > 0 else "empty")
-                    periods.append({
-                        "label": str(current_year), "key": period_key, "status": status,
-                        "is_current": True, "max_value": dollar_value, "used": p_used,
-                        "reset_date": reset_date_str,
-                    })
-                    current_period_status = status
-                    current_period_used = p_used
-                    ytd_used = p_used
-
-                # Days until expiration
-                days_until_expiration = None
-                now = datetime.now()
-                if "monthly" in frequency.lower():
-                    last_day = monthrange(current_year, current_month)[1]
-                    period_end = datetime(current_year, current_month, last_day, 23, 59, 59)
-                    days_until_expiration = (period_end - now).days
-                elif "quarterly" in frequency.lower():
-                    curr_q = (current_month - 1) // 3 + 1
-                    qem = curr_q * 3
-                    last_day = monthrange(current_year, qem)[1]
-                    period_end = datetime(current_year, qem, last_day, 23, 59, 59)
-                    days_until_expiration = (period_end - now).days
-                elif "semi-annually" in frequency.lower():
-                    period_end = datetime(current_year, 6, 30, 23, 59, 59) if current_month <= 6 else datetime(current_year, 12, 31, 23, 59, 59)
-                    days_until_expiration = (period_end - now).days
-                else:
-                    period_end = datetime(current_year, 12, 31, 23, 59, 59)
-                    days_until_expiration = (period_end - now).days
-
-                is_ignored = benefit_usage_data.get("is_ignored", False)
-                if is_ignored:
-                    last_updated = benefit_usage_data.get("last_updated")
-                    period_start_date = None
-                    try:
-                        if "monthly" in frequency.lower():
-                            period_start_date = datetime(current_year, current_month, 1)
-                        elif "quarterly" in frequency.lower():
-                            curr_q = (current_month - 1) // 3 + 1
-                            q_start_month = (curr_q - 1) * 3 + 1
-                            period_start_date = datetime(current_year, q_start_month, 1)
-                        elif "semi-annually" in frequency.lower():
-                            h_start_month = 1 if current_month <= 6 else 7
-                            period_start_date = datetime(current_year, h_start_month, 1)
-                        elif "every 4 years" in frequency.lower():
-                            if anniversary_month:
-                                this_year_anniv = datetime(current_year, anniversary_month, anniversary_date.day if anniversary_date_str else 1)
-                                if datetime.now() < this_year_anniv:
-                                    annual_start_year = current_year - 1
-                                else:
-                                    annual_start_year = current_year
-                            else:
-                                annual_start_year = current_year
-                            base_year = anniversary_year if anniversary_year else 2020
-                            block_idx = (annual_start_year - base_year) // 4
-                            block_start_year = base_year + (block_idx * 4)
-                            if anniversary_month:
-                                period_start_date = datetime(block_start_year, anniversary_month, anniversary_date.day if anniversary_date_str else 1)
-                            else:
-                                period_start_date = datetime(block_start_year, 1, 1)
-                        elif "anniversary" in frequency.lower():
-                            if anniversary_month:
-                                this_year_anniv = datetime(current_year, anniversary_month, anniversary_date.day if anniversary_date_str else 1)
-                                if datetime.now() < this_year_anniv:
-                                    p_start_year = current_year - 1
-                                else:
-                                    p_start_year = current_year
-                                period_start_date = datetime(p_start_year, anniversary_month, anniversary_date.day if anniversary_date_str else 1)
-                            else:
-                                period_start_date = datetime(current_year, 1, 1)
-                        else:
-                            period_start_date = datetime(current_year, 1, 1)
-
-                        if period_start_date:
-                            if last_updated:
-                                if hasattr(last_updated, "tzinfo") and last_updated.tzinfo:
-                                    last_updated_naive = last_updated.replace(tzinfo=None)
-                                else:
-                                    last_updated_naive = last_updated
-                                if last_updated_naive < period_start_date:
-                                    is_ignored = False
-                            else:
-                                is_ignored = False
-                    except Exception:
-                        pass
+                is_ignored = result["is_ignored"]
 
                 benefit_obj = {
                     "user_card_id": card["id"],
                     "card_id": card["card_id"],
                     "card_name": card_details["name"],
-                    "benefit_id": benefit_id,
+                    "benefit_id": result["benefit_id"],
                     "benefit_name": benefit["description"],
-                    "amount": dollar_value,
-                    "used": current_period_used,
-                    "periods": periods,
-                    "frequency": frequency,
-                    "current_period_status": current_period_status,
-                    "days_until_expiration": days_until_expiration,
+                    "amount": benefit.get("dollar_value"),
+                    "used": result["used"],
+                    "periods": result["periods"],
+                    "frequency": result["frequency"],
+                    "current_period_status": result["status"],
+                    "days_until_expiration": result["days_until_expiration"],
                     "is_ignored": is_ignored,
-                    "ytd_used": ytd_used,
+                    "ytd_used": result["ytd_used"],
                     "additional_details": benefit.get("additional_details"),
                     "benefit_type": benefit_type,
                     "benefit_main_category": benefit.get("benefit_main_category", ""),
@@ -360,16 +107,16 @@ def get_wallet(request):
 
                 if is_ignored:
                     ignored_benefits.append(benefit_obj)
-                elif current_period_status == "full":
+                elif result["status"] == "full":
                     maxed_out_benefits.append(benefit_obj)
                 else:
                     action_needed_benefits.append(benefit_obj)
 
                 if not is_ignored:
-                    total_potential_value += sum(p.get("max_value", 0) for p in periods)
+                    total_potential_value += result["potential"]
 
                 if (benefit_type == "Credit" or benefit_type == "Perk") and not is_ignored:
-                    total_used_value += ytd_used
+                    total_used_value += result["ytd_used"]
         except Exception:
             continue
 
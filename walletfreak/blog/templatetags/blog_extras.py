@@ -36,3 +36,16 @@ def toggle_url(context, param, value):
         
     query.setlist(param, current_values)
     return query.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def facet_count(context, facet, value):
+    """
+    Number of posts a filter value would match, from the view's facet_counts.
+    Renders nothing when counts are unavailable.
+    Usage: {% facet_count 'vendor' vendor %}
+    """
+    counts = (context.get('facet_counts') or {}).get(facet)
+    if counts is None:
+        return ''
+    return counts.get(value, 0)
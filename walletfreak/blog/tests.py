@@ -1,3 +1,45 @@
 from django.test import TestCase
 
-# Create your tests here.
+
+class BlogListFacetCountTest(TestCase):
+    posts = [
+        {'id': 'p1', 'slug': 'p1', 'title': 'Amex Gold review', 'tags': ['review'], 'vendor': 'amex'},
+        {'id': 'p2', 'slug': 'p2', 'title': 'Chase guide', 'tags': ['guide'], 'vendor': 'chase'},
+        {'id': 'p3', 'slug': 'p3', 'title': 'Amex Platinum guide', 'tags': ['guide'], 'vendor': 'amex'},
+    ]
+
+    def _context(self, query, search_ids=None):
+        from unittest.mock import patch
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from blog.views.public import blog_list
+        from core.services import db
+        from core.services.blog_facets import BlogFacetIndex
+        request = RequestFactory().get('/blog/', query)
+        request.session = {'uid': 'u1'}
+        captured = {}
+
+        def render(request, template, context):
+            captured.update(context)
+            return HttpResponse()
+
+        with patch('blog.views.public.render', side_effect=render), \
+                patch.object(db, 'get_published_blog_facets', return_value=(self.posts, BlogFacetIndex(self.posts))), \
+                patch.object(db, 'get_user_saved_post_ids', return_value=['p1', 'p2']), \
+                patch.object(db, 'search_blogs', return_value=search_ids or []), \
+                patch.object(db, 'get_blogs', return_value=self.posts), \
+                patch.object(db, 'can_manage_blogs', return_value=False), \
+                patch.object(db, 'get_user_notification_preferences', return_value={}), \
+                patch.object(db, 'is_premium', return_value=False):
+            blog_list(request)
+        return captured
+
+    def test_saved_view_counts_only_saved_posts(self):
+        context = self._context({'saved': '1'})
+        self.assertEqual([b['id'] for b in context['blogs']], ['p1', 'p2'])
+        self.assertEqual(context['facet_counts']['vendor'], {'amex': 1, 'chase': 1})
+
+        # With a search, only the saved posts that match it
+        context = self._context({'saved': '1', 'q': 'amex'}, search_ids=['p3', 'p1'])
+        self.assertEqual([b['id'] for b in context['blogs']], ['p1'])
+        self.assertEqual(context['facet_counts']['vendor'], {'amex': 1, 'chase': 0})
@@ -1,4 +1,4 @@
 from .public import blog_list, blog_detail
-from .interactions import add_comment, vote_comment, delete_comment, vote_blog, save_post, unsave_post, subscribe_to_blog
+from .interactions import add_comment, load_comments, load_comment_replies, vote_comment, delete_comment, vote_blog, save_post, unsave_post, subscribe_to_blog
 from .editors import blog_drafts, blog_create, blog_edit, blog_delete, blog_manage_status, blog_quick_status_change
 from .utils import parse_tags_helper
@@ -1,5 +1,6 @@
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_GET, require_POST
 from core.services import db
 
 @require_POST
@@ -33,6 +34,54 @@ def add_comment(request, slug):
     else:
         return JsonResponse({'success': False, 'error': 'Failed to add comment'}, status=500)
 
+def _visible_blog(request, slug):
+    """The post if the current user may read it, else None."""
+    blog = db.get_blog_by_slug(slug)
+    if not blog:
+        return None, False
+    uid = request.session.get('uid')
+    is_editor = bool(uid) and db.can_manage_blogs(uid)
+    if blog.get('status') != 'published' and not is_editor:
+        return None, False
+    return blog, is_editor
+
+def _render_comments(request, comments, is_editor):
+    return ''.join(
+        render_to_string('blog/includes/comment_item.html', {'comment': c, 'is_editor': is_editor}, request=request)
+        for c in comments
+    )
+
+@require_GET
+def load_comments(request, slug):
+    """Next page of comment threads after ?cursor=<comment id>, as rendered HTML"""
+    blog, is_editor = _visible_blog(request, slug)
+    if not blog:
+        return JsonResponse({'success': False, 'error': 'Post not found'}, status=404)
+        
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return JsonResponse({'success': False, 'error': 'Cursor required'}, status=400)
+        
+    page = db.get_blog_comment_page(blog['id'], cursor=cursor)
+    return JsonResponse({
+        'success': True,
+        'html': _render_comments(request, page['comments'], is_editor),
+        'next_cursor': page['next_cursor'],
+    })
+
+@require_GET
+def load_comment_replies(request, slug, comment_id):
+    """A whole comment thread (the comment and all replies), as rendered HTML"""
+    blog, is_editor = _visible_blog(request, slug)
+    if not blog:
+        return JsonResponse({'success': False, 'error': 'Post not found'}, status=404)
+        
+    thread = db.get_comment_thread(blog['id'], comment_id)
+    if not thread:
+        return JsonResponse({'success': False, 'error': 'Comment not found'}, status=404)
+        
+    return JsonResponse({'success': True, 'html': _render_comments(request, [thread], is_editor)})
+
 @require_POST
 def vote_comment(request, slug, comment_id):
     """Vote on a comment"""
@@ -65,8 +114,7 @@ def delete_comment(request, slug, comment_id):
     
     # Verify ownership or permissions
     # Need to fetch comment first to check owner
-    comments = db.get_blog_comments(blog['id'])
-    target_comment = next((c for c in comments if c['id'] == comment_id), None)
+    target_comment = db.get_blog_comment(blog['id'], comment_id)
     
     if not target_comment:
         return JsonResponse({'success': False, 'error': 'Comment not found'}, status=404)
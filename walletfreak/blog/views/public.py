@@ -36,15 +36,17 @@ def blog_list(request):
     # Saved Filter (New General Filter)
     saved_filter = request.GET.get('saved')
     
-    # Default blogs query
+    # Published listing and its facet index (one cached build, positions line up)
+    published_blogs, facet_index = db.get_published_blog_facets()
+    selections = {}
+
     # Default blogs query
     if saved_filter:
         if not uid:
              blogs = []
         else:
              # Pre-filter to only saved posts
-             blogs = db.get_blogs(status='published') 
-             blogs = [b for b in blogs if b.get('id') in user_saved_posts]
+             blogs = [b for b in published_blogs if b.get('id') in user_saved_posts]
     elif category == 'Saved':
         if not uid:
             # If user is not logged in, show empty list
@@ -54,9 +56,6 @@ def blog_list(request):
             saved_posts = db.get_user_saved_posts(uid)
             blogs = saved_posts if saved_posts else []
     else:
-        # Get all published blogs
-        blogs = db.get_blogs(status='published')
-        
         # Apply Filters
         target_tags = []
         if category and category not in ['All', 'Saved', 'Premium']:
@@ -72,69 +71,32 @@ def blog_list(request):
             
         if tag_filters:
             target_tags.extend([t.lower() for t in tag_filters])
-            
-        if target_tags:
-            filtered_blogs = []
-            for b in blogs:
-                tags = b.get('tags')
-                if not tags:
-                    continue
-                
-                blog_tags_list = parse_tags_helper(tags)
-                     
-                # OR logic: if any of the target tags are in blog tags
-                # Use intersection
-                if any(t in blog_tags_list for t in target_tags):
-                     filtered_blogs.append(b)
-            blogs = filtered_blogs
-
-        # 2. Premium Filter
-        if category == 'Premium':
-            blogs = [b for b in blogs if b.get('is_premium')]
 
-        # Apply Multi-select Filters
-        
-        # Ecosystem
-        if ecosystem_filters:
-             blogs = [b for b in blogs if b.get('vendor') in ecosystem_filters]
-            
-        # Experience Level
-        if experience_filters:
-            blogs = [b for b in blogs if b.get('experience_level') in experience_filters]
-            
-        # Read Time
-        if read_time_filters:
-            blogs = [b for b in blogs if b.get('read_time') in read_time_filters]
+        # Values within a facet are ORed (any target tag), facets are ANDed
+        selections = {
+            'tag': target_tags,
+            'premium': [True] if category == 'Premium' else [],
+            'vendor': ecosystem_filters,
+            'experience_level': experience_filters,
+            'read_time': read_time_filters,
+        }
+        blogs = [published_blogs[i] for i in facet_index.select(selections)]
             
-    # Search Filter (applied after all other filters)
-    # Search Filter (applied after all other filters)
+    # Search Filter (applied after all other filters): ranked by the search index
+    search_mask = None
     if search_query and category != 'Saved':
-        query = search_query.lower()
-        filtered_blogs = []
-        for b in blogs:
-            # Check title
-            if query in b.get('title', '').lower():
-                filtered_blogs.append(b)
-                continue
-                
-            # Check excerpt
-            if query in b.get('excerpt', '').lower():
-                filtered_blogs.append(b)
-                continue
-            
-            # Check content
-            if query in b.get('content', '').lower():
-                filtered_blogs.append(b)
-                continue
+        ranked_ids = db.search_blogs(search_query)
+        rank = {post_id: i for i, post_id in enumerate(ranked_ids)}
+        blogs = sorted((b for b in blogs if b.get('id') in rank), key=lambda b: rank[b['id']])
+        search_mask = facet_index.mask_for_ids(ranked_ids)
 
-            # Check tags
-            tags = b.get('tags')
-            if tags:
-                parsed = parse_tags_helper(tags)
-                if any(query in t.lower() for t in parsed):
-                    filtered_blogs.append(b)
-                    continue
-        blogs = filtered_blogs
+    # Per-value counts for the filter chips, given the other active filters
+    # and only over the posts being shown (saved ones, search matches)
+    within = search_mask
+    if saved_filter:
+        saved_mask = facet_index.mask_for_ids(user_saved_posts)
+        within = saved_mask if within is None else within & saved_mask
+    facet_counts = facet_index.counts(selections, within=within) if category != 'Saved' else {}
     
     # Check if user is an editor
     is_editor = False
@@ -145,34 +107,9 @@ def blog_list(request):
     
     # Prepare Data for Sidebar
     
-    # 1. Ecosystem (Vendors)
-    # Check cache first
-    unique_vendors = cache.get('blog_sidebar_vendors')
-    sorted_tags = cache.get('blog_sidebar_tags')
-    
-    if not unique_vendors or not sorted_tags:
-        # Get all vendors actually used in published blogs
-        unique_vendors_set = set()
-        all_tags_set = set()
-        
-        all_published_blogs_filter = db.get_blogs(status='published')
-        for b in all_published_blogs_filter:
-            v = b.get('vendor')
-            if v:
-                unique_vendors_set.add(v)
-                
-            t = b.get('tags')
-            if t:
-                # Use the helper to get clean tags
-                parsed = parse_tags_helper(t)
-                for tag in parsed:
-                    all_tags_set.add(tag)
-                    
-        unique_vendors = sorted(list(unique_vendors_set))
-        sorted_tags = sorted(list(all_tags_set))
-        
-        cache.set('blog_sidebar_vendors', unique_vendors, 60 * 60) # 1 hour
-        cache.set('blog_sidebar_tags', sorted_tags, 60 * 60) # 1 hour
+    # 1. Ecosystem (Vendors) and 2. Tags actually used in published blogs
+    unique_vendors = facet_index.values('vendor')
+    sorted_tags = facet_index.values('tag')
     
     # 3. Static Choices
     experience_levels = [
@@ -296,6 +233,7 @@ def blog_list(request):
         'now': datetime.now(),
 
         'is_subscribed': is_subscribed,
+        'facet_counts': facet_counts,
         'user_is_premium': user_is_premium,
         # Sidebar Context
         'ecosystem_vendors': unique_vendors,
@@ -383,47 +321,15 @@ def blog_detail(request, slug):
     if uid:
         user_vote = db.get_user_vote_on_blog(uid, blog_id)
     
-    # Get related posts (other published posts, excluding current one)
-    related_posts = cache.get(f'blog_related_{blog_id}')
-    if not related_posts:
-        related_posts = []
-        all_published = db.get_blogs(status='published')
-        for post in all_published:
-            if post.get('id') != blog_id:
-                related_posts.append(post)
-        
-        # Limit to 3 related posts
-        related_posts = related_posts[:3]
-        
-        # Cache for 1 hour
-        cache.set(f'blog_related_{blog_id}', related_posts, 60 * 60)
+    # Related posts are ranked by similarity when the listing is rebuilt
+    related_posts = db.get_related_blogs(blog_id)
     
     # Increment view count
     db.increment_blog_view_count(blog_id)
     
-    # Get comments
-    raw_comments = db.get_blog_comments(blog_id)
-    
-    # Process comments into a tree structure
-    comments_map = {c['id']: {**c, 'replies': []} for c in raw_comments}
-    root_comments = []
+    # First page of comment threads, from the post's comment summary
+    comment_page = db.get_blog_comment_page(blog_id)
     
-    for c in raw_comments:
-        comment_id = c['id']
-        parent_id = c.get('parent_id')
-        
-        # Add basic time info if not present (it should be though)
-        if 'created_at' not in c:
-             c['created_at'] = datetime.now()
-
-        if parent_id and parent_id in comments_map:
-            comments_map[parent_id]['replies'].append(comments_map[comment_id])
-        else:
-            root_comments.append(comments_map[comment_id])
-            
-    # Count total comments
-    total_comments = len(raw_comments)
-
     return render(request, 'blog/blog_detail.html', {
         'blog': blog,
         'is_editor': is_editor,
@@ -431,8 +337,8 @@ def blog_detail(request, slug):
         'user_vote': user_vote,
         'is_authenticated': bool(uid),
         'related_posts': related_posts,
-        'comments': root_comments,
-        'comments': root_comments,
-        'total_comments': total_comments,
+        'comments': comment_page['comments'],
+        'total_comments': comment_page['total'],
+        'comments_next_cursor': comment_page['next_cursor'],
         'locked': locked
     })
@@ -10,6 +10,7 @@ Uses geo-distance + name similarity for matching since Google Places IDs
 don't correspond to these program lists.
 """
 
+import heapq
 import json
 import os
 import math
@@ -22,6 +23,9 @@ DATA_DIR = os.path.join(settings.BASE_DIR, 'walletfreak_data')
 # Max distance (km) for geo-match candidates
 GEO_MATCH_RADIUS_KM = 2.0
 
+# Name-only matching scores this many top IDF candidates by plain word overlap
+NAME_SHORTLIST_SIZE = 10
+
 
 def _haversine_km(lat1, lon1, lat2, lon2):
     """Distance between two lat/lng points in km."""
@@ -45,14 +49,21 @@ def _normalize_name(name):
     return ' '.join(name.split())
 
 
-def _name_similarity(name1, name2):
-    """Simple word-overlap similarity score (0-1)."""
-    words1 = set(_normalize_name(name1).split())
-    words2 = set(_normalize_name(name2).split())
+def _name_words(name):
+    """Normalized name as a set of words."""
+    return frozenset(_normalize_name(name or '').split())
+
+
+def _words_similarity(words1, words2):
+    """Word-overlap similarity of two normalized word sets (0-1)."""
     if not words1 or not words2:
         return 0
-    intersection = words1 & words2
-    return len(intersection) / min(len(words1), len(words2))
+    return len(words1 & words2) / min(len(words1), len(words2))
+
+
+def _name_similarity(name1, name2):
+    """Simple word-overlap similarity score (0-1)."""
+    return _words_similarity(_name_words(name1), _name_words(name2))
 
 
 def _load_json_file(filename):
@@ -83,6 +94,182 @@ def get_premium_programs_data():
     return data
 
 
+# (program key in the data files, result key, result builder)
+PROGRAMS = (
+    ('fhr', 'amex_fhr', lambda m: {
+        'matched': True,
+        'name': m.get('name', ''),
+        'credit': m.get('credit', ''),
+        'early_checkin': m.get('early_checkin', ''),
+        'free_breakfast': m.get('free_breakfast', ''),
+        'late_checkout': m.get('late_checkout', ''),
+        'room_upgrade': m.get('room_upgrade', ''),
+    }),
+    ('thc', 'amex_thc', lambda m: {
+        'matched': True,
+        'name': m.get('name', ''),
+        'credit': m.get('credit', ''),
+    }),
+    ('chase_edit', 'chase_edit', lambda m: {
+        'matched': True,
+        'name': m.get('name', ''),
+        'brand': m.get('brand', ''),
+        'chase_2026_credit': m.get('chase_2026_credit', '') == 'TRUE',
+        'michelin_keys': m.get('michelin_keys', ''),
+    }),
+)
+
+# Grid cell edge in degrees of latitude; one cell spans the match radius
+_KM_PER_DEG_LAT = 111.2
+_CELL_DEG = GEO_MATCH_RADIUS_KM / _KM_PER_DEG_LAT
+_LNG_CELLS = int(math.ceil(360 / _CELL_DEG))
+
+
+class ProgramHotelIndex:
+    """
+    One program's hotel list, indexed for matching.
+
+    Hotels are bucketed into a lat/lng grid whose cells are one match radius
+    tall, so a radius query only checks the few cells around the point, and
+    each hotel's normalized name words are computed once up front.
+
+    For name-only matching there is also an inverted index from name word to
+    hotels, with IDF weights so words shared by many hotels ("grand", "park")
+    count for little. Only hotels sharing a word with the query are scored.
+    """
+
+    def __init__(self, hotels, geo_key_lat='latitude', geo_key_lng='longitude'):
+        self.hotels = list(hotels)
+        self.words = [_name_words(h.get('name', '')) for h in self.hotels]
+        self.coords = []
+        self.cells = {}
+        for i, h in enumerate(self.hotels):
+            coord = None
+            h_lat, h_lng = h.get(geo_key_lat), h.get(geo_key_lng)
+            if h_lat is not None and h_lng is not None:
+                try:
+                    coord = (float(h_lat), float(h_lng))
+                except (ValueError, TypeError):
+                    coord = None
+            self.coords.append(coord)
+            if coord is not None:
+                self.cells.setdefault(self._cell(*coord), []).append(i)
+
+        self.postings = {}
+        for i, words in enumerate(self.words):
+            for word in words:
+                self.postings.setdefault(word, []).append(i)
+        n = len(self.hotels)
+        self.idf = {word: math.log((n + 1) / (len(ids) + 1)) + 1 for word, ids in self.postings.items()}
+        # Weight of a word no hotel has: as rare as it gets
+        self.unseen_idf = math.log(n + 1) + 1
+        self.weights = [sum(self.idf[w] for w in words) for words in self.words]
+
+    @staticmethod
+    def _cell(lat, lng):
+        return (int(math.floor(lat / _CELL_DEG)), int(math.floor(lng / _CELL_DEG)) % _LNG_CELLS)
+
+    def nearby(self, lat, lng, radius_km=GEO_MATCH_RADIUS_KM):
+        """Indices of hotels within radius_km of (lat, lng), in list order."""
+        lat_span = int(math.ceil(radius_km / _KM_PER_DEG_LAT / _CELL_DEG))
+        # Longitude degrees shrink with latitude; near the poles scan every column
+        cos_lat = math.cos(math.radians(min(89.0, abs(lat) + lat_span * _CELL_DEG)))
+        lng_span = min(_LNG_CELLS // 2, int(math.ceil(radius_km / (_KM_PER_DEG_LAT * cos_lat) / _CELL_DEG)))
+        row, col = self._cell(lat, lng)
+
+        found = []
+        for r in range(row - lat_span, row + lat_span + 1):
+            for c in range(col - lng_span, col + lng_span + 1):
+                for i in self.cells.get((r, c % _LNG_CELLS), ()):
+                    h_lat, h_lng = self.coords[i]
+                    if _haversine_km(lat, lng, h_lat, h_lng) <= radius_km:
+                        found.append(i)
+        found.sort()
+        return found
+
+    def search(self, hotel_words, k=5):
+        """
+        Top-k hotels by IDF-weighted word overlap with `hotel_words`, as
+        (hotel, score) pairs, best first. The score is the shared words' weight
+        over the lighter of the two names' weights (0-1).
+        """
+        return [(self.hotels[i], score) for i, score in self._search(hotel_words, k)]
+
+    def _search(self, hotel_words, k):
+        query_weight = sum(self.idf.get(w, self.unseen_idf) for w in hotel_words)
+        if not query_weight:
+            return []
+        shared = {}
+        for word in hotel_words:
+            weight = self.idf.get(word)
+            if weight is None:
+                continue
+            for i in self.postings[word]:
+                shared[i] = shared.get(i, 0.0) + weight
+
+        scored = (
+            (shared_weight / min(query_weight, self.weights[i]),
+             shared_weight / max(query_weight, self.weights[i]),
+             i)
+            for i, shared_weight in shared.items()
+        )
+        # Equal scores (e.g. "Crown Towers" vs "Crown Towers Perth" for a
+        # "Crown Towers Perth" query) go to the closer overall name
+        top = heapq.nsmallest(k, scored, key=lambda item: (-item[0], -item[1], item[2]))
+        return [(i, score) for score, _closeness, i in top]
+
+    def best_match(self, hotel_words, hotel_lat=None, hotel_lng=None):
+        """
+        Best hotel for a search result, or None below the threshold.
+
+        With coordinates: plain word overlap among hotels within the match
+        radius (threshold 0.6). Without: the same plain word overlap (threshold
+        0.5), scored only on the IDF index's top candidates; equal overlaps go
+        to the better IDF match.
+        """
+        if not self.hotels:
+            return None
+        if hotel_lat is None or hotel_lng is None:
+            best_match = None
+            best_score = 0
+            for i, _weighted in self._search(hotel_words, NAME_SHORTLIST_SIZE):
+                score = _words_similarity(hotel_words, self.words[i])
+                if score > best_score:
+                    best_score = score
+                    best_match = self.hotels[i]
+            # Lat present but no lng keeps the stricter geo threshold
+            threshold = 0.5 if hotel_lat is None else 0.6
+            if best_score >= threshold:
+                return best_match
+            return None
+
+        try:
+            candidates = self.nearby(float(hotel_lat), float(hotel_lng))
+        except (ValueError, TypeError):
+            candidates = []
+
+        best_match = None
+        best_score = 0
+        for i in candidates:
+            score = _words_similarity(hotel_words, self.words[i])
+            if score > best_score:
+                best_score = score
+                best_match = self.hotels[i]
+
+        # When we used geo-filtering, require higher name similarity
+        # since multiple luxury hotels can be within 2km in cities
+        if best_score >= 0.6:
+            return best_match
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_premium_index():
+    """Per-process {program key: ProgramHotelIndex}, built once from the JSON files."""
+    programs = get_premium_programs_data()
+    return {key: ProgramHotelIndex(programs.get(key) or []) for key, _result_key, _build in PROGRAMS}
+
+
 def match_hotel_to_programs(hotel_name, hotel_lat=None, hotel_lng=None):
     """
     Match a hotel from search results against premium program lists.
@@ -94,85 +281,32 @@ def match_hotel_to_programs(hotel_name, hotel_lat=None, hotel_lng=None):
         'chase_edit': {'matched': True, 'chase_2026_credit': True, 'brand': '...'},
     }
     """
-    programs = get_premium_programs_data()
-    result = {
-        'amex_fhr': None,
-        'amex_thc': None,
-        'chase_edit': None,
-    }
-
-    # Match against FHR
-    match = _find_best_match(hotel_name, hotel_lat, hotel_lng, programs['fhr'], geo_key_lat='latitude', geo_key_lng='longitude')
-    if match:
-        result['amex_fhr'] = {
-            'matched': True,
-            'name': match.get('name', ''),
-            'credit': match.get('credit', ''),
-            'early_checkin': match.get('early_checkin', ''),
-            'free_breakfast': match.get('free_breakfast', ''),
-            'late_checkout': match.get('late_checkout', ''),
-            'room_upgrade': match.get('room_upgrade', ''),
-        }
-
-    # Match against THC
-    match = _find_best_match(hotel_name, hotel_lat, hotel_lng, programs['thc'], geo_key_lat='latitude', geo_key_lng='longitude')
-    if match:
-        result['amex_thc'] = {
-            'matched': True,
-            'name': match.get('name', ''),
-            'credit': match.get('credit', ''),
-        }
-
-    # Match against Chase Edit
-    match = _find_best_match(hotel_name, hotel_lat, hotel_lng, programs['chase_edit'], geo_key_lat='latitude', geo_key_lng='longitude')
-    if match:
-        result['chase_edit'] = {
-            'matched': True,
-            'name': match.get('name', ''),
-            'brand': match.get('brand', ''),
-            'chase_2026_credit': match.get('chase_2026_credit', '') == 'TRUE',
-            'michelin_keys': match.get('michelin_keys', ''),
-        }
-
+    index = get_premium_index()
+    words = _name_words(hotel_name)
+    result = {}
+    for key, result_key, build in PROGRAMS:
+        match = index[key].best_match(words, hotel_lat, hotel_lng)
+        result[result_key] = build(match) if match else None
     return result
 
 
-def _find_best_match(hotel_name, hotel_lat, hotel_lng, program_hotels, geo_key_lat='latitude', geo_key_lng='longitude'):
-    """
-    Find the best matching hotel in a program list using geo + name similarity.
+def match_hotels_to_programs(hotels):
     """
-    if not program_hotels:
-        return None
+    Batch form of match_hotel_to_programs for a whole result list.
 
-    best_match = None
-    best_score = 0
+    Args:
+        hotels: iterable of (name, lat, lng) tuples; lat/lng may be None.
+
+    Returns:
+        List of match dicts in the same order. Repeated hotels are matched once.
+    """
+    seen = {}
+    results = []
+    for name, lat, lng in hotels:
+        key = (name, lat, lng)
+        if key not in seen:
+            seen[key] = match_hotel_to_programs(name, lat, lng)
+        # Each hotel gets its own copy; callers attach these to separate rows
+        results.append({k: dict(v) if v else None for k, v in seen[key].items()})
+    return results
 
-    # If we have coordinates, filter by geo first
-    candidates = program_hotels
-    if hotel_lat is not None and hotel_lng is not None:
-        candidates = []
-        for h in program_hotels:
-            h_lat = h.get(geo_key_lat)
-            h_lng = h.get(geo_key_lng)
-            if h_lat is not None and h_lng is not None:
-                try:
-                    dist = _haversine_km(hotel_lat, hotel_lng, float(h_lat), float(h_lng))
-                    if dist <= GEO_MATCH_RADIUS_KM:
-                        candidates.append(h)
-                except (ValueError, TypeError):
-                    continue
-
-    # Score candidates by name similarity
-    for candidate in candidates:
-        score = _name_similarity(hotel_name, candidate.get('name', ''))
-        if score > best_score:
-            best_score = score
-            best_match = candidate
-
-    # When we used geo-filtering, require higher name similarity
-    # since multiple luxury hotels can be within 2km in cities
-    threshold = 0.5 if hotel_lat is None else 0.6
-    if best_score >= threshold:
-        return best_match
-
-    return None
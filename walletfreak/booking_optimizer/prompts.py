@@ -32,7 +32,7 @@ Some hotels have `premium_programs` with `amex_fhr`, `amex_thc`, and/or `chase_e
 **Loyalty Program Balances:**
 {loyalty_balances_json}
 
-**Transfer Rules (Credit Card → Hotel Loyalty):**
+**Transfer Routes (Hotel Loyalty ← Credit Card; ratio includes active bonuses, max_points is what the user's balances can transfer):**
 {transfer_rules_json}
 
 **Point Valuations (cents per point):**
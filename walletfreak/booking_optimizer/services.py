@@ -1,12 +1,17 @@
+import copy
 import json
 import os
 import csv
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
 import requests
 from django.conf import settings
 from django.core.cache import cache
 from core.services import db
 from core.services.google_places_service import GooglePlacesService
-from .premium_programs import match_hotel_to_programs
+from .premium_programs import match_hotels_to_programs
 
 DATA_DIR = os.path.join(settings.BASE_DIR, 'walletfreak_data')
 
@@ -66,6 +71,77 @@ PRICE_LEVEL_MAP = {
 }
 
 
+# Long-lived copy of each search result, served while a refresh runs
+STALE_SUFFIX = ':stale'
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key onto one execution, so a
+    burst of identical searches makes a single upstream request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Run fn() unless a call for `key` is already running, in which case
+        wait for that one. Returns (result, shared); shared is True for
+        callers that received another call's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result(), True
+        return self._run(key, call, fn), False
+
+    def start(self, key, fn, executor):
+        """
+        Run fn() on `executor` unless a call for `key` is already running.
+        Claiming the key and submitting happen together, so concurrent
+        callers start at most one run. Returns True if this call started it.
+        """
+        with self._lock:
+            if key in self._calls:
+                return False
+            call = self._calls[key] = Future()
+        try:
+            executor.submit(self._run, key, call, fn)
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.set_exception(e)
+            raise
+        return True
+
+    def _run(self, key, call, fn):
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        call.set_result(result)
+        return result
+
+
+_search_flights = SingleFlight()
+# SerpApi/Firestore fan-out. Refreshes get their own pool because they wait
+# on fan-out tasks and must not be able to exhaust it.
+_search_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'HOTEL_SEARCH_WORKERS', 8),
+    thread_name_prefix='hotel-search',
+)
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='hotel-refresh')
+
+
 class HotelSearchService:
     def __init__(self):
         self.places_service = GooglePlacesService()
@@ -121,9 +197,11 @@ class HotelSearchService:
         falling back to Firestore cache, then Google Places.
 
         Flow:
-        1. Try SerpApi → on success, save observations + fallback cache, return with price_history
-        2. SerpApi fails → read Firestore fallback cache → return with 'cached' flag
-        3. No cache → try Google Places (no prices)
+        1. Fresh in-memory result → return it
+        2. Stale in-memory result → return it, marked as cached, and refresh
+           in the background (one refresh per key)
+        3. Otherwise run the upstream search once per key, however many
+           requests ask for it concurrently (see _fetch_hotels)
         """
         # Short-lived in-memory cache to avoid re-hitting SerpApi on page refreshes
         src = 'serp' if get_serpapi_key() else 'places'
@@ -132,63 +210,126 @@ class HotelSearchService:
         if cached_data:
             return cached_data
 
+        args = (cache_key, location_query, check_in_raw, check_out_raw, guests)
+        stale = cache.get(cache_key + STALE_SUFFIX)
+        if stale:
+            _search_flights.start(cache_key, lambda: self._fetch_hotels(*args), _refresh_executor)
+            hotels = copy.deepcopy(stale['hotels'])
+            # Marked like Firestore cache hits; those keep their own timestamp
+            for h in hotels:
+                if not h.get('is_cached'):
+                    h['is_cached'] = True
+                    h['cached_at'] = stale['cached_at']
+            return hotels
+
+        hotels, shared = _search_flights.do(cache_key, lambda: self._fetch_hotels(*args))
+        # Coalesced callers get their own copy of the leader's list
+        return copy.deepcopy(hotels) if shared else hotels
+
+    def _fetch_hotels(self, cache_key, location_query, check_in_raw, check_out_raw, guests):
+        """
+        One upstream search. SerpApi and the Firestore fallback cache are
+        queried concurrently; if SerpApi misses the deadline and a cached
+        result exists, that is returned and SerpApi finishes in the background,
+        saving its result for the next request.
+        """
         hotels = []
-        source = None
-
-        # 1. Try SerpApi Google Hotels first (has prices + images)
-        if get_serpapi_key() and check_in_raw and check_out_raw:
-            hotels = self._search_via_serpapi(location_query, check_in_raw, check_out_raw, guests)
-            if hotels:
-                source = 'serpapi'
-
-        # 2. SerpApi failed → try Firestore fallback cache
-        if not hotels and check_in_raw and check_out_raw:
+        dated = bool(check_in_raw and check_out_raw)
+
+        if get_serpapi_key() and dated:
+            serp_future = _search_executor.submit(
+                self._search_via_serpapi, location_query, check_in_raw, check_out_raw, guests
+            )
+            cached_future = _search_executor.submit(
+                self._read_cached_search, location_query, check_in_raw, check_out_raw, guests
+            )
+            deadline = getattr(settings, 'HOTEL_SEARCH_DEADLINE_SECONDS', 6)
             try:
-                cached_hotels, fetched_at = db.get_cached_hotel_search(
-                    location_query, check_in_raw, check_out_raw, guests
-                )
+                hotels = serp_future.result(timeout=deadline)
+            except FutureTimeout:
+                cached_hotels = cached_future.result()
                 if cached_hotels:
-                    # Mark each hotel as cached with timestamp
-                    for h in cached_hotels:
-                        h['is_cached'] = True
-                        h['cached_at'] = str(fetched_at) if fetched_at else ''
-                    hotels = cached_hotels
-                    source = 'cache'
-            except Exception as e:
-                print(f"Firestore cache read error: {e}")
-
-        # 3. Still nothing → try Google Places (no prices)
+                    serp_future.add_done_callback(
+                        lambda f: self._finish_late_serpapi(f, cache_key, location_query, check_in_raw, check_out_raw, guests)
+                    )
+                    return cached_hotels
+                hotels = serp_future.result()
+
+            if hotels:
+                self._save_serpapi_results(hotels, location_query, check_in_raw, check_out_raw, guests)
+            else:
+                # SerpApi failed → use the Firestore fallback cache
+                hotels = cached_future.result()
+        elif dated:
+            hotels = self._read_cached_search(location_query, check_in_raw, check_out_raw, guests)
+
+        # Still nothing → try Google Places (no prices)
         if not hotels:
             hotels = self._search_via_places(location_query)
-            if hotels:
-                source = 'places'
-
-        # Post-processing for SerpApi results: save to Firestore
-        if source == 'serpapi' and check_in_raw and check_out_raw:
-            try:
-                # Save daily rate observations
-                hotel_keys = db.save_hotel_daily_rates(
-                    hotels, check_in_raw, check_out_raw, location_query
-                )
-                # Save full result as fallback cache
-                db.save_hotel_search_cache(
-                    location_query, check_in_raw, check_out_raw, guests, hotels
-                )
-                # Attach price history for display
-                for h in hotels:
-                    hkey = hotel_keys.get(h['name'])
-                    if hkey:
-                        summary = db.get_hotel_price_summary(hkey, check_in_raw)
-                        if summary:
-                            h['price_history'] = summary
-            except Exception as e:
-                print(f"Firestore price save error: {e}")
 
         if hotels:
-            cache.set(cache_key, hotels, 3600)
+            self._cache_results(cache_key, hotels)
 
         return hotels
 
+    @staticmethod
+    def _cache_results(cache_key, hotels):
+        cache.set(cache_key, hotels, 3600)
+        stale = {'hotels': hotels, 'cached_at': str(datetime.now(timezone.utc))}
+        cache.set(cache_key + STALE_SUFFIX, stale, getattr(settings, 'HOTEL_SEARCH_STALE_TTL_SECONDS', 86400))
+
+    def _read_cached_search(self, location_query, check_in_raw, check_out_raw, guests):
+        """Firestore fallback cache, each hotel marked as cached with its timestamp."""
+        try:
+            cached_hotels, fetched_at = db.get_cached_hotel_search(
+                location_query, check_in_raw, check_out_raw, guests
+            )
+        except Exception as e:
+            print(f"Firestore cache read error: {e}")
+            return []
+        for h in cached_hotels or []:
+            h['is_cached'] = True
+            h['cached_at'] = str(fetched_at) if fetched_at else ''
+        return cached_hotels or []
+
+    def _finish_late_serpapi(self, future, cache_key, location_query, check_in_raw, check_out_raw, guests):
+        """Done-callback for a SerpApi search that outlived the deadline."""
+        try:
+            hotels = future.result()
+        except Exception as e:
+            print(f"SerpApi background search error: {e}")
+            return
+        if hotels:
+            self._save_serpapi_results(hotels, location_query, check_in_raw, check_out_raw, guests)
+            self._cache_results(cache_key, hotels)
+
+    def _save_serpapi_results(self, hotels, location_query, check_in_raw, check_out_raw, guests):
+        """Save observations + fallback cache and attach price history to `hotels`."""
+        try:
+            # Price history for display: everything stored before this
+            # search's observations, read in one round trip ahead of the write
+            priced = [h for h in hotels if h.get('rate_per_night') is not None]
+            summaries = db.get_hotel_price_summaries(
+                [db._hotel_doc_key(h['name'], location_query) for h in priced],
+                check_in_raw,
+            )
+
+            # Save daily rate observations
+            hotel_keys = db.save_hotel_daily_rates(
+                hotels, check_in_raw, check_out_raw, location_query
+            )
+            # Save full result as fallback cache
+            db.save_hotel_search_cache(
+                location_query, check_in_raw, check_out_raw, guests, hotels
+            )
+            # Attach price history for display
+            for h in hotels:
+                summary = summaries.get(hotel_keys.get(h['name']))
+                if summary:
+                    h['price_history'] = summary
+        except Exception as e:
+            print(f"Firestore price save error: {e}")
+
     def _search_via_serpapi(self, location_query, check_in, check_out, guests='1'):
         """Search hotels via SerpApi Google Hotels API — returns prices and images."""
         hotels = []
@@ -210,12 +351,18 @@ class HotelSearchService:
             data = resp.json()
 
             properties = data.get('properties', [])
-            for prop in properties:
+
+            # Premium programs for the whole page in one pass
+            premium_by_index = match_hotels_to_programs(
+                (prop.get('name', 'Unknown Hotel'),
+                 (prop.get('gps_coordinates') or {}).get('latitude'),
+                 (prop.get('gps_coordinates') or {}).get('longitude'))
+                for prop in properties
+            )
+
+            for prop_index, prop in enumerate(properties):
                 try:
                     name = prop.get('name', 'Unknown Hotel')
-                    gps = prop.get('gps_coordinates', {})
-                    lat = gps.get('latitude')
-                    lng = gps.get('longitude')
 
                     # Price data
                     rate_info = prop.get('rate_per_night', {})
@@ -240,7 +387,7 @@ class HotelSearchService:
                     program_name = brand_info['program_name']
 
                     # Premium programs
-                    premium = match_hotel_to_programs(name, lat, lng)
+                    premium = premium_by_index[prop_index]
 
                     # Use property_token as stable ID
                     place_id = prop.get('property_token', name.replace(' ', '_'))
@@ -297,17 +444,30 @@ class HotelSearchService:
 
         return hotels
 
+    @staticmethod
+    def _place_name(place):
+        display_name = place.get('displayName', {})
+        return display_name.get('text', 'Unknown Hotel') if isinstance(display_name, dict) else str(display_name)
+
     def _search_via_places(self, location_query):
         """Fallback: search hotels via Google Places API (no prices)."""
         hotels = []
         search_query = f"Hotels in {location_query}"
         try:
             places = self.places_service.search_hotels(search_query)
-            for place in places:
+
+            # Premium programs for the whole page in one pass
+            premium_by_index = match_hotels_to_programs(
+                (self._place_name(place),
+                 (place.get('location') or {}).get('latitude'),
+                 (place.get('location') or {}).get('longitude'))
+                for place in places
+            )
+
+            for place_index, place in enumerate(places):
                 try:
                     place_id = place.get('id', '')
-                    display_name = place.get('displayName', {})
-                    name = display_name.get('text', 'Unknown Hotel') if isinstance(display_name, dict) else str(display_name)
+                    name = self._place_name(place)
                     rating = place.get('rating', 0)
                     user_rating_count = place.get('userRatingCount', 0)
                     address = place.get('formattedAddress', '')
@@ -326,10 +486,7 @@ class HotelSearchService:
                     program_id = brand_info['program_id']
                     program_name = brand_info['program_name']
 
-                    location = place.get('location', {})
-                    lat = location.get('latitude')
-                    lng = location.get('longitude')
-                    premium = match_hotel_to_programs(name, lat, lng)
+                    premium = premium_by_index[place_index]
 
                     hotel_json_obj = {
                         'place_id': place_id,
@@ -1,19 +1,38 @@
 import json
 import os
-import threading
 from django.conf import settings
 from core.services import db
-from core.card_pipeline.grok_client import GrokClient
+from core.card_pipeline.grok_client import GrokClient, get_response_cache
 from .prompts import STRATEGY_ANALYSIS_PROMPT_TEMPLATE
+from .transfer_graph import TransferGraph
+
+
+def _has_analysis_results(data):
+    results = data.get('analysis_results') if isinstance(data, dict) else None
+    return isinstance(results, list) and bool(results)
+
 
 class StrategyAnalysisService:
     def __init__(self):
         pass
 
-    def call_grok_analysis(self, prompt):
+    def get_transfer_graph(self, valuations=None):
+        """Transfer graph over the transfer_rules collection (rules are cached by the service)."""
+        if valuations is None:
+            valuations = db.get_loyalty_valuations()
+        return TransferGraph(db.get_all_transfer_rules(), valuations)
+
+    def plan_transfer(self, uid, target_program, points_needed):
+        """Cheapest transfer plan for `points_needed` points in `target_program` from the user's balances."""
+        balances_raw = db.get_user_loyalty_balances(uid) if uid else []
+        balances = {b['program_id']: int(b.get('balance', 0) or 0) for b in balances_raw}
+        return self.get_transfer_graph().plan(target_program, points_needed, balances)
+
+    def call_grok_analysis(self, prompt, use_cache=True):
         """
         Calls Grok API with web search enabled to analyze hotel strategies.
-        Uses the REST-based GrokClient for reliability.
+        Uses the REST-based GrokClient for reliability. Only replies with
+        analysis results are cached; use_cache=False always asks Grok.
         """
         api_key = os.environ.get('GROK_API_KEY')
         if not api_key:
@@ -21,11 +40,19 @@ class StrategyAnalysisService:
             return None
 
         try:
-            client = GrokClient(api_key=api_key)
-            result = client.call_with_usage(prompt)
+            # Identical strategy prompts replay the cached analysis
+            cache = get_response_cache(
+                getattr(settings, 'GROK_CACHE_DIR', None),
+                ttl=getattr(settings, 'GROK_STRATEGY_CACHE_TTL_SECONDS', 6 * 60 * 60),
+            )
+            client = GrokClient(api_key=api_key, cache=cache)
+            result = client.call_with_usage(prompt, use_cache=use_cache, cache_if=_has_analysis_results)
 
             if result.data:
-                print(f"Grok analysis cost: ${result.usage.total_cost:.4f}")
+                if result.usage.cache_hits:
+                    print("Grok analysis served from cache")
+                else:
+                    print(f"Grok analysis cost: ${result.usage.total_cost:.4f}")
                 return result.data.get('analysis_results', [])
 
             print("Grok returned no data for strategy analysis")
@@ -35,27 +62,51 @@ class StrategyAnalysisService:
             print(f"Grok API Error: {e}")
             return None
 
-    def run_analysis_in_background(self, prompt_text, user_id, strat_id):
-        """Background worker function."""
+    def run_analysis(self, prompt_text, user_id, strat_id, is_last_attempt=True, use_cache=True):
+        """
+        Runs the Grok analysis for a saved strategy and stores the results.
+        Raises when the analysis fails and another attempt remains, so the job
+        queue retries it; on the last attempt the strategy is marked failed.
+        Retries pass use_cache=False so they get a fresh reply.
+        """
         print(f"Starting background analysis for strategy {strat_id}...")
         try:
-            results = self.call_grok_analysis(prompt_text)
-
-            if not results:
-                print(f"Analysis failed for {strat_id}")
-                self._update_strategy_status(user_id, strat_id, 'failed')
-                return
-
-            strategies_ref = db.db.collection('users').document(user_id).collection('hotel_strategies').document(strat_id)
-            strategies_ref.update({
-                'status': 'ready',
-                'analysis_results': results,
-                'hotel_count': len(results)
-            })
-            print(f"Updated strategy {strat_id} with results.")
+            results = self.call_grok_analysis(prompt_text, use_cache=use_cache)
         except Exception as e:
             print(f"Background analysis error for {strat_id}: {e}")
+            results = None
+
+        if not results:
+            print(f"Analysis failed for {strat_id}")
+            if not is_last_attempt:
+                raise RuntimeError(f"Strategy analysis returned no results for {strat_id}")
             self._update_strategy_status(user_id, strat_id, 'failed')
+            return
+
+        strategies_ref = db.db.collection('users').document(user_id).collection('hotel_strategies').document(strat_id)
+        strategies_ref.update({
+            'status': 'ready',
+            'analysis_results': results,
+            'hotel_count': len(results)
+        })
+        print(f"Updated strategy {strat_id} with results.")
+
+    def get_strategy_statuses(self, uid, strategies):
+        """
+        {strategy_id: status} for already-fetched strategy dicts. A strategy
+        still 'processing' whose job has failed for good is reported 'failed'.
+        """
+        jobs = db.get_jobs(
+            s.get('job_id') for s in strategies if s.get('status') == 'processing'
+        )
+        statuses = {}
+        for s in strategies:
+            status = s.get('status', 'unknown')
+            job = jobs.get(s.get('job_id'))
+            if status == 'processing' and job and job.get('status') == 'failed':
+                status = 'failed'
+            statuses[s['id']] = status
+        return statuses
 
     def _update_strategy_status(self, user_id, strat_id, status):
         """Helper to update strategy status in Firestore."""
@@ -108,25 +159,10 @@ class StrategyAnalysisService:
         user_balances_raw = db.get_user_loyalty_balances(uid) if uid else []
         wallet_balances = {b['program_id']: int(b.get('balance', 0)) for b in user_balances_raw}
         
-        # 2. Transfer Rules
-        raw_rules = db.get_all_transfer_rules()
-        transfer_rules = {}
-        for r in raw_rules:
-            sid = r.get('source_program_id')
-            if sid:
-                partners = []
-                for p in r.get('transfer_partners', []):
-                    partners.append({
-                        'dest': p.get('destination_program_id'),
-                        'ratio': p.get('ratio'),
-                        'time': p.get('transfer_time', 'Instant')
-                    })
-                transfer_rules[sid] = partners
-        
-        # 3. Dynamic Valuations
+        # 2. Dynamic Valuations
         valuations = db.get_loyalty_valuations()
 
-        # 4. Parse Selected Hotels (premium_programs already included from search)
+        # 3. Parse Selected Hotels (premium_programs already included from search)
         selected_hotels = []
         if selected_hotels_raw:
             for json_str in selected_hotels_raw:
@@ -136,7 +172,23 @@ class StrategyAnalysisService:
                     selected_hotels.append(hotel_dict)
                 except:
                     pass
-        
+
+        # 4. Transfer routes into the selected hotels' loyalty programs, worked
+        # out locally (ratios, bonuses, minimums, what the balances can cover)
+        graph = self.get_transfer_graph(valuations)
+        transfer_options = {}
+        for hotel in selected_hotels:
+            program_id = hotel.get('program_id')
+            if program_id and program_id not in transfer_options and graph.edges_to.get(program_id):
+                transfer_options[program_id] = graph.routes_to(program_id, wallet_balances)
+        transfer_rules = {
+            program_id: [
+                {'source': r['source'], 'ratio': r['effective_ratio'], 'time': r['transfer_time'], 'max_points': r['max_points']}
+                for r in routes
+            ]
+            for program_id, routes in transfer_options.items()
+        }
+
         # 5. Prepare Prompt
         prompt = self.prepare_prompt(
             check_in, check_out, guests, 
@@ -152,15 +204,17 @@ class StrategyAnalysisService:
             'hotel_count': len(selected_hotels),
             'analysis_results': [],
             'status': 'processing',
-            'prompt_used': prompt
+            'prompt_used': prompt,
+            'transfer_options': transfer_options,
         }
         strategy_id = db.save_hotel_strategy(uid, strategy_record)
 
-        # 7. Launch Background Thread
-        t = threading.Thread(target=self.run_analysis_in_background, args=(prompt, uid, strategy_id))
-        t.daemon = True
-        t.start()
-        
+        # 7. Queue the analysis as a durable job (retried, survives restarts)
+        job_id = db.enqueue_job('strategy_analysis', {'uid': uid, 'strategy_id': strategy_id})
+        db.db.collection('users').document(uid).collection('hotel_strategies').document(strategy_id).update({
+            'job_id': job_id,
+        })
+
         return strategy_id
 
     def run_anonymous_strategy(self, location, check_in, check_out, guests, selected_hotels_raw):
@@ -187,3 +241,16 @@ class StrategyAnalysisService:
         )
         
         return self.call_grok_analysis(prompt)
+
+
+def run_strategy_analysis_job(payload, job):
+    """Job handler: analyze a saved strategy using the prompt stored on it."""
+    uid, strategy_id = payload['uid'], payload['strategy_id']
+    strategy = db.get_hotel_strategy(uid, strategy_id)
+    if not strategy or strategy.get('status') != 'processing':
+        return
+    StrategyAnalysisService().run_analysis(
+        strategy.get('prompt_used', ''), uid, strategy_id,
+        is_last_attempt=job.get('is_last_attempt', True),
+        use_cache=job.get('attempts', 1) <= 1,
+    )
@@ -0,0 +1,246 @@
+from django.test import TestCase
+
+
+class PremiumProgramIndexTest(TestCase):
+    hotels = [
+        {'name': 'The Ritz Paris', 'latitude': 48.8681, 'longitude': 2.3290},
+        {'name': 'Ritz Club Paris', 'latitude': 48.8690, 'longitude': 2.3300},
+        {'name': 'Four Seasons George V', 'latitude': '48.8687', 'longitude': '2.3007'},
+        {'name': 'Ritz Dateline', 'latitude': 0.0, 'longitude': 179.999},
+        {'name': 'No Coordinates Ritz', 'latitude': None, 'longitude': None},
+    ]
+
+    def test_radius_query_and_best_match(self):
+        from booking_optimizer.premium_programs import ProgramHotelIndex, _name_words
+        index = ProgramHotelIndex(self.hotels)
+        # George V is ~2.1 km away from the Ritz, just outside the radius
+        self.assertEqual(index.nearby(48.8681, 2.3290), [0, 1])
+        # Longitude wraps around the antimeridian
+        self.assertEqual(index.nearby(0.0, -179.999), [3])
+
+        # First hotel wins ties, like the linear scan
+        self.assertIs(index.best_match(_name_words('Ritz Paris'), 48.868, 2.329), self.hotels[0])
+        self.assertIsNone(index.best_match(_name_words('Four Seasons'), 48.868, 2.329))
+        # Without coordinates every hotel is a candidate
+        self.assertIs(index.best_match(_name_words('Four Seasons Hotel George V')), self.hotels[2])
+
+    def test_batch_matches_whole_result_list(self):
+        from unittest.mock import patch
+        from booking_optimizer import premium_programs
+        premium_programs.get_premium_index.cache_clear()
+        data = {'fhr': self.hotels, 'thc': [], 'chase_edit': self.hotels[2:3]}
+        with patch.object(premium_programs, 'get_premium_programs_data', return_value=data):
+            results = premium_programs.match_hotels_to_programs([
+                ('Ritz Paris', 48.868, 2.329),
+                ('Four Seasons George V', 48.8687, 2.3007),
+                ('Ritz Paris', 48.868, 2.329),
+            ])
+        premium_programs.get_premium_index.cache_clear()
+
+        self.assertEqual(results[0]['amex_fhr']['name'], 'The Ritz Paris')
+        self.assertIsNone(results[0]['chase_edit'])
+        self.assertEqual(results[1]['chase_edit']['name'], 'Four Seasons George V')
+        self.assertIsNone(results[1]['amex_thc'])
+        self.assertEqual(results[2], results[0])
+        self.assertIsNot(results[2]['amex_fhr'], results[0]['amex_fhr'])
+
+    def test_name_only_search_weights_rare_words(self):
+        from booking_optimizer.premium_programs import ProgramHotelIndex, _name_words
+        hotels = [
+            {'name': 'Park Hyatt Tokyo'},
+            {'name': 'Grand Park Plaza'},
+            {'name': 'Park Lane Suites'},
+            {'name': 'Crown Towers'},
+            {'name': 'Crown Towers Perth'},
+        ]
+        index = ProgramHotelIndex(hotels)
+
+        top = index.search(_name_words('Park Hyatt Tokyo'), k=2)
+        self.assertIs(top[0][0], hotels[0])
+        self.assertAlmostEqual(top[0][1], 1.0)
+        self.assertLess(top[1][1], 0.5)
+        # A full-name match beats a subset with the same overlap score
+        self.assertIs(index.best_match(_name_words('Crown Towers Perth')), hotels[4])
+        self.assertEqual(index.search(_name_words('Nothing Shared')), [])
+
+    def test_name_only_match_keeps_the_word_overlap_threshold(self):
+        from booking_optimizer.premium_programs import ProgramHotelIndex, _name_similarity, _name_words
+        hotels = [{'name': name} for name in (
+            'Park Hyatt Tokyo', 'Grand Park Plaza', 'Park Lane Suites', 'Crown Towers',
+            'Crown Towers Perth', 'The Peninsula Tokyo', 'Aman Tokyo', 'Grand Hyatt Tokyo',
+        )]
+        index = ProgramHotelIndex(hotels)
+        for query in ('Park Central', 'Grand Central Station', 'Tokyo Station Hotel', 'Hyatt Regency Tokyo',
+                      'Aman', 'Crown', 'Peninsula Hong Kong', 'Nothing Shared', 'Four Seasons Tokyo'):
+            with self.subTest(query=query):
+                # The linear scan the index replaced
+                best = max(_name_similarity(query, h['name']) for h in hotels)
+                match = index.best_match(_name_words(query))
+                if best >= 0.5:
+                    self.assertIsNotNone(match)
+                    self.assertEqual(_name_similarity(query, match['name']), best)
+                else:
+                    self.assertIsNone(match)
+        # Lat without lng keeps the geo threshold
+        self.assertIsNotNone(index.best_match(_name_words('Park Central')))
+        self.assertIsNone(index.best_match(_name_words('Park Central'), hotel_lat=35.0))
+
+
+class TransferGraphTest(TestCase):
+    rules = [
+        {'source_program_id': 'chase_ur', 'transfer_partners': [
+            {'destination_program_id': 'hyatt', 'ratio': 1.0, 'min_transfer_amount': 1000, 'transfer_increment': 1000},
+        ]},
+        {'source_program_id': 'amex_mr', 'transfer_partners': [
+            {'destination_program_id': 'hyatt', 'ratio': 1.0, 'min_transfer_amount': 1000, 'transfer_increment': 1000,
+             'current_bonus': {'is_active': True, 'bonus_multiplier': 1.3, 'expiry_date': '2099-01-01'}},
+            {'destination_program_id': 'hilton', 'ratio': 2.0, 'min_transfer_amount': 1000, 'transfer_increment': 1000,
+             'current_bonus': {'is_active': True, 'bonus_multiplier': 1.5, 'expiry_date': '2020-01-01'}},
+        ]},
+    ]
+    valuations = {'chase_ur': 2.0, 'amex_mr': 2.0, 'hyatt': 1.7}
+
+    def test_cheapest_plan_uses_bonus_and_increments(self):
+        from booking_optimizer.transfer_graph import TransferGraph
+        graph = TransferGraph(self.rules, self.valuations)
+        plan = graph.plan('hyatt', 20000, {'chase_ur': 50000, 'amex_mr': 10500, 'hyatt': 2000})
+
+        self.assertTrue(plan['feasible'])
+        self.assertEqual(plan['from_balance'], 2000)
+        # 10,000 MR -> 13,000 Hyatt with the bonus; UR covers the last 5,000
+        self.assertEqual([(t['source'], t['points'], t['receives']) for t in plan['transfers']],
+                         [('amex_mr', 10000, 13000), ('chase_ur', 5000, 5000)])
+        self.assertEqual(plan['total_cost'], round(2000 * 0.017 + 15000 * 0.02, 2))
+
+        # Expired bonus is ignored
+        self.assertEqual(graph.routes_to('hilton')[0]['effective_ratio'], 2.0)
+
+    def test_infeasible_plan_reports_shortfall(self):
+        from booking_optimizer.transfer_graph import TransferGraph
+        plan = TransferGraph(self.rules, self.valuations).plan('hyatt', 30000, {'chase_ur': 9999, 'amex_mr': 500})
+        self.assertFalse(plan['feasible'])
+        self.assertEqual(plan['shortfall'], 21000)
+        self.assertIsNone(plan['total_cost'])
+
+
+class HotelSearchCoalescingTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_concurrent_identical_searches_share_one_upstream_call(self):
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest.mock import patch
+        from booking_optimizer.services import HotelSearchService
+        calls = []
+        lock = threading.Lock()
+
+        def slow_search(*args):
+            with lock:
+                calls.append(args)
+            time.sleep(0.2)
+            return [{'name': 'Park Hyatt', 'rate_per_night': 500}]
+
+        service = HotelSearchService()
+        with patch('booking_optimizer.services.get_serpapi_key', return_value='key'), \
+                patch.object(service, '_search_via_serpapi', side_effect=slow_search), \
+                patch.object(service, '_read_cached_search', return_value=[]), \
+                patch.object(service, '_save_serpapi_results'):
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                results = list(pool.map(lambda _: service.search_hotels('Tokyo', '2026-03-01', '2026-03-03'), range(6)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r == [{'name': 'Park Hyatt', 'rate_per_night': 500}] for r in results))
+        # Each caller owns its list
+        self.assertEqual(len({id(r) for r in results}), 6)
+
+    def test_slow_serpapi_falls_back_to_cached_result_then_refreshes(self):
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from django.core.cache import cache
+        from unittest.mock import patch
+        from booking_optimizer.services import HotelSearchService
+
+        def slow_search(*args):
+            time.sleep(0.3)
+            return [{'name': 'Fresh', 'rate_per_night': 300}]
+
+        service = HotelSearchService()
+        with self.settings(HOTEL_SEARCH_DEADLINE_SECONDS=0.05), \
+                patch('booking_optimizer.services.get_serpapi_key', return_value='key'), \
+                patch.object(service, '_search_via_serpapi', side_effect=slow_search), \
+                patch.object(service, '_read_cached_search', return_value=[{'name': 'Old', 'is_cached': True}]), \
+                patch.object(service, '_save_serpapi_results') as save:
+            hotels = service.search_hotels('Tokyo', '2026-03-01', '2026-03-03')
+            self.assertEqual(hotels[0]['name'], 'Old')
+            time.sleep(0.5)
+
+        save.assert_called_once()
+        key = 'hotel_search_serp_Tokyo_2026-03-01_2026-03-03_1'
+        self.assertEqual(cache.get(key)[0]['name'], 'Fresh')
+
+        # Fresh entry gone: the stale copy is served, marked as cached, while one refresh runs
+        cache.delete(key)
+
+        def slow_fetch(*args):
+            time.sleep(0.2)
+            return [{'name': 'Refreshed'}]
+
+        with patch('booking_optimizer.services.get_serpapi_key', return_value='key'), \
+                patch.object(service, '_fetch_hotels', side_effect=slow_fetch) as fetch:
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                results = list(pool.map(lambda _: service.search_hotels('Tokyo', '2026-03-01', '2026-03-03'), range(6)))
+            time.sleep(0.3)
+        fetch.assert_called_once()
+        for hotels in results:
+            self.assertEqual(hotels[0]['name'], 'Fresh')
+            self.assertTrue(hotels[0]['is_cached'])
+            self.assertTrue(hotels[0]['cached_at'])
+        # The stale copy itself stays unmarked
+        self.assertNotIn('is_cached', cache.get(key + ':stale')['hotels'][0])
+
+
+class StrategyAnalysisRetryTest(TestCase):
+    def _reply(self, results):
+        import json
+        from unittest.mock import MagicMock
+        response = MagicMock(status_code=200, ok=True)
+        response.json.return_value = {
+            'usage': {'input_tokens': 10, 'output_tokens': 5},
+            'output': [{'type': 'message', 'content': [
+                {'type': 'output_text', 'text': json.dumps({'analysis_results': results})}]}],
+        }
+        return response
+
+    def test_empty_reply_is_not_replayed_to_the_retry(self):
+        import os
+        import tempfile
+        from unittest.mock import MagicMock, patch
+        from booking_optimizer.strategy_service import run_strategy_analysis_job
+        from core.services import db
+        session = MagicMock()
+        session.post.side_effect = [self._reply([]), self._reply([{'hotel': 'Park Hyatt'}])]
+        strategy = {'status': 'processing', 'prompt_used': 'analyze'}
+        payload = {'uid': 'u1', 'strategy_id': 's1'}
+        with tempfile.TemporaryDirectory() as tmp, \
+                self.settings(GROK_CACHE_DIR=tmp), \
+                patch.dict(os.environ, {'GROK_API_KEY': 'key'}), \
+                patch('core.card_pipeline.grok_client.get_session', return_value=session), \
+                patch.object(db, 'get_hotel_strategy', return_value=strategy), \
+                patch.object(db, '_db', MagicMock()) as client:
+            with self.assertRaises(RuntimeError):
+                run_strategy_analysis_job(payload, {'attempts': 1, 'is_last_attempt': False})
+            # The empty reply was not cached
+            self.assertEqual([f for f in os.listdir(tmp) if f.endswith('.json')], [])
+            run_strategy_analysis_job(payload, {'attempts': 2, 'is_last_attempt': False})
+
+            self.assertEqual(session.post.call_count, 2)
+            strategy_ref = client.collection.return_value.document.return_value.collection.return_value.document.return_value
+            update = strategy_ref.update.call_args.args[0]
+            self.assertEqual((update['status'], update['hotel_count']), ('ready', 1))
+
+            # The good reply is replayed for the next identical prompt
+            run_strategy_analysis_job(payload, {'attempts': 1, 'is_last_attempt': True})
+            self.assertEqual(session.post.call_count, 2)
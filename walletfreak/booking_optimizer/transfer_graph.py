@@ -0,0 +1,238 @@
+"""
+Points transfer graph and exact transfer planner.
+
+Builds a directed graph (source program -> destination program) from the
+transfer_rules collection and answers "how do I get N points into program X
+from the balances I have, at the lowest cost?" locally, in milliseconds.
+
+Cost is the value of the points given up, using loyalty valuations (cents per
+point). Each edge respects the partner's ratio, active transfer bonus,
+minimum transfer amount and transfer increment.
+"""
+
+import math
+from datetime import date
+
+# Cents per point assumed for programs without a valuation
+DEFAULT_CPP = 1.0
+
+
+def _bonus_multiplier(partner, today=None):
+    """Active bonus multiplier for a partner (1.0 when none or expired)."""
+    bonus = partner.get('current_bonus') or {}
+    if not bonus.get('is_active'):
+        return 1.0
+    expiry = bonus.get('expiry_date')
+    if expiry:
+        try:
+            if date.fromisoformat(str(expiry)[:10]) < (today or date.today()):
+                return 1.0
+        except ValueError:
+            pass
+    try:
+        return float(bonus.get('bonus_multiplier') or 1.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class TransferEdge:
+    """One source -> destination transfer partnership."""
+
+    __slots__ = ('source', 'destination', 'ratio', 'bonus_multiplier', 'rate',
+                 'min_amount', 'increment', 'transfer_time')
+
+    def __init__(self, source, partner, today=None):
+        self.source = source
+        self.destination = partner.get('destination_program_id')
+        self.ratio = float(partner.get('ratio') or 0)
+        self.bonus_multiplier = _bonus_multiplier(partner, today)
+        # Destination points per source point, bonus included
+        self.rate = self.ratio * self.bonus_multiplier
+        self.increment = max(1, int(partner.get('transfer_increment') or 1))
+        self.min_amount = max(self.increment, int(partner.get('min_transfer_amount') or 0))
+        self.transfer_time = partner.get('transfer_time', 'Instant')
+
+    def received(self, amount):
+        """Destination points for transferring `amount` source points."""
+        # round() first so 1000 * 1.3 doesn't floor to 1299
+        return int(math.floor(round(amount * self.rate, 6)))
+
+    def max_transfer(self, balance):
+        """Largest valid transfer from `balance` (0 if below the minimum)."""
+        amount = (int(balance) // self.increment) * self.increment
+        return amount if amount >= self.min_amount else 0
+
+
+class TransferGraph:
+    """Directed graph of transfer partnerships, indexed by destination."""
+
+    def __init__(self, transfer_rules, valuations=None, today=None):
+        self.valuations = valuations or {}
+        self.edges_from = {}
+        self.edges_to = {}
+        for rule in transfer_rules or []:
+            source = rule.get('source_program_id') or rule.get('id')
+            if not source:
+                continue
+            for partner in rule.get('transfer_partners', []):
+                edge = TransferEdge(source, partner, today)
+                if not edge.destination or edge.rate <= 0:
+                    continue
+                self.edges_from.setdefault(source, []).append(edge)
+                self.edges_to.setdefault(edge.destination, []).append(edge)
+
+    def cpp(self, program_id):
+        return self.valuations.get(program_id) or DEFAULT_CPP
+
+    def _unit_cost(self, edge):
+        """Cents of source value per destination point."""
+        return self.cpp(edge.source) / edge.rate
+
+    def routes_to(self, target, balances=None):
+        """
+        Every way into `target`, cheapest first, with how much of it the
+        user's balances could cover.
+        """
+        balances = balances or {}
+        routes = []
+        for edge in self.edges_to.get(target, []):
+            max_amount = edge.max_transfer(balances.get(edge.source, 0))
+            routes.append({
+                'source': edge.source,
+                'ratio': edge.ratio,
+                'bonus_multiplier': edge.bonus_multiplier,
+                'effective_ratio': round(edge.rate, 4),
+                'transfer_time': edge.transfer_time,
+                'min_transfer_amount': edge.min_amount,
+                'transfer_increment': edge.increment,
+                'cost_per_point_cents': round(self._unit_cost(edge), 4),
+                'balance': int(balances.get(edge.source, 0)),
+                'max_points': edge.received(max_amount),
+            })
+        routes.sort(key=lambda r: (r['cost_per_point_cents'], r['source']))
+        return routes
+
+    def plan(self, target, points_needed, balances=None):
+        """
+        Cheapest way to hold `points_needed` points in `target`.
+
+        Points already in `target` are used first; the rest comes from
+        transfers, chosen by an exact branch-and-bound search over transfer
+        amounts (source count is small, so this is fast).
+
+        Returns a dict with 'feasible', the 'transfers' list, 'from_balance',
+        'shortfall' and 'total_cost' (dollars of point value given up).
+        """
+        balances = {k: int(v or 0) for k, v in (balances or {}).items()}
+        points_needed = max(0, int(points_needed or 0))
+        from_balance = min(balances.get(target, 0), points_needed)
+        deficit = points_needed - from_balance
+
+        edges = [e for e in self.edges_to.get(target, []) if e.max_transfer(balances.get(e.source, 0))]
+        edges.sort(key=lambda e: (self._unit_cost(e), e.source))
+        choice, cost = self._search(edges, deficit, balances) if deficit else ([], 0.0)
+
+        transfers = []
+        received_total = 0
+        for edge, amount in choice:
+            received = edge.received(amount)
+            received_total += received
+            transfers.append({
+                'source': edge.source,
+                'points': amount,
+                'receives': received,
+                'ratio': edge.ratio,
+                'bonus_multiplier': edge.bonus_multiplier,
+                'transfer_time': edge.transfer_time,
+                'cost': round(amount * self.cpp(edge.source) / 100.0, 2),
+            })
+
+        feasible = received_total >= deficit
+        if not feasible:
+            # Report how far the user's transferable points fall short
+            reachable = sum(e.received(e.max_transfer(balances.get(e.source, 0))) for e in edges)
+            return {
+                'target': target,
+                'points_needed': points_needed,
+                'feasible': False,
+                'from_balance': from_balance,
+                'transfers': [],
+                'points_received': 0,
+                'shortfall': deficit - reachable,
+                'total_cost': None,
+            }
+        return {
+            'target': target,
+            'points_needed': points_needed,
+            'feasible': True,
+            'from_balance': from_balance,
+            'transfers': transfers,
+            'points_received': received_total,
+            'shortfall': 0,
+            'total_cost': round(from_balance * self.cpp(target) / 100.0 + cost, 2),
+        }
+
+    def _search(self, edges, deficit, balances):
+        """
+        Branch and bound over transfer amounts (cheapest sources first).
+        Minimizes the value given up. Returns
+        ([(edge, amount), ...], dollars) or ([], 0.0) when nothing covers it.
+        """
+        n = len(edges)
+        unit = [self._unit_cost(e) / 100.0 for e in edges]
+        caps = [e.max_transfer(balances.get(e.source, 0)) for e in edges]
+        reach = [e.received(c) for e, c in zip(edges, caps)]
+        # Points still reachable from edge i onwards (feasibility pruning)
+        suffix_reach = [0] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            suffix_reach[i] = suffix_reach[i + 1] + reach[i]
+        if suffix_reach[0] < deficit:
+            return [], 0.0
+
+        def lower_bound(i, remaining):
+            # Fractional fill from the cheapest remaining edges
+            bound = 0.0
+            for j in range(i, n):
+                if remaining <= 0:
+                    break
+                take = min(remaining, reach[j])
+                bound += take * unit[j]
+                remaining -= take
+            return bound
+
+        best = {'key': None, 'choice': None}
+        amounts = [0] * n
+
+        def visit(i, remaining, cost, moved):
+            if remaining <= 0:
+                key = (round(cost, 6), moved)
+                if best['key'] is None or key < best['key']:
+                    best['key'] = key
+                    best['choice'] = list(amounts)
+                return
+            if i == n or suffix_reach[i] < remaining:
+                return
+            # Ties are pruned too: an equally cheap plan is already known
+            if best['key'] is not None and round(cost + lower_bound(i, remaining), 6) >= best['key'][0]:
+                return
+
+            edge = edges[i]
+            cpp = self.cpp(edge.source) / 100.0
+            # Smallest amount that covers the rest alone, capped by the balance
+            covering = math.ceil(remaining / edge.rate / edge.increment) * edge.increment
+            while edge.received(covering) < remaining:
+                covering += edge.increment
+            top = min(caps[i], max(covering, edge.min_amount))
+            amount = top
+            while amount >= edge.min_amount:
+                amounts[i] = amount
+                visit(i + 1, remaining - edge.received(amount), cost + amount * cpp, moved + amount)
+                amount -= edge.increment
+            amounts[i] = 0
+            visit(i + 1, remaining, cost, moved)
+
+        visit(0, deficit, 0.0, 0)
+        if best['choice'] is None:
+            return [], 0.0
+        choice = [(edges[i], a) for i, a in enumerate(best['choice']) if a]
+        return choice, best['key'][0]
@@ -171,12 +171,9 @@ def check_strategy_status(request):
     if not ids:
         return JsonResponse({'statuses': {}})
         
-    results = {}
-    for sid in ids:
-        strat = db.get_hotel_strategy(uid, sid)
-        if strat:
-            results[sid] = strat.get('status', 'unknown')
-    
+    strategies = [s for s in (db.get_hotel_strategy(uid, sid) for sid in ids) if s]
+    results = StrategyAnalysisService().get_strategy_statuses(uid, strategies)
+
     return JsonResponse({'statuses': results})
 
 @login_required
@@ -0,0 +1,156 @@
+import heapq
+
+MIN_BUNDLE_SIZE = 2
+MAX_BUNDLE_SIZE = 5
+DEFAULT_BUNDLE_SIZE = 3
+
+
+def clamp_bundle_size(value, default=DEFAULT_BUNDLE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(MIN_BUNDLE_SIZE, min(MAX_BUNDLE_SIZE, size))
+
+
+def bundle_value(members, planned_spend):
+    """
+    Net value of a bundle: every card earns its bonus and its ongoing rate on
+    the spend needed to unlock it, minus the annual fee; leftover spend goes to
+    the card with the best ongoing rate.
+    """
+    if not members:
+        return 0.0
+    total = 0.0
+    used = 0.0
+    for cand in members:
+        total += cand['bonus_value'] - cand['annual_fee'] + cand['req_spend'] * cand['ongoing_rate']
+        used += cand['req_spend']
+    best_rate = max(cand['ongoing_rate'] for cand in members)
+    return total + (planned_spend - used) * best_rate
+
+
+def solve_bundles(candidates, planned_spend, monthly_capacity, max_cards=DEFAULT_BUNDLE_SIZE, top_n=1):
+    """
+    Exact top-N bundle search for the SUB optimizer combo mode.
+
+    A 2-constraint knapsack: total required spend <= planned_spend and total
+    monthly spend load <= monthly_capacity, with at most `max_cards` cards.
+    The leftover-spend term makes the objective depend on the bundle's best
+    ongoing rate, so we branch on that "anchor" card: with the anchor fixed,
+    every other card's contribution is additive
+        base_i - req_spend_i * (anchor_rate - rate_i)
+    and a plain branch-and-bound over cards sorted by contribution applies.
+    Anchors and branches are pruned with optimistic bounds against the N-th
+    best bundle found so far.
+
+    Returns up to `top_n` bundles, best first:
+        {'members': [candidate, ...], 'net_value', 'total_spend',
+         'monthly_load', 'gap_to_optimum', 'gap_pct'}
+    """
+    max_cards = max(1, int(max_cards))
+    top_n = max(1, int(top_n))
+    eps = 1e-9
+
+    items = []
+    for cand in candidates:
+        req_spend = float(cand['req_spend'])
+        req_months = cand['req_months']
+        monthly = req_spend / req_months if req_months > 0 else 0.0
+        if req_spend > planned_spend + eps or monthly > monthly_capacity + eps:
+            continue
+        items.append((cand, req_spend, monthly, cand['bonus_value'] - cand['annual_fee'], cand['ongoing_rate']))
+
+    if not items:
+        return []
+
+    # Rank by ongoing rate; an anchor may only be combined with lower-ranked
+    # cards, so every bundle is enumerated exactly once (under its best earner).
+    order = sorted(range(len(items)), key=lambda i: (items[i][4], -i))
+
+    # Optimistic bound per anchor: ignore the rate penalty and capacities and
+    # take the best (max_cards - 1) positive bases among lower-ranked cards.
+    anchors = []
+    best_bases = []  # min-heap of the largest positive bases seen so far
+    for i in order:
+        cand, spend, monthly, base, rate = items[i]
+        bound = planned_spend * rate + base + sum(best_bases)
+        anchors.append((bound, i))
+        if max_cards > 1 and base > 0:
+            if len(best_bases) < max_cards - 1:
+                heapq.heappush(best_bases, base)
+            elif base > best_bases[0]:
+                heapq.heapreplace(best_bases, base)
+    anchors.sort(key=lambda a: -a[0])
+    rank = {i: r for r, i in enumerate(order)}
+
+    found = []  # min-heap of (value, -seq, member indices)
+    seq = [0]
+
+    def threshold():
+        return found[0][0] if len(found) >= top_n else float('-inf')
+
+    def record(value, members):
+        seq[0] += 1
+        entry = (value, -seq[0], members)
+        if len(found) < top_n:
+            heapq.heappush(found, entry)
+        elif value > found[0][0]:
+            heapq.heapreplace(found, entry)
+
+    for bound, a in anchors:
+        if bound <= threshold():
+            break  # anchors are sorted by bound; nothing left can place
+
+        _, a_spend, a_monthly, a_base, a_rate = items[a]
+        anchor_value = planned_spend * a_rate + a_base
+        spend_left = planned_spend - a_spend
+        monthly_left = monthly_capacity - a_monthly
+
+        others = []
+        for j in order[:rank[a]]:
+            _, spend, monthly, base, rate = items[j]
+            weight = base - spend * (a_rate - rate)
+            if spend <= spend_left + eps and monthly <= monthly_left + eps:
+                others.append((weight, spend, monthly, j))
+        others.sort(key=lambda o: -o[0])
+
+        # prefix[k] = best possible gain from the first k cards (negatives add nothing)
+        prefix = [0.0]
+        for o in others:
+            prefix.append(prefix[-1] + max(o[0], 0.0))
+        n = len(others)
+
+        record(anchor_value, (a,))
+
+        def search(start, slots, value, spend_left, monthly_left, members):
+            for k in range(start, n):
+                end = min(k + slots, n)
+                if value + prefix[end] - prefix[k] <= threshold():
+                    return  # even the best remaining cards cannot beat the N-th bundle
+                weight, spend, monthly, j = others[k]
+                if spend > spend_left + eps or monthly > monthly_left + eps:
+                    continue
+                chosen = members + (j,)
+                record(value + weight, chosen)
+                if slots > 1:
+                    search(k + 1, slots - 1, value + weight, spend_left - spend, monthly_left - monthly, chosen)
+
+        if max_cards > 1:
+            search(0, max_cards - 1, anchor_value, spend_left, monthly_left, (a,))
+
+    ranked = sorted(found, key=lambda f: (-f[0], -f[1]))
+    optimum = ranked[0][0]
+    bundles = []
+    for value, _, members in ranked:
+        member_items = [items[m] for m in members]
+        gap = optimum - value
+        bundles.append({
+            'members': [m[0] for m in member_items],
+            'net_value': value,
+            'total_spend': sum(m[1] for m in member_items),
+            'monthly_load': sum(m[2] for m in member_items),
+            'gap_to_optimum': gap,
+            'gap_pct': (gap / optimum * 100) if optimum > 0 else 0.0,
+        })
+    return bundles
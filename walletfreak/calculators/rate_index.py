@@ -0,0 +1,198 @@
+import json
+from heapq import merge
+
+# Spend-It treats a direct airline/hotel booking rate as a specific match
+# when the user picked a brand inside these parent categories.
+DIRECT_BOOKING_FALLBACKS = {
+    'airlines': 'Direct Airline Bookings',
+    'hotels': 'Direct Hotel Bookings',
+}
+
+
+def parse_rate_categories(cat_data):
+    """
+    Normalize an earning rate's `category` field to a list of strings.
+    Firestore holds either a list or a JSON-encoded list (older seeds).
+    """
+    if isinstance(cat_data, str):
+        try:
+            cat_list = json.loads(cat_data)
+        except json.JSONDecodeError:
+            cat_list = [cat_data]
+        if not isinstance(cat_list, list):
+            cat_list = [cat_data]
+    else:
+        cat_list = cat_data if isinstance(cat_data, list) else [str(cat_data)]
+    return [str(c) for c in cat_list]
+
+
+def parse_cpp(card):
+    raw_cpp = card.get('points_value_cpp') or card.get('PointsValueCpp', '1.0')
+    try:
+        if isinstance(raw_cpp, (int, float)) or raw_cpp.replace('.', '', 1).isdigit():
+            return float(raw_cpp)
+    except Exception:
+        pass
+    return 1.0
+
+
+class RateEntry:
+    """One card's best rate for one category, with its dollar value per $1 spent."""
+    __slots__ = ('slug', 'pos', 'multiplier', 'currency', 'cpp', 'value_per_dollar', 'rate', 'categories')
+
+    def __init__(self, slug, pos, multiplier, currency, cpp, rate, categories):
+        self.slug = slug
+        self.pos = pos
+        self.multiplier = multiplier
+        self.currency = currency
+        self.cpp = cpp
+        self.rate = rate
+        self.categories = categories
+        if 'cash' in currency:
+            self.value_per_dollar = multiplier / 100.0
+        else:
+            self.value_per_dollar = multiplier * (cpp / 100.0)
+
+    @property
+    def sort_key(self):
+        # Highest value first; ties keep catalog (name) order like the old stable sort
+        return (-self.value_per_dollar, self.pos)
+
+
+BASE_ESTIMATE_RATE = {'currency': 'points', 'category': 'Base Estimate'}
+
+
+class SpendRateIndex:
+    """
+    Category -> presorted card rates for the Spend-It calculator.
+
+    Built once per catalog snapshot (see CatalogSnapshot.derived) so a query is
+    a handful of dict lookups plus a top-k merge instead of re-parsing every
+    rate of every card.
+    """
+
+    def __init__(self, cards):
+        self.positions = {}
+        self.cpp = {}
+        self.card_rates = {}         # slug -> {category_lower: RateEntry}
+        self.defaults = {}           # slug -> RateEntry (is_default / All Purchases)
+        self.card_categories = {}    # slug -> sorted display categories
+        self.by_category = {}        # category_lower -> [RateEntry] best first
+        unique_categories = set()
+
+        for pos, card in enumerate(cards):
+            slug = card['id']
+            cpp = parse_cpp(card)
+            self.positions[slug] = pos
+            self.cpp[slug] = cpp
+
+            best = {}
+            default_entry = None
+            display = set()
+            for r in card.get('earning_rates', []):
+                cats = parse_rate_categories(r.get('category'))
+                val = float(r.get('multiplier') or r.get('rate') or 0.0)
+                currency = str(r.get('currency', 'points')).lower()
+                entry = None
+                for c in cats:
+                    display.add(c)
+                    if c and c.lower() != 'all purchases':
+                        unique_categories.add(c)
+                    key = c.lower()
+                    current = best.get(key)
+                    # Strictly greater keeps the first of equal rates, as before
+                    if val > (current.multiplier if current else 0.0):
+                        entry = entry or RateEntry(slug, pos, val, currency, cpp, r, cats)
+                        best[key] = entry
+
+                is_base = r.get('is_default') or 'all purchases' in (c.lower() for c in cats)
+                if is_base and val > (default_entry.multiplier if default_entry else 0.0):
+                    default_entry = RateEntry(slug, pos, val, currency, cpp, r, cats)
+
+            if default_entry is None:
+                # No base rate on file: estimate 1x points
+                default_entry = RateEntry(slug, pos, 1.0, 'points', cpp, BASE_ESTIMATE_RATE, ['Base Estimate'])
+
+            self.card_rates[slug] = best
+            self.defaults[slug] = default_entry
+            self.card_categories[slug] = sorted(display)
+            for key, entry in best.items():
+                self.by_category.setdefault(key, []).append(entry)
+
+        for entries in self.by_category.values():
+            entries.sort(key=lambda e: e.sort_key)
+        self.default_ranking = sorted(self.defaults.values(), key=lambda e: e.sort_key)
+        self.all_categories = sorted(unique_categories)
+
+    @staticmethod
+    def fallback_target(parent_category):
+        if not parent_category:
+            return None
+        return DIRECT_BOOKING_FALLBACKS.get(parent_category.lower())
+
+    def rate_for(self, slug, category):
+        """Best multiplier a card earns on an exact category (0.0 if none)."""
+        entry = self.card_rates.get(slug, {}).get(category.lower())
+        return entry.multiplier if entry else 0.0
+
+    def lookup(self, slug, specific_category, parent_category):
+        """
+        Resolve the rate a card earns for a query. Returns (RateEntry, match_type).
+
+        1. specific_category (brand), or the direct-booking fallback -> 'Specific'
+        2. parent_category, only when no specific category was given -> 'Generic'
+        3. the card's base rate -> 'Default'
+        """
+        rates = self.card_rates.get(slug, {})
+        if specific_category:
+            best = rates.get(specific_category.lower())
+            fallback = self.fallback_target(parent_category)
+            if fallback:
+                fb = rates.get(fallback.lower())
+                if fb and (best is None or fb.multiplier > best.multiplier):
+                    best = fb
+            if best:
+                return best, 'Specific'
+        elif parent_category:
+            best = rates.get(parent_category.lower())
+            if best:
+                return best, 'Generic'
+        return self.defaults[slug], 'Default'
+
+    def ranked(self, specific_category, parent_category, include=None, exclude=()):
+        """
+        Yield (RateEntry, match_type) best first: specific matches ahead of
+        everything else, then by value per dollar, ties in catalog order.
+
+        Lazily merges the presorted per-category lists, so taking the top k
+        touches roughly k entries past the specific matches.
+        """
+        def allowed(slug):
+            return slug not in exclude and (include is None or slug in include)
+
+        claimed = set()
+        if specific_category:
+            slugs = {e.slug for e in self.by_category.get(specific_category.lower(), [])}
+            fallback = self.fallback_target(parent_category)
+            if fallback:
+                slugs.update(e.slug for e in self.by_category.get(fallback.lower(), []))
+            # Specific matches are few; resolve them exactly (brand vs fallback)
+            specific = [self.lookup(s, specific_category, parent_category)[0] for s in slugs]
+            specific.sort(key=lambda e: e.sort_key)
+            for entry in specific:
+                claimed.add(entry.slug)
+                if allowed(entry.slug):
+                    yield entry, 'Specific'
+            generic = []
+        elif parent_category:
+            generic = self.by_category.get(parent_category.lower(), [])
+            claimed.update(e.slug for e in generic)
+        else:
+            generic = []
+
+        defaults = (e for e in self.default_ranking if e.slug not in claimed)
+        tagged_generic = ((e, 'Generic') for e in generic)
+        tagged_defaults = ((e, 'Default') for e in defaults)
+        for entry, match_type in merge(tagged_generic, tagged_defaults, key=lambda t: t[0].sort_key):
+            if allowed(entry.slug):
+                yield entry, match_type
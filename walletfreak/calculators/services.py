@@ -5,6 +5,8 @@ import json
 from datetime import datetime, date
 from django.conf import settings
 from core.services import db
+from .rate_index import SpendRateIndex
+from .bundle_solver import DEFAULT_BUNDLE_SIZE, clamp_bundle_size, solve_bundles
 
 class OptimizerService:
     def __init__(self):
@@ -36,27 +38,44 @@ class OptimizerService:
                 
         return rates
 
-    def calculate_recommendations(self, planned_spend, duration_months, user_wallet_slugs=None, mode='single', uid=None, sort_by='recommended'):
+    def calculate_recommendations(self, planned_spend, duration_months, user_wallet_slugs=None, mode='single', uid=None, sort_by='recommended', bundle_size=DEFAULT_BUNDLE_SIZE):
         """
         Core optimization logic.
         """
+        candidates, monthly_spend_capacity = self._build_candidates(planned_spend, duration_months, user_wallet_slugs, uid)
+
+        # Optimization Algorithm
+        if mode == 'combo':
+            return self._optimize_combo(candidates, planned_spend, monthly_spend_capacity, bundle_size)
+        else:
+            return self._optimize_single(candidates, sort_by)
+
+    def calculate_bundles(self, planned_spend, duration_months, user_wallet_slugs=None, uid=None, bundle_size=DEFAULT_BUNDLE_SIZE, top_n=5):
+        """
+        Top-N card bundles for combo mode, best first. Each bundle carries its
+        net value and its gap to the optimal bundle.
+        """
+        candidates, monthly_spend_capacity = self._build_candidates(planned_spend, duration_months, user_wallet_slugs, uid)
+        bundles = solve_bundles(candidates, planned_spend, monthly_spend_capacity,
+                                max_cards=clamp_bundle_size(bundle_size), top_n=top_n)
+        for bundle in bundles:
+            bundle['cards'] = self._allocate_bundle(bundle.pop('members'), planned_spend)
+        return bundles
+
+    def _build_candidates(self, planned_spend, duration_months, user_wallet_slugs=None, uid=None):
+        """
+        Cards whose sign-up bonus is reachable with the planned spend, with their
+        valuation metrics. Returns (candidates, monthly_spend_capacity).
+        """
         if user_wallet_slugs is None:
             user_wallet_slugs = set()
             
         # Match Score Pre-Calculation
         match_scores = {}
         if uid:
-            # We need all_cards for the match score calculation
-            # db.get_cards() returns list of dicts. self.cards_map is id->dict.
-            # We can reconstruct the list or just call db.get_cards() again? 
-            # self.cards_map values are the cards.
-            all_cards_list = list(self.cards_map.values())
-            
-            user_personality = db.get_user_assigned_personality(uid)
-            # Need full card objects for user wallet
-            user_cards_full = db.get_user_cards(uid)
-            
-            match_scores = db.calculate_match_scores(user_personality, user_cards_full, all_cards_list)
+            # Cached per user; only recomputed when the wallet, personality
+            # or catalog changed
+            match_scores = db.get_user_match_scores(uid)
             
         # Fixed date for simulation/optimization as per requirements
         today = date(2025, 12, 24)
@@ -163,25 +182,8 @@ class OptimizerService:
                 'rank_score': rank_score
             })
             
-        # Optimization Algorithm
-        if mode == 'combo':
-            return self._optimize_combo(candidates, planned_spend, monthly_spend_capacity)
-        else:
-            return self._optimize_single(candidates, sort_by)
+        return candidates, monthly_spend_capacity
 
-    def _load_all_rates(self):
-        """
-        Derives ALL rates from enriched card data.
-        Returns dict: {slug: [ {category, rate, currency, details}, ... ]}
-        """
-        rates_by_slug = {}
-        for slug, card in self.cards_map.items():
-            # card['earning_rates'] contains the list of rate dicts
-            rates_by_slug[slug] = card.get('earning_rates', [])
-        return rates_by_slug
-
-
-            
     def _optimize_single(self, candidates, sort_by='recommended'):
         if sort_by == 'value':
              # Sort by Net Value DESC
@@ -193,54 +195,37 @@ class OptimizerService:
             
         return candidates[:10]
         
-    def _optimize_combo(self, candidates, planned_spend, monthly_capacity):
-        # Sort by Marginal Density DESC (still best for packing problem)
-        # But we could arguably consider rank_score here too?
-        # For now, let's keep density for the *selection* phase to maximize efficiency,
-        # but the request was "incorporate match score when ranking".
-        # The result of combo is a list.
-        # If we change the sort here, we change WHICH cards are picked.
-        # Let's keep the packer logic pure (Density) because "Match Score" is subjective utility,
-        # whereas fitting into a spend budget is mathematical constraint.
-        # However, we should display the match scores in the result.
-        
-        candidates.sort(key=lambda x: x['marginal_density'], reverse=True)
-        
-        selected = []
+    def _optimize_combo(self, candidates, planned_spend, monthly_capacity, bundle_size=DEFAULT_BUNDLE_SIZE):
+        # Exact branch-and-bound over the candidate set (see bundle_solver):
+        # maximize the bundle's net value subject to the total spend and the
+        # monthly spend capacity, with at most `bundle_size` cards.
+        bundles = solve_bundles(candidates, planned_spend, monthly_capacity, max_cards=clamp_bundle_size(bundle_size), top_n=1)
+        if not bundles:
+            return []
+        return self._allocate_bundle(bundles[0]['members'], planned_spend)
+
+    def _allocate_bundle(self, members, planned_spend):
+        """
+        Allocate spend across a bundle: each card gets the minimum to unlock its
+        bonus, the remainder goes to the best ongoing earner. Returns copies of
+        the candidates with net value / ROI rescored on their allocation.
+        """
+        selected = [dict(cand) for cand in members]
+        # Display order: most efficient card to apply for first
+        selected.sort(key=lambda x: x['marginal_density'], reverse=True)
+
         remaining_spend = planned_spend
-        
-        current_monthly_load = 0.0
-        
-        for cand in candidates:
-            if len(selected) >= 3: # Limit to 2-4 cards (let's say 3 for now)
-                break
-                
-            req_spend = cand['req_spend']
-            req_months = cand['req_months']
-            monthly_req = req_spend / req_months if req_months > 0 else 0
-            
-            # Check Feasibility
-            if req_spend <= remaining_spend:
-                # Check Monthly Bandwidth
-                if current_monthly_load + monthly_req <= monthly_capacity:
-                    # Select this card
-                    # Allocation: Min to unlock bonus
-                    cand['allocated_spend'] = req_spend
-                    remaining_spend -= req_spend
-                    current_monthly_load += monthly_req
-                    selected.append(cand)
-            
+        for cand in selected:
+            # Allocation: Min to unlock bonus
+            cand['allocated_spend'] = cand['req_spend']
+            remaining_spend -= cand['req_spend']
+
         # Allocate remaining spend to selected card with highest ongoing_rate
         if remaining_spend > 0 and selected:
-            # Find best earner among selected
             best_earner = max(selected, key=lambda x: x['ongoing_rate'])
             best_earner['allocated_spend'] += remaining_spend
-            # Re-calculate net value for this card with extra spend
-            # Original net_value was based on *planned_spend* (full spend).
-            # We need to adjust selected cards to show value based on *allocated_spend*.
-            
+
         # Recalculate Totals for Output
-        final_results = []
         for cand in selected:
             allocated = cand.get('allocated_spend', 0)
             # Recalculate value based on ACTUAL allocation
@@ -249,42 +234,32 @@ class OptimizerService:
             cand['net_value'] = val # Update for display
             cand['roi'] = (val / allocated * 100) if allocated > 0 else 0
             
-            # Update rank_score based on new net_value?
             # Rank score = Net Value + (Match Score * 2)
             # Match score doesn't change, but net_value did.
             cand['rank_score'] = val + (cand.get('match_score', 0) * 2.0)
             
-            final_results.append(cand)
-            
-        return final_results
+        return selected
             
 
 
+    def _get_rate_index(self):
+        """
+        Category -> rate index for Spend-It, built once per catalog version.
+        """
+        snapshot = db.get_catalog_snapshot()
+        if snapshot is None:
+            return SpendRateIndex(self.cards_map.values())
+        return snapshot.derived(
+            'spend_rate_index',
+            lambda s: SpendRateIndex(c for c in s.cards if c.get('is_active', True))
+        )
+
     def get_all_unique_categories(self):
         """
-        Returns a sorted list of all unique category strings found in default_rates.csv.
+        Returns a sorted list of all unique earning categories across the catalog
+        (excluding "All Purchases").
         """
-        all_rates = self._load_all_rates()
-        unique_cats = set()
-        
-        for slug, rates in all_rates.items():
-            for r in rates:
-                cat_data = r['category']
-                if isinstance(cat_data, str):
-                    try:
-                        cat_list = json.loads(cat_data)
-                    except json.JSONDecodeError:
-                        cat_list = [cat_data]
-                else:
-                    cat_list = cat_data if isinstance(cat_data, list) else [str(cat_data)]
-                
-                for c in cat_list:
-                    # Filter out empty and "All Purchases"
-                    if c and c.lower() != 'all purchases': 
-                         unique_cats.add(c)
-                         
-        sorted_cats = sorted(list(unique_cats))
-        return sorted_cats
+        return list(self._get_rate_index().all_categories)
 
     def calculate_spend_recommendations(self, amount, specific_category, parent_category, user_wallet_slugs, sibling_categories=None):
         """
@@ -295,198 +270,47 @@ class OptimizerService:
         """
         if sibling_categories is None:
             sibling_categories = []
-            
-        all_rates = self._load_all_rates()
-        
-        wallet_recs = []
-        opportunity_recs = []
-        
-        # Helper to find best rate for a card with fallback logic
-        def get_best_rate_for_card(slug, rates_list):
-            best_rate = 0.0
-            best_rate_data = None
-            match_type = 'Default' # 'Specific', 'Generic', 'Default'
-            
-            # Helper to check if a rate's category list contains a target string
-            def rate_matches(r, target):
-                if not target: return False, 0.0
-                cat_data = r['category']
-                if isinstance(cat_data, str):
-                    try:
-                        cat_list = json.loads(cat_data)
-                    except json.JSONDecodeError:
-                        cat_list = [cat_data]
-                else:
-                    cat_list = cat_data if isinstance(cat_data, list) else [str(cat_data)]
-                
-                for c_str in cat_list:
-                    if c_str.lower() == target.lower():
-                        return True, float(r.get('multiplier') or r.get('rate') or 0.0)
-                return False, 0.0
 
-            # 1. Try Specific Match (Step 2)
-            if specific_category:
-                # 1a. Exact Brand Match
-                for r in rates_list:
-                    is_match, val = rate_matches(r, specific_category)
-                    if is_match and val > best_rate:
-                        best_rate = val
-                        best_rate_data = r
-                        match_type = 'Specific'
-
-                # 1b. Hardcoded Fallbacks (Direct Airline / Hotel)
-                # If we haven't found a match yet (or want to maximize? User said "Direct Airline should also apply")
-                # We should check this and take the higher of the two? Or just treat it as a valid specific match.
-                
-                fallback_target = None
-                if parent_category:
-                     if parent_category.lower() == 'airlines':
-                         fallback_target = "Direct Airline Bookings"
-                     elif parent_category.lower() == 'hotels':
-                         fallback_target = "Direct Hotel Bookings"
-                
-                if fallback_target:
-                    for r in rates_list:
-                        is_match, val = rate_matches(r, fallback_target)
-                        if is_match and val > best_rate:
-                            best_rate = val
-                            best_rate_data = r
-                            match_type = 'Specific' # Count as specific per user intent
-
-                # If found specific match (either brand or direct fallback), return it
-                if match_type == 'Specific':
-                    return best_rate, best_rate_data, 'Specific'
-                
-                # If specific category was provided but NO match found (and no fallback match),
-                # User request: "does not match exactly ... always use the default rate."
-                # This implies we SKIP the "Parent Match" step below for this case.
-                pass 
-
-            # 2. Try Parent Match (Step 1 - Only if Step 2 wasn't provided)
-            # If specific_category IS provided, we skip this to enforce strictness + default fallback.
-            elif parent_category:
-                parent_best_rate = 0.0
-                parent_match_data = None
-                
-                for r in rates_list:
-                    is_match, val = rate_matches(r, parent_category)
-                    if is_match and val > parent_best_rate:
-                        parent_best_rate = val
-                        parent_match_data = r
-                
-                if parent_match_data:
-                    return parent_best_rate, parent_match_data, 'Generic'
-
-            # 3. Fallback to Default / All Purchases
-            default_best_rate = 0.0
-            default_match_data = None
-            
-            for r in rates_list:
-                is_base = r['is_default']
-                is_match, val = rate_matches(r, 'All Purchases')
-                
-                current_val = float(r.get('multiplier') or r.get('rate') or 0.0)
-                
-                if is_base or is_match:
-                    if current_val > default_best_rate:
-                        default_best_rate = current_val
-                        default_match_data = r
-            
-            return default_best_rate, default_match_data, 'Default'
+        index = self._get_rate_index()
+        is_rent = bool(specific_category) and specific_category.lower() == 'rent'
 
-        # Process ALL cards
-        for slug, card_obj in self.cards_map.items():
-            card_rates = all_rates.get(slug, [])
-            
-            rate_val, rate_data, match_type = get_best_rate_for_card(slug, card_rates)
-            
-            # If absolutely no rate found (unlikely if 'All Purchases' exists), skip or assume 0
-            if not rate_data and rate_val == 0:
-                 # Try to fallback to 1x if nothing else?
-                 rate_val = 1.0
-                 rate_data = {'currency': 'points', 'category': 'Base Estimate'}
-                 match_type = 'Default'
-
-            # Valuation (CPP)
-            raw_cpp = card_obj.get('points_value_cpp') or card_obj.get('PointsValueCpp', '1.0')
-            try:
-                cpp = float(raw_cpp) if isinstance(raw_cpp, (int, float)) or raw_cpp.replace('.', '', 1).isdigit() else 1.0
-            except:
-                cpp = 1.0
+        def matched_category_display(rate_data, cat_list):
+            # Determine Display Logic for "Matched Category"
+            if not rate_data.get('category'):
+                return "All Purchases"
+            if specific_category:
+                for c in cat_list:
+                    if c.lower() == specific_category.lower():
+                        return c
+            if parent_category:
+                for c in cat_list:
+                    if c.lower() == parent_category.lower():
+                        return c
+            # Likely All Purchases or Base Rate
+            if 'All Purchases' in cat_list:
+                return "All Purchases"
+            return cat_list[0] # Show whatever category that drove this rate
 
-            # Estimate Points & Value
-            currency_lower = rate_data.get('currency', 'points').lower()
-            
-            # Calculations
+        def estimate_value(entry):
+            rate_val = entry.multiplier
             est_points = amount * rate_val
-            
-            if 'cash' in currency_lower:
+            if 'cash' in entry.currency:
                 est_value = amount * (rate_val / 100.0)
-                # Ensure points display logic matches user expectation (multiplier * amount as "points" equivalent?)
-                # For consistency with previous step, we stick to:
-                est_points = amount * rate_val 
             else:
                 # Points: 3x -> 300 points -> Value = 300 * (cpp/100)
-                est_value = est_points * (cpp / 100.0)
-                
+                est_value = est_points * (entry.cpp / 100.0)
+
             # RENT LOGIC (3% Fee)
             # If category is Rent, apply 3% fee to value for all except Bilt
-            if specific_category and specific_category.lower() == 'rent':
-                if 'bilt' not in slug.lower(): # bilt-mastercard
-                     fee = amount * 0.03
-                     est_value -= fee
+            if is_rent and 'bilt' not in entry.slug.lower(): # bilt-mastercard
+                est_value -= amount * 0.03
+            return est_points, est_value
 
-            # Determine Display Logic for "Matched Category"
-            matched_display = "All Purchases"
-            if rate_data.get('category'):
-                raw_cats = rate_data['category']
-                if isinstance(raw_cats, str):
-                    try:
-                         # Try JSON parse
-                         cat_list = json.loads(raw_cats)
-                    except:
-                         cat_list = [raw_cats]
-                else:
-                    cat_list = raw_cats if isinstance(raw_cats, list) else [str(raw_cats)]
-                
-                # Check what matched
-                found_match = False
-                # Check specific
-                if specific_category:
-                     for c in cat_list:
-                         if c.lower() == specific_category.lower():
-                             matched_display = c
-                             found_match = True
-                             break
-                # Check parent
-                if not found_match and parent_category:
-                     for c in cat_list:
-                         if c.lower() == parent_category.lower():
-                             matched_display = c
-                             found_match = True
-                             break
-                # Fallback
-                if not found_match:
-                    # Likely All Purchases or Base Rate
-                    if 'All Purchases' in cat_list:
-                        matched_display = "All Purchases"
-                    else:
-                        matched_display = cat_list[0] # Show whatever category that drove this rate
-
-            # Collect all unique categories for this card for display
-            unique_categories = set()
-            for r in card_rates:
-                c_data = r['category']
-                if isinstance(c_data, str):
-                    try:
-                        c_list = json.loads(c_data)
-                    except json.JSONDecodeError:
-                        c_list = [c_data]
-                else:
-                    c_list = c_data if isinstance(c_data, list) else [str(c_data)]
-                
-                for c in c_list:
-                    unique_categories.add(c)
+        def build_item(entry, match_type):
+            card_obj = self.cards_map[entry.slug]
+            rate_val = entry.multiplier
+            currency_lower = entry.currency
+            est_points, est_value = estimate_value(entry)
 
             # Currency Display Logic
             if 'cash' in currency_lower:
@@ -495,35 +319,51 @@ class OptimizerService:
                 # Capitalize (Points, Miles, Avios)
                 currency_display = currency_lower.title() # "Avios", "Points"
 
-            result_item = {
+            return {
                 'card': card_obj,
                 'est_points': int(est_points),
                 'est_value': est_value,
                 'earning_rate': f"{rate_val}x" if 'cash' not in currency_lower else f"{rate_val}%",
-                'category_matched': matched_display,
-                'slug': slug,
+                'category_matched': matched_category_display(entry.rate, entry.categories),
+                'slug': entry.slug,
                 'card_name': card_obj.get('name', 'Unknown Card'),
-                'categories': sorted(list(unique_categories)),
+                'categories': index.card_categories.get(entry.slug, []),
                 'currency': currency_lower,
                 'currency_display': currency_display,
                 'match_type': match_type,
                 'is_specific_match': match_type == 'Specific',
-                'cpp': cpp
+                'cpp': entry.cpp
             }
-            
-            if slug in user_wallet_slugs:
-                wallet_recs.append(result_item)
-            else:
-                opportunity_recs.append(result_item)
-                
-        # Sort and limit
+
         # Sort key: (is_specific, value)
         # specific='Specific' -> 1, else 0
         def sort_key(item):
             priority = 1 if item['match_type'] == 'Specific' else 0
             return (priority, item['est_value'])
 
+        # Wallet: every owned card via O(1) index lookups (catalog order keeps ties stable)
+        wallet_recs = []
+        for slug in index.positions:
+            if slug in user_wallet_slugs and slug in self.cards_map:
+                entry, match_type = index.lookup(slug, specific_category, parent_category)
+                wallet_recs.append(build_item(entry, match_type))
         wallet_recs.sort(key=sort_key, reverse=True)
+
+        # Opportunities: top 5 merged from the presorted index
+        excluded = set(user_wallet_slugs) | {s for s in index.positions if s not in self.cards_map}
+        ranked = index.ranked(specific_category, parent_category, exclude=excluded)
+        if is_rent or amount <= 0:
+            # Rent fee / non-positive amounts change the value ordering, so rank exactly
+            opportunity_recs = [build_item(entry, match_type) for entry, match_type in ranked]
+            opportunity_recs.sort(key=lambda item: index.positions[item['slug']])
+            opportunity_recs.sort(key=sort_key, reverse=True)
+            opportunity_recs = opportunity_recs[:5]
+        else:
+            opportunity_recs = []
+            for entry, match_type in ranked:
+                opportunity_recs.append(build_item(entry, match_type))
+                if len(opportunity_recs) >= 5:
+                    break
         
         # Identify Winner(s)
         if wallet_recs:
@@ -534,61 +374,21 @@ class OptimizerService:
             # Synergy Calculation for Wallet Cards
             if sibling_categories:
                 # 1. Pre-calculate max rates for each sibling category across the wallet
-                max_rates_by_sibling = {sib: 0.0 for sib in sibling_categories}
-                
-                # We need to look at ALL wallet cards to find the true max, even those not in wallet_recs (though wallet_recs should have all by definition of calculate_recommendations logic filtering)
-                # Actually calculate_recommendations iterates all known cards and splits by wallet/opportunity.
-                # So wallet_recs contains all wallet cards.
-                
-                for item in wallet_recs:
-                    slug = item['slug']
-                    card_rates = all_rates.get(slug, [])
-                    
-                    for sibling in sibling_categories:
-                        sib_rate = 0.0
-                        # Simplified lookup
-                        for r in card_rates:
-                            cat_data = r['category']
-                            if isinstance(cat_data, str):
-                                try:
-                                    cat_list = json.loads(cat_data)
-                                except:
-                                    cat_list = [cat_data]
-                            else:
-                                cat_list = cat_data if isinstance(cat_data, list) else [str(cat_data)]
-                            
-                            for c in cat_list:
-                                if c.lower() == sibling.lower():
-                                    if float(r.get('multiplier') or r.get('rate') or 0.0) > sib_rate:
-                                        sib_rate = float(r.get('multiplier') or r.get('rate') or 0.0)
-                        
-                        if sib_rate > max_rates_by_sibling[sibling]:
-                            max_rates_by_sibling[sibling] = sib_rate
+                max_rates_by_sibling = {
+                    sibling: max([index.rate_for(item['slug'], sibling) for item in wallet_recs] + [0.0])
+                    for sibling in sibling_categories
+                }
 
                 # 2. Assign Synergies
                 for item in wallet_recs:
                     slug = item['slug']
-                    card_rates = all_rates.get(slug, [])
                     
                     best_synergy = None
                     best_synergy_rate = 0.0
                     
                     for sibling in sibling_categories:
                         # Find rate
-                        sib_rate = 0.0
-                        for r in card_rates:
-                            cat_data = r['category']
-                            if isinstance(cat_data, str):
-                                try:
-                                    cat_list = json.loads(cat_data)
-                                except:
-                                    cat_list = [cat_data]
-                            else:
-                                cat_list = cat_data if isinstance(cat_data, list) else [str(cat_data)]
-                            for c in cat_list:
-                                if c.lower() == sibling.lower():
-                                    if float(r.get('multiplier') or r.get('rate') or 0.0) > sib_rate:
-                                        sib_rate = float(r.get('multiplier') or r.get('rate') or 0.0)
+                        sib_rate = index.rate_for(slug, sibling)
                         
                         if sib_rate > 0:
                             # Prioritize the sibling that gives the highest rate for this card
@@ -661,8 +461,6 @@ class OptimizerService:
                     item['synergy'] = best_synergy
 
         # 3. Calculate Opportunity Cost / Net Gain
-        opportunity_recs.sort(key=sort_key, reverse=True)
-        
         # Calculate Lost Value
         best_wallet_val = wallet_recs[0]['est_value'] if wallet_recs else 0.0
         best_opp_val = opportunity_recs[0]['est_value'] if opportunity_recs else 0.0
@@ -697,7 +495,7 @@ class OptimizerService:
 
         return {
             'wallet': wallet_recs,
-            'opportunities': opportunity_recs[:5],
+            'opportunities': opportunity_recs,
             'lost_value': lost_value,
             'net_gain': net_gain
         }
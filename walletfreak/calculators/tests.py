@@ -0,0 +1,238 @@
+from django.test import TestCase
+
+
+class BundleSolverTest(TestCase):
+    def _candidates(self, rng, n):
+        return [{
+            'slug': f'card{i}',
+            'bonus_value': rng.choice([0, 150, 300, 600, 900]),
+            'annual_fee': rng.choice([0, 95, 250, 550]),
+            'ongoing_rate': rng.choice([0.01, 0.015, 0.02, 0.03]),
+            'req_spend': rng.choice([0, 500, 1000, 3000, 4000, 6000]),
+            'req_months': rng.choice([0, 3, 6]),
+            'marginal_density': rng.random(),
+        } for i in range(n)]
+
+    def _brute_force(self, candidates, planned_spend, monthly_capacity, max_cards):
+        from itertools import combinations
+        from calculators.bundle_solver import bundle_value
+        values = []
+        for size in range(1, max_cards + 1):
+            for members in combinations(candidates, size):
+                spend = sum(c['req_spend'] for c in members)
+                monthly = sum(c['req_spend'] / c['req_months'] if c['req_months'] else 0 for c in members)
+                if spend <= planned_spend and monthly <= monthly_capacity:
+                    values.append(bundle_value(members, planned_spend))
+        return sorted(values, reverse=True)
+
+    def test_matches_brute_force_on_small_instances(self):
+        import random
+        from calculators.bundle_solver import solve_bundles
+        rng = random.Random(7)
+        for trial in range(60):
+            candidates = self._candidates(rng, rng.randint(1, 8))
+            planned_spend = rng.choice([2000, 6000, 12000])
+            monthly_capacity = planned_spend / rng.choice([1, 3, 6])
+            max_cards = rng.randint(1, 4)
+            top_n = rng.randint(1, 5)
+            with self.subTest(trial=trial):
+                expected = self._brute_force(candidates, planned_spend, monthly_capacity, max_cards)[:top_n]
+                bundles = solve_bundles(candidates, planned_spend, monthly_capacity, max_cards=max_cards, top_n=top_n)
+                self.assertEqual(len(bundles), len(expected))
+                for bundle, value in zip(bundles, expected):
+                    self.assertAlmostEqual(bundle['net_value'], value, places=6)
+                    self.assertLessEqual(len(bundle['members']), max_cards)
+                    self.assertLessEqual(bundle['total_spend'], planned_spend)
+                    self.assertLessEqual(bundle['monthly_load'], monthly_capacity + 1e-9)
+
+    def test_gap_to_optimum(self):
+        from calculators.bundle_solver import solve_bundles
+        candidates = [
+            {'bonus_value': 600, 'annual_fee': 0, 'ongoing_rate': 0.01, 'req_spend': 1000, 'req_months': 3},
+            {'bonus_value': 300, 'annual_fee': 0, 'ongoing_rate': 0.01, 'req_spend': 1000, 'req_months': 3},
+        ]
+        bundles = solve_bundles(candidates, 2000, 2000, max_cards=2, top_n=3)
+        self.assertEqual([b['net_value'] for b in bundles], [920.0, 620.0, 320.0])
+        self.assertEqual([b['gap_to_optimum'] for b in bundles], [0.0, 300.0, 600.0])
+        self.assertAlmostEqual(bundles[1]['gap_pct'], 300 / 920 * 100)
+
+        # Nothing worth having: no percentage off a non-positive optimum
+        losing = [{'bonus_value': 0, 'annual_fee': 95, 'ongoing_rate': 0.0, 'req_spend': 0, 'req_months': 0}]
+        self.assertEqual(solve_bundles(losing, 1000, 1000)[0]['gap_pct'], 0.0)
+        self.assertEqual(solve_bundles([], 1000, 1000), [])
+
+    def test_bundle_size_is_clamped(self):
+        import random
+        from unittest.mock import patch
+        from calculators.bundle_solver import MAX_BUNDLE_SIZE, MIN_BUNDLE_SIZE, DEFAULT_BUNDLE_SIZE, clamp_bundle_size
+        from calculators.services import OptimizerService
+        from core.services import db
+        self.assertEqual(clamp_bundle_size('99'), MAX_BUNDLE_SIZE)
+        self.assertEqual(clamp_bundle_size(0), MIN_BUNDLE_SIZE)
+        self.assertEqual(clamp_bundle_size('four'), DEFAULT_BUNDLE_SIZE)
+        self.assertEqual(clamp_bundle_size(None), DEFAULT_BUNDLE_SIZE)
+
+        candidates = [{
+            'slug': f'card{i}', 'bonus_value': 500, 'annual_fee': 0, 'ongoing_rate': 0.01 * (i + 1),
+            'req_spend': 100, 'req_months': 3, 'marginal_density': random.Random(i).random(),
+        } for i in range(8)]
+        with patch.object(db, 'get_cards', return_value=[]):
+            service = OptimizerService()
+        with patch.object(service, '_build_candidates', return_value=(candidates, 10000)):
+            bundles = service.calculate_bundles(10000, 3, bundle_size=99, top_n=2)
+            combo = service.calculate_recommendations(10000, 3, mode='combo', bundle_size=99)
+        self.assertEqual([len(b['cards']) for b in bundles], [MAX_BUNDLE_SIZE, MAX_BUNDLE_SIZE])
+        self.assertEqual(len(combo), MAX_BUNDLE_SIZE)
+
+        # _allocate_bundle spreads all of the planned spend: minimums first, the rest to the best earner
+        self.assertEqual(sum(c['allocated_spend'] for c in combo), 10000)
+        best = max(combo, key=lambda c: c['ongoing_rate'])
+        self.assertEqual(best['allocated_spend'], 10000 - 100 * (MAX_BUNDLE_SIZE - 1))
+        self.assertEqual([c['marginal_density'] for c in combo],
+                         sorted((c['marginal_density'] for c in combo), reverse=True))
+        self.assertAlmostEqual(best['net_value'], 500 + best['allocated_spend'] * best['ongoing_rate'])
+        # The candidates themselves are left untouched
+        self.assertNotIn('allocated_spend', candidates[0])
+
+
+class SpendRateIndexTest(TestCase):
+    def _cards(self):
+        def card(slug, rates, cpp=1.0):
+            return {'id': slug, 'name': slug.title(), 'points_value_cpp': cpp, 'earning_rates': rates}
+        return [
+            card('flyer', [
+                {'category': ['Delta'], 'multiplier': 5},
+                {'category': ['Airlines'], 'multiplier': 3},
+                {'category': ['All Purchases'], 'multiplier': 1, 'is_default': True},
+            ]),
+            card('direct', [
+                {'category': '["Direct Airline Bookings"]', 'multiplier': 4},
+                {'category': ['Delta'], 'multiplier': 2},
+            ], cpp=1.5),
+            card('generalist', [
+                {'category': ['Airlines', 'Hotels'], 'multiplier': 3, 'currency': 'points', 'note': 'first'},
+                {'category': ['Airlines'], 'multiplier': 3, 'note': 'second'},
+                {'category': ['All Purchases'], 'multiplier': 2},
+            ]),
+            card('cashback', [{'category': ['All Purchases'], 'multiplier': 2, 'currency': 'Cash Back'}]),
+            card('bilt-mastercard', [{'category': ['Rent'], 'multiplier': 1}, {'category': ['All Purchases'], 'multiplier': 1}]),
+            card('bare', []),
+        ]
+
+    def _index(self):
+        from calculators.rate_index import SpendRateIndex
+        return SpendRateIndex(self._cards())
+
+    def test_lookup_precedence(self):
+        index = self._index()
+        entry, match = index.lookup('flyer', 'Delta', 'Airlines')
+        self.assertEqual((entry.multiplier, match), (5, 'Specific'))
+        # The direct-booking fallback wins when it beats the brand rate
+        entry, match = index.lookup('direct', 'delta', 'airlines')
+        self.assertEqual((entry.multiplier, entry.categories, match), (4, ['Direct Airline Bookings'], 'Specific'))
+        # A brand the card doesn't earn on falls to the base rate, not the parent category
+        entry, match = index.lookup('generalist', 'Delta', 'Airlines')
+        self.assertEqual((entry.multiplier, match), (2, 'Default'))
+        entry, match = index.lookup('generalist', None, 'Airlines')
+        self.assertEqual((entry.multiplier, match), (3, 'Generic'))
+        entry, match = index.lookup('flyer', None, None)
+        self.assertEqual((entry.multiplier, match), (1, 'Default'))
+        # No base rate on file: estimated at 1x points
+        entry, match = index.lookup('bare', None, 'Hotels')
+        self.assertEqual((entry.multiplier, entry.rate['category'], match), (1.0, 'Base Estimate', 'Default'))
+
+    def test_ties_keep_the_first_rate_and_catalog_order(self):
+        index = self._index()
+        # Equal multipliers on one card: the first rate is kept (strictly greater replaces)
+        self.assertEqual(index.card_rates['generalist']['airlines'].rate['note'], 'first')
+        self.assertIs(index.card_rates['generalist']['airlines'], index.card_rates['generalist']['hotels'])
+        # Equal value per dollar across cards: catalog order
+        self.assertEqual([e.slug for e in index.by_category['airlines']], ['flyer', 'generalist'])
+        ranked = [(e.slug, m) for e, m in index.ranked(None, 'Airlines')]
+        self.assertEqual(ranked[:3], [('flyer', 'Generic'), ('generalist', 'Generic'), ('cashback', 'Default')])
+        ranked = [(e.slug, m) for e, m in index.ranked('Delta', 'Airlines')]
+        self.assertEqual(ranked[:2], [('direct', 'Specific'), ('flyer', 'Specific')])
+        self.assertEqual(len(ranked), len(self._cards()))
+
+    def _recommend(self, amount, specific, parent, wallet=()):
+        from unittest.mock import patch
+        from calculators.services import OptimizerService
+        from core.services import db
+        with patch.object(db, 'get_cards', return_value=self._cards()), \
+             patch.object(db, 'get_catalog_snapshot', return_value=None):
+            return OptimizerService().calculate_spend_recommendations(amount, specific, parent, set(wallet))
+
+    def _reference(self, amount, specific, parent, wallet=()):
+        # Every card valued exactly, then sorted the way the pre-index code did
+        index = self._index()
+        items = []
+        for card in self._cards():
+            if card['id'] in wallet:
+                continue
+            entry, match = index.lookup(card['id'], specific, parent)
+            if 'cash' in entry.currency:
+                value = amount * entry.multiplier / 100.0
+            else:
+                value = amount * entry.multiplier * entry.cpp / 100.0
+            if specific and specific.lower() == 'rent' and 'bilt' not in card['id']:
+                value -= amount * 0.03
+            items.append((match == 'Specific', value, card['id']))
+        items.sort(key=lambda i: (i[0], i[1]), reverse=True)
+        return [(slug, round(value, 6)) for _, value, slug in items[:5]]
+
+    def test_rent_and_non_positive_amounts_rank_exactly(self):
+        for amount, specific, parent in [(1000, 'Rent', None), (0, None, 'Airlines'), (-250, 'Delta', 'Airlines'), (500, None, 'Airlines')]:
+            with self.subTest(amount=amount, specific=specific):
+                recs = self._recommend(amount, specific, parent, wallet={'bare'})
+                got = [(item['slug'], round(item['est_value'], 6)) for item in recs['opportunities']]
+                self.assertEqual(got, self._reference(amount, specific, parent, wallet={'bare'}))
+        rent = self._recommend(1000, 'Rent', None)['opportunities']
+        bilt = next(item for item in rent if item['slug'] == 'bilt-mastercard')
+        # Only Bilt avoids the 3% rent fee
+        self.assertEqual((bilt['match_type'], bilt['est_value']), ('Specific', 10.0))
+        self.assertEqual(rent[0]['slug'], 'bilt-mastercard')
+
+
+class OptimizerCalculateViewTest(TestCase):
+    def _post(self, data):
+        from unittest.mock import MagicMock, patch
+        from django.test import RequestFactory
+        from calculators import views
+
+        request = RequestFactory().post('/calculators/optimizer/calculate/', data)
+        request.user = MagicMock(is_authenticated=True, username='u1')
+        request.session = {'uid': 'u1'}
+        bundles = [
+            {'cards': [{'card': {'id': 'a'}}, {'card': {'id': 'b'}}], 'net_value': 900.0,
+             'total_spend': 5000, 'monthly_load': 1500, 'gap_to_optimum': 0.0, 'gap_pct': 0.0},
+            {'cards': [{'card': {'id': 'a'}}, {'card': {'id': 'c'}}], 'net_value': 800.0,
+             'total_spend': 4000, 'monthly_load': 1200, 'gap_to_optimum': 100.0, 'gap_pct': 11.1},
+        ]
+        service = MagicMock()
+        service.calculate_bundles.return_value = bundles
+        service.calculate_recommendations.return_value = [{'card': {'id': 'z'}}]
+        with patch.object(views.db, 'get_user_cards', return_value=[]), \
+             patch.object(views, 'OptimizerService', return_value=service), \
+             patch.object(views, 'render_to_string', return_value='') as render:
+            response = views.optimizer_calculate(request)
+        return response, service, render.call_args[0][1]
+
+    def test_bundle_size_from_form_ranks_bundles(self):
+        import json
+        response, service, context = self._post({'spend': '5000', 'timeframe': '3', 'bundle_size': '9'})
+
+        service.calculate_bundles.assert_called_once()
+        self.assertEqual(service.calculate_bundles.call_args.kwargs['bundle_size'], 5)
+        service.calculate_recommendations.assert_not_called()
+        self.assertEqual(context['mode'], 'combo')
+        self.assertEqual(len(context['bundles']), 2)
+        self.assertEqual(context['results'], context['bundles'][0]['cards'])
+        ids = [c['id'] for c in json.loads(response.content)['cards_data']]
+        self.assertEqual(ids, ['a', 'b', 'c'])
+
+    def test_no_bundle_size_keeps_single_mode(self):
+        response, service, context = self._post({'spend': '5000', 'timeframe': '3', 'bundle_size': ''})
+
+        service.calculate_bundles.assert_not_called()
+        self.assertEqual(context['mode'], 'single')
+        self.assertEqual(context['bundles'], [])
@@ -10,6 +10,7 @@ import ast
 from datetime import datetime, date
 from core.services import db
 from .services import OptimizerService
+from .bundle_solver import clamp_bundle_size
 from core.decorators import cache_control_header
 
 from django.contrib.auth.decorators import login_required
@@ -312,6 +313,10 @@ def optimizer_calculate(request):
         
     mode = request.POST.get('mode', 'single') # 'single' or 'combo'
     sort_by = request.POST.get('sort_by', 'recommended')
+    # Picking a bundle size on the form switches to combo mode
+    if request.POST.get('bundle_size'):
+        mode = 'combo'
+    bundle_size = clamp_bundle_size(request.POST.get('bundle_size'))
 
     # Get User Wallet (if authenticated)
     user_wallet_slugs = set()
@@ -323,26 +328,44 @@ def optimizer_calculate(request):
 
     # Initialize Service
     service = OptimizerService()
-    results = service.calculate_recommendations(
-        planned_spend=spend,
-        duration_months=timeframe_months,
-        user_wallet_slugs=user_wallet_slugs,
-        mode=mode,
-        uid=uid if request.user.is_authenticated else None,
-        sort_by=sort_by
-    )
-    
+    bundles = []
+    if mode == 'combo':
+        # Ranked bundles, best first; the leaderboard shows the best one
+        bundles = service.calculate_bundles(
+            planned_spend=spend,
+            duration_months=timeframe_months,
+            user_wallet_slugs=user_wallet_slugs,
+            uid=uid if request.user.is_authenticated else None,
+            bundle_size=bundle_size
+        )
+        results = bundles[0]['cards'] if bundles else []
+    else:
+        results = service.calculate_recommendations(
+            planned_spend=spend,
+            duration_months=timeframe_months,
+            user_wallet_slugs=user_wallet_slugs,
+            mode=mode,
+            uid=uid if request.user.is_authenticated else None,
+            sort_by=sort_by,
+            bundle_size=bundle_size
+        )
+
     context = {
         'results': results,
+        'bundles': bundles,
         'planned_spend': spend,
-        'mode': mode
+        'mode': mode,
+        'bundle_size': bundle_size
     }
-    
+
     # Render HTML partial
     html = render_to_string('calculators/optimizer_results.html', context, request=request)
-    
-    # Extract card data for modal usage
-    cards_data = [r['card'] for r in results]
+
+    # Extract card data for modal usage (every card in every bundle)
+    cards_data = {}
+    for r in results + [r for bundle in bundles for r in bundle['cards']]:
+        cards_data.setdefault(r['card'].get('id'), r['card'])
+    cards_data = list(cards_data.values())
     
     # Ensure JSON serializable (handle datetimes etc)
     cards_data_json = json.loads(json.dumps(cards_data, default=str))
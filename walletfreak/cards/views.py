@@ -180,13 +180,12 @@ def personality_detail(request, personality_id):
         except Exception:
              user_cards_list = []
 
-        all_cards_list = list(all_cards_map.values())
-        user_match_scores = db.calculate_match_scores(user_personality, user_cards_list, all_cards_list)
+        all_match_scores = db.get_user_match_scores(uid, user_cards_list, user_personality)
+        user_match_scores = {c_id: all_match_scores.get(c_id, 0) for c_id in all_cards_map}
         
         # Apply scores
         for c_id, score in user_match_scores.items():
-            if c_id in all_cards_map:
-                all_cards_map[c_id]['match_score'] = score
+            all_cards_map[c_id]['match_score'] = score
 
     # Store match scores in session or context if needed, but mainly we updated the card objects themselves 
     # which will be serialized into cards_json.
@@ -343,7 +342,7 @@ def card_list(request):
         except Exception:
              user_cards_list = []
 
-        user_match_scores = db.calculate_match_scores(user_personality, user_cards_list, all_cards)
+        user_match_scores = db.get_user_match_scores(uid, user_cards_list, user_personality)
         
         # Apply scores to card objects for template display
         for card in all_cards:
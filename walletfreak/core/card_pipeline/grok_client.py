@@ -1,13 +1,23 @@
 """xAI/Grok API client — uses the /v1/responses endpoint with tool-based web search."""
 
+import hashlib
 import json
 import logging
+import os
+import random
+import tempfile
+import threading
+import time
 import requests
 from dataclasses import dataclass, field
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+# Status codes worth retrying: rate limited, or a transient server-side failure
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 # xAI Grok pricing per million tokens (as of 2025)
 # Update these if pricing changes
@@ -27,6 +37,8 @@ class ApiUsage:
     input_cost: float = 0.0
     output_cost: float = 0.0
     total_cost: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
 
 
 @dataclass
@@ -36,32 +48,237 @@ class GrokCallResult:
     usage: ApiUsage = field(default_factory=ApiUsage)
 
 
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` tokens per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` tokens (going into debt if needed) and return how long to wait."""
+        with self.lock:
+            self._refill()
+            # A single request larger than the bucket only has to wait for a full bucket
+            amount = min(amount, self.capacity)
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """Return (positive) or charge (negative) tokens after the fact."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by all callers of a client."""
+
+    def __init__(self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens: int = 0):
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and estimated_tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            time.sleep(wait)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket once the real usage is known."""
+        if self.tokens and actual_tokens:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+
+class ResponseCache:
+    """On-disk cache of raw API responses, keyed by a hash of the request.
+
+    One JSON file per entry. Entries older than `ttl` seconds are ignored and
+    removed; once the directory grows past `max_bytes` the least recently used
+    entries (by file mtime, touched on every hit) are evicted.
+    """
+
+    DEFAULT_TTL = 24 * 60 * 60
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, directory: str, ttl: float | None = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, instructions: str, prompt: str, apply_url: str | None = None) -> str:
+        raw = json.dumps([model, instructions, prompt, apply_url], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl is not None and time.time() - entry.get('created', 0) > self.ttl:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get('response')
+
+    def set(self, key: str, response: dict):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'created': time.time(), 'response': response}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write Grok cache entry: %s", e)
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        with self.lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith('.json'):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+            if total <= self.max_bytes:
+                return
+            for _mtime, size, path in sorted(entries):
+                self._remove(path)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_cache_lock = threading.Lock()
+_default_caches = {}
+
+
+def get_response_cache(directory: str | None = None, ttl: float | None = ResponseCache.DEFAULT_TTL,
+                       max_bytes: int = ResponseCache.DEFAULT_MAX_BYTES) -> ResponseCache:
+    """Shared ResponseCache for `directory` (GROK_CACHE_DIR or a temp dir by default)."""
+    directory = directory or os.environ.get('GROK_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'walletfreak_grok_cache')
+    key = (directory, ttl, max_bytes)
+    with _cache_lock:
+        cache = _default_caches.get(key)
+        if cache is None:
+            cache = _default_caches[key] = ResponseCache(directory, ttl=ttl, max_bytes=max_bytes)
+        return cache
+
+
+_session_lock = threading.Lock()
+_shared_session = None
+
+
+def get_session(pool_size: int = 32) -> requests.Session:
+    """Process-wide pooled session so calls reuse TLS connections to the API."""
+    global _shared_session
+    with _session_lock:
+        if _shared_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _shared_session = session
+        return _shared_session
+
+
 class GrokClient:
     """Client for the xAI Grok API with web search support."""
 
     API_URL = "https://api.x.ai/v1/responses"
     DEFAULT_MODEL = "grok-4"
+    INSTRUCTIONS = "You are a helpful assistant that provides JSON updates for credit cards."
+    # Web search calls routinely take tens of seconds
+    DEFAULT_TIMEOUT = 300
+    MAX_RETRIES = 4
+    BACKOFF_BASE = 2.0
+    BACKOFF_MAX = 60.0
+    # Completion allowance added to the prompt estimate when reserving tokens
+    COMPLETION_TOKEN_ESTIMATE = 4000
 
-    def __init__(self, api_key: str, model: str | None = None):
+    def __init__(
+        self,
+        api_key: str,
+        model: str | None = None,
+        timeout: float | None = None,
+        max_retries: int | None = None,
+        rate_limiter: RateLimiter | None = None,
+        session: requests.Session | None = None,
+        cache: ResponseCache | None = None,
+        offline: bool = False,
+    ):
         self.api_key = api_key
         self.model = model or self.DEFAULT_MODEL
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+        self.max_retries = self.MAX_RETRIES if max_retries is None else max_retries
+        self.rate_limiter = rate_limiter
+        self.session = session or get_session()
+        # Responses are only cached when a cache is given; offline replays
+        # cached responses and never calls the API
+        self.cache = cache
+        self.offline = offline
 
-    def call(self, prompt: str, apply_url: str | None = None) -> dict | None:
+    def call(self, prompt: str, apply_url: str | None = None, use_cache: bool = True) -> dict | None:
         """Send a prompt to Grok and return parsed JSON response.
 
         Args:
             prompt: The user prompt to send.
             apply_url: Optional card application URL to restrict search domain.
+            use_cache: Set False to skip the response cache for this call.
 
         Returns:
             Parsed JSON dict from the response, or None on failure.
         """
-        result = self.call_with_usage(prompt, apply_url)
+        result = self.call_with_usage(prompt, apply_url, use_cache=use_cache)
         return result.data
 
-    def call_with_usage(self, prompt: str, apply_url: str | None = None) -> GrokCallResult:
+    def call_with_usage(self, prompt: str, apply_url: str | None = None, use_cache: bool = True,
+                        cache_if=None) -> GrokCallResult:
         """Send a prompt to Grok and return parsed JSON response with usage/cost info.
 
+        A cached response (same model, instructions, prompt and apply_url) is
+        replayed without an API call and reports zero tokens and one cache hit.
+        With use_cache=False the API is always called, and the fresh response
+        replaces the cached one. `cache_if(data)` can veto caching a response
+        that parsed but is not worth replaying.
+
         Returns:
             GrokCallResult with data and usage fields.
         """
@@ -74,22 +291,38 @@ class GrokClient:
             "model": self.model,
             "stream": False,
             "temperature": 0.2,
-            "instructions": "You are a helpful assistant that provides JSON updates for credit cards.",
+            "instructions": self.INSTRUCTIONS,
             "input": prompt,
             "tools": [{"type": "web_search"}],
         }
 
         call_result = GrokCallResult()
+        response = None
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(self.model, self.INSTRUCTIONS, prompt, apply_url)
 
         try:
-            response = requests.post(self.API_URL, headers=headers, json=payload)
-            response.raise_for_status()
+            result = self.cache.get(cache_key) if cache_key and use_cache else None
+            if result is not None:
+                call_result.usage = ApiUsage(cache_hits=1)
+            elif self.offline:
+                logger.warning("Offline: no cached Grok response for this prompt")
+                call_result.usage = ApiUsage(cache_misses=1)
+                return call_result
+            else:
+                estimated_tokens = self._estimate_tokens(prompt)
+                response = self._post(headers, payload, estimated_tokens)
+                response.raise_for_status()
 
-            result = response.json()
+                result = response.json()
 
-            # Extract usage
-            usage_data = result.get('usage', {})
-            call_result.usage = self._compute_usage(usage_data)
+                # Extract usage
+                usage_data = result.get('usage', {})
+                call_result.usage = self._compute_usage(usage_data)
+                call_result.usage.cache_misses = 1 if cache_key else 0
+                if self.rate_limiter:
+                    self.rate_limiter.settle(estimated_tokens, call_result.usage.total_tokens)
 
             # Extract text from output array
             content = self._extract_text(result)
@@ -97,13 +330,55 @@ class GrokClient:
                 content = self._strip_markdown(content)
                 call_result.data = json.loads(content)
 
+            # Only responses that parsed are worth replaying
+            if (cache_key and response is not None and call_result.data is not None
+                    and (cache_if is None or cache_if(call_result.data))):
+                self.cache.set(cache_key, result)
+
         except Exception as e:
             logger.error("API Request Failed: %s", e)
-            if 'response' in locals():
+            if response is not None:
                 logger.error("Response Body: %s", response.text[:500])
 
         return call_result
 
+    def _estimate_tokens(self, prompt: str) -> int:
+        """Rough token count for rate limiting (~4 characters per token)."""
+        return len(prompt) // 4 + self.COMPLETION_TOKEN_ESTIMATE
+
+    def _post(self, headers: dict, payload: dict, estimated_tokens: int) -> requests.Response:
+        """POST with rate limiting, a timeout, and retries on 429/5xx and connection errors.
+
+        Retries back off exponentially with full jitter, honouring Retry-After when
+        the API sends one. The last response (or exception) is returned/raised.
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(estimated_tokens)
+
+            retry_after = None
+            try:
+                response = self.session.post(self.API_URL, headers=headers, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning("Grok request failed (%s), retrying", e)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                logger.warning("Grok returned %s, retrying", response.status_code)
+                retry_after = response.headers.get('Retry-After')
+
+            delay = random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * (2 ** attempt)))
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            time.sleep(delay)
+            attempt += 1
+
     def _extract_text(self, result: dict) -> str | None:
         """Extract text content from /v1/responses output format."""
         for output_item in result.get('output', []):
@@ -3,6 +3,8 @@
 import os
 import uuid
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 
 from django.conf import settings
@@ -11,7 +13,7 @@ from .hydrator import hydrate_card
 from .dehydrator import dehydrate_and_save, DehydrationResult
 from .changelog import ChangeTracker, save_changelog
 from .categories import load_category_hierarchy
-from .grok_client import GrokClient, ApiUsage
+from .grok_client import GrokClient, ApiUsage, RateLimiter, get_response_cache
 from .prompts import build_update_prompt, build_batch_update_prompt
 from .models import ChangelogEntry
 
@@ -41,13 +43,35 @@ class CardUpdatePipeline:
         data_dir: str | None = None,
         changelog_dir: str | None = None,
         logger_obj=None,
+        workers: int = 1,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        use_cache: bool = True,
+        offline: bool = False,
     ):
-        self.client = GrokClient(api_key)
+        # One limiter for the whole run so concurrent workers share the API quota
+        rate_limiter = RateLimiter(
+            requests_per_minute or getattr(settings, 'GROK_REQUESTS_PER_MINUTE', 60),
+            tokens_per_minute or getattr(settings, 'GROK_TOKENS_PER_MINUTE', None),
+        )
+        # Reruns of an unchanged prompt replay the cached response; use_cache=False
+        # forces fresh calls (and refreshes the cache), offline never calls the API
+        cache = get_response_cache(
+            getattr(settings, 'GROK_CACHE_DIR', None),
+            ttl=getattr(settings, 'GROK_CACHE_TTL_SECONDS', 24 * 60 * 60),
+            max_bytes=getattr(settings, 'GROK_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+        )
+        self.client = GrokClient(api_key, rate_limiter=rate_limiter, cache=cache, offline=offline)
+        self.use_cache = use_cache
+        self.workers = max(1, workers or 1)
         self.master_dir = master_dir or os.path.join(settings.BASE_DIR, 'walletfreak_data', 'master_cards')
         self.data_dir = data_dir or os.path.join(settings.BASE_DIR, 'walletfreak_data')
         self.changelog_dir = changelog_dir or os.path.join(settings.BASE_DIR, 'walletfreak_data', 'changelogs')
         self.log = logger_obj or logger
         self.run_id = uuid.uuid4().hex[:8]
+        # Card files and changelogs are written one card at a time
+        self._save_lock = threading.Lock()
+        self._cat_hierarchy = None
 
     def run(
         self,
@@ -69,49 +93,96 @@ class CardUpdatePipeline:
             batch_size: Number of cards per API call. 1 = one card per call (default).
                         3-5 recommended for cost efficiency.
 
+        API calls for different cards/batches run on `self.workers` threads;
+        saving is serialized and results come back in input order.
+
         Returns:
             List of PipelineResult for each card processed.
         """
         results = []
         updated_slugs = []
+        self._cat_hierarchy = load_category_hierarchy(self.data_dir)
 
         if batch_size > 1 and not prompt_only and not dry_run:
             # Process in batches
-            for i in range(0, len(slugs), batch_size):
-                batch_slugs = slugs[i:i + batch_size]
-                batch_num = i // batch_size + 1
-                total_batches = (len(slugs) + batch_size - 1) // batch_size
-                _log(self.log, f"Batch {batch_num}/{total_batches}: {', '.join(batch_slugs)}")
+            batches = [slugs[i:i + batch_size] for i in range(0, len(slugs), batch_size)]
+
+            def process(item):
+                batch_num, batch_slugs = item
+                _log(self.log, f"Batch {batch_num}/{len(batches)}: {', '.join(batch_slugs)}")
+                return self._process_batch(batch_slugs, update_types)
 
-                batch_results = self._process_batch(batch_slugs, update_types)
+            for batch_results in self._map(process, list(enumerate(batches, 1))):
                 for r in batch_results:
                     results.append(r)
                     if r.success:
                         updated_slugs.append(r.slug)
         else:
-            # Process one at a time
-            for slug in slugs:
-                result = self._process_single_card(slug, update_types, dry_run, prompt_only)
+            # Process one card per call
+            def process(slug):
+                return self._process_single_card(slug, update_types, dry_run, prompt_only)
+
+            for result in self._map(process, slugs):
                 results.append(result)
                 if result.success and not prompt_only:
-                    updated_slugs.append(slug)
+                    updated_slugs.append(result.slug)
 
         # Log cost summary
         total_input = sum(r.usage.prompt_tokens for r in results)
         total_output = sum(r.usage.completion_tokens for r in results)
         total_cost = sum(r.usage.total_cost for r in results)
-        if total_input or total_output:
+        cache_hits = sum(r.usage.cache_hits for r in results)
+        cache_misses = sum(r.usage.cache_misses for r in results)
+        if total_input or total_output or cache_hits:
             _log(self.log, f"\n--- Cost Summary ---")
             _log(self.log, f"Cards processed: {len(results)}")
             _log(self.log, f"Total tokens: {total_input:,} input + {total_output:,} output = {total_input + total_output:,}")
             _log(self.log, f"Total cost: ${total_cost:.4f}")
             _log(self.log, f"Avg cost/card: ${total_cost / max(len(results), 1):.4f}")
+            _log(self.log, f"Response cache: {cache_hits} hits, {cache_misses} misses")
 
         if auto_seed and updated_slugs:
             self._auto_seed(updated_slugs)
 
         return results
 
+    def _map(self, fn, items):
+        """Apply fn to items on the worker pool, yielding results in input order."""
+        if self.workers <= 1 or len(items) <= 1:
+            return map(fn, items)
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as executor:
+            return list(executor.map(fn, items))
+
+    def _category_hierarchy(self):
+        if self._cat_hierarchy is None:
+            self._cat_hierarchy = load_category_hierarchy(self.data_dir)
+        return self._cat_hierarchy
+
+    def _save_card(self, slug: str, new_data: dict, update_types: list[str], result: PipelineResult):
+        """Validate + dehydrate + changelog for one card, one card at a time."""
+        with self._save_lock:
+            change_tracker = ChangeTracker(slug, run_id=self.run_id)
+            dehy_result = dehydrate_and_save(
+                master_dir=self.master_dir,
+                slug=slug,
+                new_data=new_data,
+                update_types=update_types,
+                dry_run=False,
+                validate=True,
+                change_tracker=change_tracker,
+                logger_obj=self.log,
+            )
+
+            result.dehydration_result = dehy_result
+            result.validation_errors = dehy_result.validation_errors
+
+            if change_tracker.has_changes():
+                changelog_entry = change_tracker.finalize()
+                save_changelog(self.changelog_dir, changelog_entry)
+                result.changelog = changelog_entry
+
+        result.success = True
+
     def _process_single_card(
         self,
         slug: str,
@@ -127,7 +198,7 @@ class CardUpdatePipeline:
             current_data = hydrate_card(self.master_dir, slug, update_types)
 
             # 2. Build prompt
-            cat_hierarchy = load_category_hierarchy(self.data_dir)
+            cat_hierarchy = self._category_hierarchy()
             prompt = build_update_prompt(current_data, slug, update_types, cat_hierarchy)
 
             if prompt_only:
@@ -141,7 +212,7 @@ class CardUpdatePipeline:
 
             # 3. Call Grok API
             apply_url = current_data.get('application_link')
-            call_result = self.client.call_with_usage(prompt, apply_url)
+            call_result = self.client.call_with_usage(prompt, apply_url, use_cache=self.use_cache)
             result.usage = call_result.usage
             new_data = call_result.data
 
@@ -149,29 +220,8 @@ class CardUpdatePipeline:
                 result.error = "Failed to get valid response from Grok API"
                 return result
 
-            # 4. Validate + Dehydrate + Save
-            change_tracker = ChangeTracker(slug, run_id=self.run_id)
-            dehy_result = dehydrate_and_save(
-                master_dir=self.master_dir,
-                slug=slug,
-                new_data=new_data,
-                update_types=update_types,
-                dry_run=False,
-                validate=True,
-                change_tracker=change_tracker,
-                logger_obj=self.log,
-            )
-
-            result.dehydration_result = dehy_result
-            result.validation_errors = dehy_result.validation_errors
-
-            # 5. Changelog
-            if change_tracker.has_changes():
-                changelog_entry = change_tracker.finalize()
-                save_changelog(self.changelog_dir, changelog_entry)
-                result.changelog = changelog_entry
-
-            result.success = True
+            # 4. Validate + Dehydrate + Save, 5. Changelog
+            self._save_card(slug, new_data, update_types, result)
 
         except Exception as e:
             result.error = str(e)
@@ -201,11 +251,11 @@ class CardUpdatePipeline:
                 return list(results.values())
 
             # 2. Build batch prompt
-            cat_hierarchy = load_category_hierarchy(self.data_dir)
+            cat_hierarchy = self._category_hierarchy()
             prompt = build_batch_update_prompt(cards_data, update_types, cat_hierarchy)
 
             # 3. Call Grok API once for the batch
-            call_result = self.client.call_with_usage(prompt)
+            call_result = self.client.call_with_usage(prompt, use_cache=self.use_cache)
             batch_response = call_result.data
 
             # Split cost evenly across cards in the batch
@@ -216,6 +266,8 @@ class CardUpdatePipeline:
                 input_cost=call_result.usage.input_cost / len(cards_data),
                 output_cost=call_result.usage.output_cost / len(cards_data),
                 total_cost=call_result.usage.total_cost / len(cards_data),
+                cache_hits=call_result.usage.cache_hits,
+                cache_misses=call_result.usage.cache_misses,
             )
 
             if not batch_response or not isinstance(batch_response, dict):
@@ -238,28 +290,7 @@ class CardUpdatePipeline:
                     continue
 
                 try:
-                    change_tracker = ChangeTracker(slug, run_id=self.run_id)
-                    dehy_result = dehydrate_and_save(
-                        master_dir=self.master_dir,
-                        slug=slug,
-                        new_data=new_data,
-                        update_types=update_types,
-                        dry_run=False,
-                        validate=True,
-                        change_tracker=change_tracker,
-                        logger_obj=self.log,
-                    )
-
-                    results[slug].dehydration_result = dehy_result
-                    results[slug].validation_errors = dehy_result.validation_errors
-
-                    if change_tracker.has_changes():
-                        changelog_entry = change_tracker.finalize()
-                        save_changelog(self.changelog_dir, changelog_entry)
-                        results[slug].changelog = changelog_entry
-
-                    results[slug].success = True
-
+                    self._save_card(slug, new_data, update_types, results[slug])
                 except Exception as e:
                     results[slug].error = str(e)
                     logger.exception("Error dehydrating %s from batch", slug)
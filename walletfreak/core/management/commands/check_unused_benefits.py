@@ -1,6 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import time
+
 from django.core.management.base import BaseCommand
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
 from core.services import db
-import datetime
+
+CHECKPOINT_COLLECTION = 'job_checkpoints'
+CHECKPOINT_ID = 'check_unused_benefits'
+# An unfinished run whose checkpoint has not moved for this long is abandoned
+# and the next run starts over
+CHECKPOINT_MAX_AGE = datetime.timedelta(hours=20)
+# Job type that carries an unfinished run on past the time budget
+CONTINUATION_JOB_TYPE = 'benefit_reminders'
+
+# Each email is two writes (mail doc + user's last-sent timestamp); Firestore caps a batch at 500
+MAIL_BATCH_SIZE = 200
+
+
+class MailBatchWriter:
+    """Queues reminder emails and commits them with the users' last-sent stamps in batched writes."""
+
+    def __init__(self, client, batch_size=MAIL_BATCH_SIZE):
+        self.client = client
+        self.batch_size = batch_size
+        self.batch = client.batch()
+        self.pending = 0
+        self.committed = 0
+
+    def add(self, uid, email_doc):
+        self.batch.set(self.client.collection('mail').document(), email_doc)
+        self.batch.update(self.client.collection('users').document(uid), {
+            'last_benefit_email_sent_at': firestore.SERVER_TIMESTAMP
+        })
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.batch.commit()
+            self.committed += self.pending
+            self.pending = 0
+            self.batch = self.client.batch()
+
 
 class Command(BaseCommand):
     help = 'Checks for unused credits on user cards'
@@ -9,186 +54,289 @@ class Command(BaseCommand):
         parser.add_argument('--user_id', type=str, help='Filter by specific User ID')
         parser.add_argument('--email', type=str, help='Filter by specific Email')
         parser.add_argument('--send-email', action='store_true', help='Send email to user with unused credits')
+        parser.add_argument('--page-size', type=int, default=200, help='Users fetched per page')
+        parser.add_argument('--workers', type=int, default=8, help='Users processed concurrently')
+        parser.add_argument('--resume', action='store_true', help='Continue an unfinished run from its checkpoint')
+        parser.add_argument('--max-seconds', type=float, default=0, help='Stop after this long and save a checkpoint (0 = no limit)')
+        parser.add_argument('--continue-as-job', action='store_true', help='When the time budget runs out, queue a job that resumes the run')
+        parser.add_argument('--job-id', type=str, help=argparse.SUPPRESS)
 
     def handle(self, *args, **options):
         self.stdout.write("Checking unused credits...")
         
         target_uid = options.get('user_id')
         target_email = options.get('email')
-        should_send = options.get('send_email')
-
-        # 1. Fetch Users
-        if target_uid:
-            user = db.get_user_profile(target_uid)
-            users = [user] if user else []
-        elif target_email:
-            # Not efficient but fine for tool
-            all_users = db.db.collection('users').stream()
-            users = []
-            for doc in all_users:
-                u = doc.to_dict() | {'id': doc.id}
-                if u.get('email') == target_email:
-                    users.append(u)
+        self.should_send = options.get('send_email')
+
+        # Shared for the whole run: cards are hydrated from the catalog snapshot
+        # and benefit periods resolved against one clock
+        self.snapshot = db.get_catalog_snapshot()
+        self.benefit_engine = db.get_benefit_period_engine(reminders=True)
+        self.stats = {'users': 0, 'with_cards': 0, 'emails': 0, 'errors': 0}
+
+        if target_uid or target_email:
+            if target_uid:
+                user = db.get_user_profile(target_uid)
+                users = [user] if user else []
+            else:
+                query = db.db.collection('users').where(filter=FieldFilter('email', '==', target_email)).limit(1)
+                users = [doc.to_dict() | {'id': doc.id} for doc in query.stream()]
+
+            self.stdout.write(f"Found {len(users)} users to check.")
+            writer = MailBatchWriter(db.db)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                self._process_page(users, executor, writer)
+            writer.flush()
+            self._write_summary()
+            return
+
+        self._run_paged(
+            page_size=max(1, options.get('page_size') or 200),
+            workers=max(1, options.get('workers') or 1),
+            resume=options.get('resume'),
+            max_seconds=options.get('max_seconds') or 0,
+            continue_as_job=options.get('continue_as_job'),
+            job_id=options.get('job_id'),
+        )
+
+    def _run_paged(self, page_size, workers, resume, max_seconds, continue_as_job=False, job_id=None):
+        """
+        Page through users by document id, process each page on a thread pool,
+        commit its emails, then checkpoint the last uid so a run that hits the
+        request timeout can be resumed with --resume.
+
+        With continue_as_job, running out of time queues a job that resumes
+        from the checkpoint (and chains again if needed), so one daily cron
+        call still reaches every user.
+        """
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        checkpoint_ref = db.db.collection(CHECKPOINT_COLLECTION).document(CHECKPOINT_ID)
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        last_uid = None
+
+        if resume:
+            checkpoint = self._load_checkpoint(checkpoint_ref)
+            if checkpoint:
+                continuation = checkpoint.get('continuation_job_id')
+                if continuation and continuation != job_id and self._job_pending(continuation):
+                    # The queued continuation owns the run; don't process the same users twice
+                    self.stdout.write(f"Run continues in job {continuation}; nothing to do.")
+                    return
+                last_uid = checkpoint.get('last_uid')
+                started_at = checkpoint.get('started_at') or started_at
+                self.stats.update(checkpoint.get('stats') or {})
+                self.stdout.write(f"Resuming after user {last_uid}.")
+
+        writer = MailBatchWriter(db.db)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                users = self._fetch_users_page(last_uid, page_size)
+                if not users:
                     break
-        else:
-            users_ref = db.db.collection('users')
-            users = [doc.to_dict() | {'id': doc.id} for doc in users_ref.stream()]
 
-        self.stdout.write(f"Found {len(users)} users to check.")
-        
+                self._process_page(users, executor, writer)
+                # Emails for this page are committed before the checkpoint moves past it
+                writer.flush()
+                last_uid = users[-1]['id']
+                self._save_checkpoint(checkpoint_ref, last_uid, started_at, completed=False)
 
+                if len(users) < page_size:
+                    break
+                if deadline and time.monotonic() >= deadline:
+                    self._write_summary()
+                    if continue_as_job:
+                        continuation = db.enqueue_job(CONTINUATION_JOB_TYPE, {
+                            'send_email': bool(self.should_send),
+                            'page_size': page_size,
+                            'workers': workers,
+                        })
+                        self._save_checkpoint(
+                            checkpoint_ref, last_uid, started_at, completed=False, continuation_job_id=continuation
+                        )
+                        self.stdout.write(self.style.WARNING(
+                            f"Time budget reached after user {last_uid}; continuing in job {continuation}."
+                        ))
+                    else:
+                        self.stdout.write(self.style.WARNING(
+                            f"Time budget reached after user {last_uid}; run again with --resume to continue."
+                        ))
+                    return
 
-        for user in users:
-            uid = user['id']
-            username = user.get('username', 'Unknown')
-            first_name = user.get('first_name', '').strip()
-            last_name = user.get('last_name', '').strip()
-            user_email = user.get('email')
-            
-            # Fetch active cards (Optimized: Only fetching benefits subcollection)
+        self._save_checkpoint(checkpoint_ref, None, started_at, completed=True)
+        self._write_summary()
+
+    def _fetch_users_page(self, last_uid, page_size):
+        query = db.db.collection('users').order_by('__name__').limit(page_size)
+        if last_uid:
+            query = query.start_after({'__name__': last_uid})
+        return [doc.to_dict() | {'id': doc.id} for doc in query.stream()]
+
+    def _job_pending(self, job_id):
+        try:
+            job = db.get_job(job_id)
+        except Exception as e:
+            self.stdout.write(f"  [WARN] Could not read job {job_id}: {e}")
+            return False
+        return bool(job) and job.get('status') in ('queued', 'running')
+
+    def _load_checkpoint(self, checkpoint_ref):
+        try:
+            doc = checkpoint_ref.get()
+        except Exception as e:
+            self.stdout.write(f"  [WARN] Could not read checkpoint: {e}")
+            return None
+        if not doc.exists:
+            return None
+        checkpoint = doc.to_dict()
+        if checkpoint.get('completed') or not checkpoint.get('last_uid'):
+            return None
+        # Age is measured from the last save, so a run that keeps making progress never expires
+        saved_at = checkpoint.get('updated_at') or checkpoint.get('started_at')
+        if saved_at and datetime.datetime.now(datetime.timezone.utc) - saved_at > CHECKPOINT_MAX_AGE:
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint_ref, last_uid, started_at, completed, continuation_job_id=None):
+        checkpoint_ref.set({
+            'last_uid': last_uid,
+            'started_at': started_at,
+            'updated_at': datetime.datetime.now(datetime.timezone.utc),
+            'completed': completed,
+            'continuation_job_id': continuation_job_id,
+            'stats': self.stats,
+        })
+
+    def _process_page(self, users, executor, writer):
+        # map() keeps page order, so each user's output stays together and in sequence
+        for outcome in executor.map(self._check_user, users):
+            self.stats['users'] += 1
+            self.stats['with_cards'] += outcome['has_cards']
+            self.stats['errors'] += outcome['error']
+            for line in outcome['lines']:
+                self.stdout.write(line)
+            if outcome['email']:
+                writer.add(outcome['uid'], outcome['email'])
+                self.stats['emails'] += 1
+
+    def _write_summary(self):
+        self.stdout.write(
+            f"\nChecked {self.stats['users']} users ({self.stats['with_cards']} with active cards), "
+            f"queued {self.stats['emails']} emails, {self.stats['errors']} errors."
+        )
+
+    def _get_active_wallet(self, uid):
+        """[(user_card, card_details)] for the user's active cards, hydrated from the catalog snapshot."""
+        if self.snapshot is None:
             user_cards = db.get_user_cards(uid, status='active', include_subcollections=['benefits'])
-            
-            if not user_cards:
-                continue
+            return [(u_card, u_card) for u_card in user_cards]
 
-            self.stdout.write(f"\nUser: {username} ({uid})")
-            
-            user_unused_items = []
+        wallet = []
+        for u_card in db.get_user_cards(uid, status='active', hydrate=False):
+            card = self.snapshot.get(u_card['id'])
+            if card:
+                wallet.append((u_card, card))
+        return wallet
+
+    def _check_user(self, user):
+        """
+        Runs on a worker thread: reads the user's cards and decides whether to
+        email. Returns the output lines and the mail document (or None); all
+        writes and counters are handled on the main thread.
+        """
+        outcome = {'uid': user['id'], 'lines': [], 'email': None, 'has_cards': False, 'error': False}
+        try:
+            outcome['email'] = self._check_user_benefits(user, outcome)
+        except Exception as e:
+            outcome['error'] = True
+            outcome['lines'].append(f"  [ERROR] Checking user {user['id']}: {e}")
+        return outcome
+
+    def _check_user_benefits(self, user, outcome):
+        uid = user['id']
+        lines = outcome['lines']
+        username = user.get('username', 'Unknown')
+        user_email = user.get('email')
+        
+        wallet = self._get_active_wallet(uid)
+        if not wallet:
+            return None
+
+        outcome['has_cards'] = True
+        lines.append(f"\nUser: {username} ({uid})")
+        
+        user_unused_items = []
+        
+        # Current period / limit / usage per benefit (same engine as the wallet pages)
+        for u_card, card, results in self.benefit_engine.wallet_benefits(wallet, tracked_only=False, include_periods=False):
+            card_name = card.get('name')
+
+            for result in results:
+                benefit = result['benefit']
+                # We are looking for monetary credits
+                if benefit.get('benefit_type') not in ['Credit', 'Perk']:
+                    continue
+                if result['is_ignored']:
+                    continue
+
+                desc = benefit.get('short_description') or benefit.get('description')
+                time_cat = result['frequency']
+                limit = result['limit']
+                used_amount = result['used']
+                is_full = result['is_full']
+                unused = result['remaining']
+                
+                # Only send for benefits that still need to be used this period
+                if limit > 0 and unused > 0.01:
+                    item = {
+                        'card_name': card_name,
+                        'benefit': desc,
+                        'limit': limit,
+                        'time_cat': time_cat,
+                        'used': used_amount,
+                        'unused': unused,
+                        'is_full': is_full
+                    }
+                    user_unused_items.append(item)
+                    lines.append(f"  - {card_name}: {desc}")
+                    lines.append(f"    Limit: ${limit:.2f} ({time_cat}) | Used: ${used_amount:.2f} | Unused: ${unused:.2f}")
+                    if is_full:
+                        lines.append(f"    (Marked as FULL)")
+
+        if not self.should_send:
+            return None
+        if not user_unused_items:
+            lines.append(f"  -> No credits found to email.")
+            return None
+        if not user_email:
+            return None
+
+        # Frequency Check logic (preferences come from the user doc we already have)
+        prefs = db.get_user_notification_preferences(uid, user=user)
+        benefit_prefs = prefs.get('benefit_expiration', {})
+        if not benefit_prefs.get('enabled', True):
+            lines.append(f"  -> Skipping: Benefit notifications disabled.")
+            return None
+
+        last_sent = user.get('last_benefit_email_sent_at')
+        freq_days = float(benefit_prefs.get('repeat_frequency', 1))
+        if last_sent:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            next_run = last_sent + datetime.timedelta(days=freq_days)
             
-            for u_card in user_cards:
-                card_slug = u_card.get('card_id')
-                card_name = u_card.get('name')
-
-                for idx, benefit in enumerate(u_card.get('benefits', [])):
-                    # We are looking for monetary credits
-                    # Usually indicated by 'dollar_value' > 0 and benefit_type='Credit' or 'Perk'
-                    if benefit.get('benefit_type') not in ['Credit', 'Perk']:
-                        continue
-
-                    dollar_val = benefit.get('dollar_value')
-                    
-                    if dollar_val and dollar_val > 0:
-                        credits_found = True
-                        desc = benefit.get('short_description') or benefit.get('description')
-                        time_cat = benefit.get('time_category', 'Annually')
-                        
-                        # Determine period key
-                        # This logic mirrors parse_benefits_csv or usage logic
-                        param_ann_date = u_card.get('anniversary_date')
-                        period_key = self._get_current_period_key(time_cat, param_ann_date)
-                        
-                        # Check usage
-                        usage_data = u_card.get('benefit_usage', {})
-                        # KEY FIX: Use benefit['id'] (stable) instead of index
-                        usage_key = benefit.get('id')
-                        if not usage_key:
-                            usage_key = str(idx) # Fallback
-                        
-                        b_usage = usage_data.get(usage_key, {})
-                        
-                        # Check if ignored
-                        if b_usage.get('is_ignored', False):
-                            continue
-                        
-                        used_amount = 0
-                        is_full = False
-                        
-                        # Calculate Limit (Per-Period)
-                        limit = dollar_val
-                        period_values = benefit.get('period_values', {})
-                        
-                        if period_key:
-                            # Use period specific limit if defined, else fallback
-                            # e.g. Monthly -> /12, but period_values might have exact overrides
-                            if period_key in period_values:
-                                limit = period_values[period_key]
-                            elif 'Monthly' in time_cat:
-                                limit = dollar_val / 12
-                            elif 'Quarterly' in time_cat:
-                                limit = dollar_val / 4
-                            elif 'Semi-annually' in time_cat:
-                                limit = dollar_val / 2
-                                
-                            # If structured with periods
-                            if 'periods' in b_usage:
-                                p_data = b_usage['periods'].get(period_key, {})
-                                used_amount = p_data.get('used', 0)
-                                is_full = p_data.get('is_full', False)
-                            else:
-                                # Fallback or flat usage (unlikely if period_key is set correctly but safety net)
-                                used_amount = b_usage.get('used', 0)
-                                is_full = b_usage.get('is_full', False)
-                        else:
-                            used_amount = b_usage.get('used', 0)
-                            is_full = b_usage.get('is_full', False)
-                            
-                        # If marked as full, assume fully used regardless of amount
-                        unused = 0 if is_full else (limit - used_amount)
-                        
-                        # Fix: Include ALL benefits for the current period, regardless of usage
-                        # But ensure we only show if there is a valid limit (i.e., it's a credit benefit)
-                        # AND if there is unused value remaining (user requirement: "only want to send an email for the benefits that still need to be used")
-                        if limit > 0 and unused > 0.01:
-                            item = {
-                                'card_name': card_name,
-                                'benefit': desc,
-                                'limit': limit,
-                                'time_cat': time_cat,
-                                'used': used_amount,
-                                'unused': unused,
-                                'is_full': is_full
-                            }
-                            user_unused_items.append(item)
-                            self.stdout.write(f"  - {card_name}: {desc}")
-                            self.stdout.write(f"    Limit: ${limit:.2f} ({time_cat}) | Used: ${used_amount:.2f} | Unused: ${unused:.2f}")
-                            if is_full:
-                                self.stdout.write(f"    (Marked as FULL)")
-
-            # Send Email if requested and items found
-            if should_send and user_unused_items and user_email:
-                # Frequency Check logic
-                try:
-                    prefs = db.get_user_notification_preferences(uid)
-                    benefit_prefs = prefs.get('benefit_expiration', {})
-                    if not benefit_prefs.get('enabled', True):
-                         self.stdout.write(f"  -> Skipping: Benefit notifications disabled.")
-                         continue
-
-                    last_sent = user.get('last_benefit_email_sent_at')
-                    freq_days = float(benefit_prefs.get('repeat_frequency', 1))
-                    
-                    should_notify = True
-                    if last_sent:
-                        import datetime
-                        # Ensure last_sent is timezone aware if using firestore
-                        # But simple comparison:
-                        now = datetime.datetime.now(datetime.timezone.utc)
-                        next_run = last_sent + datetime.timedelta(days=freq_days)
-                        
-                        # Add buffer zone of 1 hour (as per user request)
-                        # If the differential is within 1 hour, it is valid.
-                        # So if we are at 23h elapsed for a 24h cycle, (now) vs (next_run - 1h).
-                        # if now < (next_run - 1h) -> skip.
-                        
-                        buffer = datetime.timedelta(hours=1)
-                        if now < (next_run - buffer):
-                            should_notify = False
-                            time_left = (next_run - buffer) - now
-                            self.stdout.write(f"  -> Skipping: Recently notified. Next email in {time_left} (incl buffer).")
-                    
-                    if should_notify:
-                        self.stdout.write(f"  -> Sending email to {user_email}...")
-                        result = self.send_unused_credits_email(user_email, username, first_name, last_name, user_unused_items)
-                        if result:
-                             db.update_last_benefit_notification_time(uid)
-                    
-                except Exception as e:
-                    self.stdout.write(f"  [ERROR] Processing notification logic: {e}")
-                    
-            elif should_send and not user_unused_items:
-                 self.stdout.write(f"  -> No credits found to email.")
-
-    def send_unused_credits_email(self, to_email, username, first_name, last_name, items):
+            # Add buffer zone of 1 hour: at 23h elapsed on a 24h cycle we still send
+            buffer = datetime.timedelta(hours=1)
+            if now < (next_run - buffer):
+                time_left = (next_run - buffer) - now
+                lines.append(f"  -> Skipping: Recently notified. Next email in {time_left} (incl buffer).")
+                return None
+
+        lines.append(f"  -> Queuing email to {user_email}...")
+        subject, html_content, text_content = self.build_unused_credits_email(username, user_unused_items)
+        return db.build_email_document(to=user_email, subject=subject, html_content=html_content, text_content=text_content)
+
+    def build_unused_credits_email(self, username, items):
+        """Returns (subject, html_content, text_content)."""
         subject = "Your Credit Card Benefit Status Update"
         
         # Use username for greeting
@@ -266,89 +414,20 @@ class Command(BaseCommand):
         
         text_content += "\nCheck your wallet: https://walletfreak.com/wallet\n\nCheers,\nThe WalletFreak Team"
         
-        try:
-            db.send_email_notification(to=to_email, subject=subject, html_content=html_content, text_content=text_content)
-            self.stdout.write(self.style.SUCCESS("     Email sent successfully (queued)."))
-            return True
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"     Failed to send email: {e}"))
-            return False
-
-
-    def _get_current_period_key(self, time_category, anniversary_date_str=None):
-        today = datetime.date.today()
-        year = today.year
-        
-        # Parse Anniversary
-        ann_month = 1
-        ann_year = year
-        if anniversary_date_str and anniversary_date_str != 'default':
-            try:
-                ann_date = datetime.datetime.strptime(anniversary_date_str, '%Y-%m-%d').date()
-                ann_month = ann_date.month
-                ann_year = ann_date.year
-            except ValueError:
-                pass
-        elif anniversary_date_str == 'default':
-             # Default behavior from views.py: Jan 1st of previous year
-             ann_month = 1
-             ann_year = year - 1
-
-        if 'Monthly' in time_category:
-            return f"{year}_{today.month:02d}"
-            
-        elif 'Quarterly' in time_category:
-            q = (today.month - 1) // 3 + 1
-            return f"{year}_Q{q}"
-            
-        elif 'Semi-annually' in time_category:
-            # H1 (Jan-Jun), H2 (Jul-Dec)
-            # Standard calendar halves. 
-            # Note: Dashboard has complex logic for 'availability' based on anniversary, 
-            # but the KEYS are always Year_H1 or Year_H2 based on current month.
-            h = 1 if today.month <= 6 else 2
-            return f"{year}_H{h}"
-            
-        elif 'every 4 years' in time_category.lower():
-            # Align to 4-year blocks from Card Open Year (or 2020)
-            
-            # 1. Determine local "annual" start year
-            this_year_anniv = datetime.date(year, ann_month, 1) # Approximate day
-            if today < this_year_anniv:
-                annual_start_year = year - 1
-            else:
-                annual_start_year = year
+        return subject, html_content, text_content
 
-            # 2. Base Year
-            base_year = ann_year if ann_year else 2020
-            
-            # 3. Block
-            block_idx = (annual_start_year - base_year) // 4
-            block_start_year = base_year + (block_idx * 4)
-            block_end_year = block_start_year + 4
-            
-            return f"{block_start_year}_{block_end_year}"
-
-        elif 'Anniversary' in time_category:
-            # Period is functional based on anniversary year
-            # If today < anniversary in current year, we are in the period starting last year
-            
-            this_year_anniv = datetime.date(year, ann_month, 1) # Approx day
-            # If we had the exact day it would be better, but 'anniversary_date_str' usually has it.
-            if anniversary_date_str and anniversary_date_str != 'default':
-                 try:
-                     d = datetime.datetime.strptime(anniversary_date_str, '%Y-%m-%d').date()
-                     this_year_anniv = datetime.date(year, d.month, d.day)
-                 except:
-                     pass
-
-            if today < this_year_anniv:
-                start_year = year - 1
-            else:
-                start_year = year
-                
-            return f"{start_year}"
 
-        else:
-            # Calendar Year
-            return str(year)
\ No newline at end of file
+def run_benefit_reminders_job(payload, job):
+    """Job handler: resume an unfinished reminder run, chaining another job if it runs out of time again."""
+    from django.conf import settings
+    from django.core.management import call_command
+    call_command(
+        'check_unused_benefits',
+        send_email=payload.get('send_email', True),
+        page_size=payload.get('page_size', 200),
+        workers=payload.get('workers', 8),
+        resume=True,
+        max_seconds=getattr(settings, 'BENEFIT_REMINDER_MAX_SECONDS', 240),
+        continue_as_job=True,
+        job_id=job.get('id'),
+    )
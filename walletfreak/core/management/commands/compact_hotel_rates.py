@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from core.services import db
+
+
+class Command(BaseCommand):
+    help = 'Folds legacy per-night hotel price observation arrays into monthly rollup documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotel', type=str, help='Compact a single hotel_prices document')
+        parser.add_argument('--page-size', type=int, default=200, help='Hotels fetched per page')
+        parser.add_argument('--workers', type=int, default=8, help='Hotels compacted concurrently')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be compacted without writing')
+
+    def handle(self, *args, **options):
+        self.dry_run = options.get('dry_run')
+        self.stats = {'hotels': 0, 'nights': 0, 'observations': 0, 'months': 0, 'errors': 0}
+
+        if options.get('hotel'):
+            self._record(self._compact(options['hotel']))
+            self._write_summary()
+            return
+
+        page_size = max(1, options.get('page_size') or 200)
+        query = db.db.collection('hotel_prices').order_by('__name__').limit(page_size)
+        last_id = None
+
+        with ThreadPoolExecutor(max_workers=max(1, options.get('workers') or 1)) as executor:
+            while True:
+                page_query = query.start_after({'__name__': last_id}) if last_id else query
+                hotel_ids = [doc.id for doc in page_query.stream()]
+                if not hotel_ids:
+                    break
+                for outcome in executor.map(self._compact, hotel_ids):
+                    self._record(outcome)
+                last_id = hotel_ids[-1]
+                if len(hotel_ids) < page_size:
+                    break
+
+        self._write_summary()
+
+    def _compact(self, hotel_key):
+        try:
+            return hotel_key, db.compact_hotel_daily_rates(hotel_key, dry_run=self.dry_run), None
+        except Exception as e:
+            return hotel_key, None, e
+
+    def _record(self, outcome):
+        hotel_key, counts, error = outcome
+        self.stats['hotels'] += 1
+        if error:
+            self.stats['errors'] += 1
+            self.stdout.write(self.style.ERROR(f"  {hotel_key}: {error}"))
+            return
+        if counts['nights']:
+            self.stdout.write(
+                f"  {hotel_key}: {counts['nights']} nights, {counts['observations']} observations "
+                f"-> {counts['months']} monthly rollups"
+            )
+        for key in ('nights', 'observations', 'months'):
+            self.stats[key] += counts[key]
+
+    def _write_summary(self):
+        verb = 'Would compact' if self.dry_run else 'Compacted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {self.stats['nights']} nights ({self.stats['observations']} observations) "
+            f"into {self.stats['months']} monthly rollups across {self.stats['hotels']} hotels, "
+            f"{self.stats['errors']} errors."
+        ))
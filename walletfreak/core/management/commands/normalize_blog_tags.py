@@ -1,6 +1,5 @@
 import ast
 from django.core.management.base import BaseCommand
-from django.core.cache import cache
 from core.services import db
 
 
@@ -97,8 +96,7 @@ class Command(BaseCommand):
 
         # Clear caches
         if not dry_run and updated > 0:
-            cache.delete('all_published_blogs')
-            cache.delete('blog_sidebar_tags')
+            db.invalidate_blog_caches()
             self.stdout.write(self.style.SUCCESS('\nCleared blog caches.'))
 
         self.stdout.write(
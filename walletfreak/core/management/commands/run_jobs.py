@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from core.services import db
+from core.services.jobs import default_worker_id
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (strategy analysis, blog notifications) from the jobs collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Jobs run concurrently')
+        parser.add_argument('--once', action='store_true', help='Run the jobs due now and exit')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds between polls when idle')
+        parser.add_argument('--max-seconds', type=float, default=0, help='Stop after this long (0 = no limit)')
+        parser.add_argument('--prune-days', type=int, default=0, help='Also delete finished jobs older than this many days')
+
+    def handle(self, *args, **options):
+        workers = max(1, options.get('workers') or 1)
+        max_seconds = options.get('max_seconds') or 0
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        worker_id = default_worker_id()
+        self.stats = {'succeeded': 0, 'queued': 0, 'failed': 0, 'skipped': 0}
+
+        if options.get('prune_days'):
+            pruned = db.prune_finished_jobs(older_than_days=options['prune_days'])
+            self.stdout.write(f"Pruned {pruned} finished jobs.")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                job_ids = db.get_due_job_ids(limit=workers * 4)
+                ran = 0
+                for outcome in executor.map(lambda job_id: db.run_job(job_id, worker_id), job_ids):
+                    self.stats[outcome or 'skipped'] += 1
+                    ran += outcome is not None
+                if deadline and time.monotonic() >= deadline:
+                    break
+                if not ran:
+                    if options.get('once'):
+                        break
+                    time.sleep(options.get('poll_interval') or 5)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Jobs: {self.stats['succeeded']} succeeded, {self.stats['queued']} requeued for retry, "
+            f"{self.stats['failed']} failed, {self.stats['skipped']} already taken."
+        ))
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from core.services import db
+from core.services.bulk_writer import BulkSyncWriter
 from django.utils.text import slugify
 import os
 import json
@@ -40,6 +41,17 @@ class Command(BaseCommand):
             action='store_true',
             help='Seed category mapping only',
         )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rewrite every document even if its content hash is unchanged',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Number of write batches committed concurrently (default: 8)',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Seeding database...')
@@ -71,6 +83,7 @@ class Command(BaseCommand):
         
         # Determine what to seed
         seed_all = not any([card_slugs, types, seed_referrals, seed_personalities, seed_quiz_questions, seed_category_mapping])
+        self.seed_all = seed_all
         
         # 0. Pre-flight Check: Audit Data Integrity (only if seeding cards)
         # Note: Previous audit script might rely on old structure. Disabling for now unless rewritten, or assume it works on source dir
@@ -85,38 +98,57 @@ class Command(BaseCommand):
         
         # Get base directory
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-        
-        # Seed categories and cards
-        if seed_all or card_slugs_list or types_list or seed_category_mapping:
-            self._seed_categories_and_cards(base_dir, card_slugs_list, types_list, seed_all or seed_category_mapping or bool(card_slugs_list))
-        
-        # Seed referrals
-        if seed_all or seed_referrals or card_slugs_list:
-            self._seed_referrals(base_dir, card_slugs_list)
-        
-        # Seed personalities
-        if seed_all or seed_personalities:
-            self._seed_personalities()
-        
-        # Seed quiz questions
-        if seed_all or seed_quiz_questions:
-            self._seed_quiz_questions()
-        
-        # Seed Loyalty Programs
-        self._seed_loyalty_programs()
-        
-        # Seed Transfer Rules
-        self._seed_transfer_rules()
 
-        # Invalidate Django cache so stale card data doesn't persist
+        # Only new or changed documents are written; see BulkSyncWriter
+        self.referrals_changed = False
+        self.writer = BulkSyncWriter(db.db, max_workers=max(1, options.get('workers') or 1), force=options.get('force'))
         try:
-            from django.core.cache import cache
-            cache.delete('all_cards')
-            self.stdout.write('Invalidated cards cache.')
-        except Exception:
-            pass
+            # Seed categories and cards
+            if seed_all or card_slugs_list or types_list or seed_category_mapping:
+                self._seed_categories_and_cards(base_dir, card_slugs_list, types_list, seed_all or seed_category_mapping or bool(card_slugs_list))
+
+            # Card headers must land before referral links are added to them
+            self.writer.flush()
+
+            # Seed referrals
+            if seed_all or seed_referrals or card_slugs_list:
+                self._seed_referrals(base_dir, card_slugs_list)
+
+            # Seed personalities
+            if seed_all or seed_personalities:
+                self._seed_personalities()
+
+            # Seed quiz questions
+            if seed_all or seed_quiz_questions:
+                self._seed_quiz_questions()
+
+            # Seed Loyalty Programs
+            self._seed_loyalty_programs()
+
+            # Seed Transfer Rules
+            self._seed_transfer_rules()
+        finally:
+            self.writer.close()
+
+        stats = self.writer.stats
+        self.stdout.write(
+            f"Documents written: {stats['written']}, unchanged: {stats['skipped']}, "
+            f"deleted: {stats['deleted']}, failed: {stats['errors']} "
+            f"({stats['batches']} batches in {self.writer.elapsed:.1f}s)"
+        )
+
+        # Bump the catalog version so every worker rebuilds its card snapshot
+        if self.writer.changed or self.referrals_changed:
+            try:
+                db.bump_catalog_version()
+                self.stdout.write('Bumped card catalog version.')
+            except Exception:
+                pass
 
-        self.stdout.write(self.style.SUCCESS('Database seeding completed successfully.'))
+        if stats['errors']:
+            self.stdout.write(self.style.WARNING('Database seeding finished with write errors; run it again to retry them.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Database seeding completed successfully.'))
 
     def _seed_categories_and_cards(self, base_dir, card_slugs_list, types_list, seed_categories):
         """Seed categories and credit cards data from new relational structure"""
@@ -164,6 +196,13 @@ class Command(BaseCommand):
             card_dirs = [d for d in card_dirs if d in card_slugs_list]
             self.stdout.write(f'Filtering to {len(card_dirs)} specified cards')
 
+        # Fetch every manifest this run compares against in one round trip
+        manifest_paths = ['master_cards', 'categories']
+        for card_slug in card_dirs:
+            for sub_name in ('benefits', 'earning_rates', 'sign_up_bonus', 'card_questions'):
+                manifest_paths.append(f'master_cards/{card_slug}/{sub_name}')
+        self.writer.prefetch(manifest_paths)
+
         for card_slug in card_dirs:
             card_path = os.path.join(updates_dir, card_slug)
             header_path = os.path.join(card_path, 'header.json')
@@ -203,73 +242,42 @@ class Command(BaseCommand):
             if 'is_active' not in card_data:
                 card_data['is_active'] = True
 
-            db.create_document('master_cards', card_data, doc_id=card_slug, merge=should_merge)
-            
+            # Fold the benefit version map into the header so it is one write
+            version_map = self._build_benefit_version_map(card_path)
+            if version_map:
+                card_data['benefit_version_map'] = version_map
+
+            header_counts = self.writer.sync('master_cards', {card_slug: card_data}, merge=should_merge)
+
             seeded_types = []
+            counts = dict(header_counts)
 
             # Helpers
-            def seed_subcollection(sub_name, sub_json_dir, seed_type_key, delete_existing=True):
+            def seed_subcollection(sub_name, sub_json_dir, seed_type_key):
                 # If types_list provided and this type is NOT in it, skip
                 if types_list and seed_type_key not in types_list:
                     return 0
 
                 sub_path = os.path.join(card_path, sub_json_dir)
-                coll_ref = db.db.collection(f'master_cards/{card_slug}/{sub_name}')
-                
                 if not os.path.exists(sub_path):
                     return 0
 
-                # Batch Delete
-                if delete_existing:
-                     try:
-                        delete_batch = db.db.batch()
-                        delete_count = 0
-                        existing_docs = list(coll_ref.stream())
-                        for d in existing_docs:
-                            delete_batch.delete(d.reference)
-                            delete_count += 1
-                            if delete_count >= 400:
-                                delete_batch.commit()
-                                delete_batch = db.db.batch()
-                                delete_count = 0
-                        if delete_count > 0:
-                            delete_batch.commit()
-                     except Exception as e:
-                        print(f"Error purging {sub_name}: {e}")
-                
-                # Batch Write
-                write_batch = db.db.batch()
-                write_count = 0
-                total_items = 0
-                
+                items = {}
                 for fname in os.listdir(sub_path):
                     if not fname.endswith('.json'):
                         continue
-                        
-                    f_full_path = os.path.join(sub_path, fname)
-                    with open(f_full_path, 'r') as f:
+                    with open(os.path.join(sub_path, fname), 'r') as f:
                         try:
-                            item_data = json.load(f)
                             # Filename as ID
-                            doc_id = fname.replace('.json', '')
-                             
-                            doc_ref = coll_ref.document(doc_id)
-                            write_batch.set(doc_ref, item_data)
-                            write_count += 1
-                            total_items += 1
-                            
-                            if write_count >= 400:
-                                write_batch.commit()
-                                write_batch = db.db.batch()
-                                write_count = 0
-                                
+                            items[fname.replace('.json', '')] = json.load(f)
                         except json.JSONDecodeError:
                             print(f"Error decoding {fname}")
-                            
-                if write_count > 0:
-                    write_batch.commit()
-                    
-                return total_items
+
+                # Docs no longer present locally are removed
+                sub_counts = self.writer.sync(f'master_cards/{card_slug}/{sub_name}', items, prune=True)
+                for key in counts:
+                    counts[key] += sub_counts[key]
+                return len(items)
 
             # Seed Subcollections
             
@@ -289,25 +297,22 @@ class Command(BaseCommand):
             c_qs = seed_subcollection('card_questions', 'card_questions', 'calculator_questions')
             if c_qs: seeded_types.append(f'{c_qs} questions')
 
-            # Build and store benefit version map
-            version_map = self._build_benefit_version_map(card_path)
             if version_map:
-                db.db.collection('master_cards').document(card_slug).update({
-                    'benefit_version_map': version_map
-                })
                 seeded_types.append(f'{len(version_map)} version mappings')
 
-            self.stdout.write(f'Seeded {card_slug}: {", ".join(seeded_types)}')
+            self.stdout.write(
+                f'Seeded {card_slug}: {", ".join(seeded_types)} '
+                f'({counts["written"]} written, {counts["skipped"]} unchanged, {counts["deleted"]} deleted)'
+            )
 
         # Seed changelogs to Firestore
-        if seed_all or card_slugs_list or types_list:
+        if self.seed_all or card_slugs_list or types_list:
             self._seed_changelogs(base_dir, card_slugs_list)
 
         # After processing all cards, upsert collected categories
         if seed_categories and all_categories:
              self.stdout.write(f'Upserting {len(all_categories)} categories...')
-             for cat_name, cat_data in all_categories.items():
-                 db.create_document('categories', cat_data, doc_id=slugify(cat_name))
+             self.writer.sync('categories', {slugify(cat_name): cat_data for cat_name, cat_data in all_categories.items()})
 
     def _seed_referrals(self, base_dir, card_slugs_list):
         """Seed referral links for cards"""
@@ -341,7 +346,10 @@ class Command(BaseCommand):
                 card_doc = card_ref.get()
                 if card_doc.exists:
                     referral_links = [{'link': l, 'weight': 1} for l in links]
+                    if (card_doc.to_dict() or {}).get('referral_links') == referral_links:
+                        continue
                     card_ref.update({'referral_links': referral_links})
+                    self.referrals_changed = True
                     self.stdout.write(f'  - Added {len(referral_links)} referral links to {slug}')
                 else:
                     self.stdout.write(self.style.WARNING(f'  - Card {slug} not found, skipping referrals'))
@@ -355,10 +363,8 @@ class Command(BaseCommand):
             with open(json_path, 'r') as f:
                 personalities = json.load(f)
                 
-            for p in personalities:
-                slug = p['slug']
-                db.create_document('personalities', p, doc_id=slug)
-                self.stdout.write(f'Seeded personality: {p["name"]}')
+            counts = self.writer.sync('personalities', {p['slug']: p for p in personalities})
+            self.stdout.write(f'Seeded {len(personalities)} personalities ({counts["written"]} written, {counts["skipped"]} unchanged)')
                 
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f'Could not find {json_path}'))
@@ -372,10 +378,8 @@ class Command(BaseCommand):
             with open(quiz_json_path, 'r') as f:
                 quiz_questions = json.load(f)
                 
-            for question in quiz_questions:
-                question_id = f'stage_{question["stage"]}'
-                db.create_document('quiz_questions', question, doc_id=question_id)
-                self.stdout.write(f'Seeded quiz question: Stage {question["stage"]}')
+            counts = self.writer.sync('quiz_questions', {f'stage_{q["stage"]}': q for q in quiz_questions})
+            self.stdout.write(f'Seeded {len(quiz_questions)} quiz questions ({counts["written"]} written, {counts["skipped"]} unchanged)')
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f'Could not find {quiz_json_path}'))
         except json.JSONDecodeError:
@@ -388,9 +392,8 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING(f"Loyalty directory not found: {loyalty_dir}"))
             return
 
-        batch = db.db.batch()
-        count = 0
-        
+        programs = {}
+
         for filename in os.listdir(loyalty_dir):
             if not filename.endswith('.json'):
                 continue
@@ -406,18 +409,10 @@ class Command(BaseCommand):
             if not pid:
                 continue
                 
-            doc_ref = db.db.collection('program_loyalty').document(pid)
-            batch.set(doc_ref, data)
-            count += 1
-            
-            if count % 400 == 0:
-                batch.commit()
-                batch = db.db.batch()
-                
-        if count % 400 != 0:
-            batch.commit()
-            
-        self.stdout.write(f"Seeded {count} loyalty programs.")
+            programs[pid] = data
+
+        counts = self.writer.sync('program_loyalty', programs)
+        self.stdout.write(f"Seeded {len(programs)} loyalty programs ({counts['written']} written, {counts['skipped']} unchanged).")
 
     def _seed_transfer_rules(self):
         self.stdout.write("Seeding transfer rules...")
@@ -426,9 +421,8 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING(f"Transfer rules directory not found: {transfers_dir}"))
             return
 
-        batch = db.db.batch()
-        count = 0
-        
+        rules = {}
+
         for filename in os.listdir(transfers_dir):
             if not filename.endswith('.json'):
                 continue
@@ -444,18 +438,10 @@ class Command(BaseCommand):
             if not source_id:
                 continue
                 
-            doc_ref = db.db.collection('transfer_rules').document(source_id)
-            batch.set(doc_ref, data)
-            count += 1
-            
-            if count % 400 == 0:
-                batch.commit()
-                batch = db.db.batch()
-                
-        if count % 400 != 0:
-            batch.commit()
-            
-        self.stdout.write(f"Seeded transfer rules for {count} source programs.")
+            rules[source_id] = data
+
+        counts = self.writer.sync('transfer_rules', rules)
+        self.stdout.write(f"Seeded transfer rules for {len(rules)} source programs ({counts['written']} written, {counts['skipped']} unchanged).")
 
     def _build_benefit_version_map(self, card_dir):
         """Build a map of old benefit version IDs to current active version IDs.
@@ -523,8 +509,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('No changelogs directory found'))
             return
 
-        batch = db.db.batch()
-        count = 0
+        entries = {}
 
         for filename in sorted(os.listdir(changelog_dir)):
             if not filename.endswith('.json'):
@@ -546,16 +531,7 @@ class Command(BaseCommand):
             except (json.JSONDecodeError, OSError):
                 continue
 
-            doc_id = filename.replace('.json', '')
-            doc_ref = db.db.collection('card_changelogs').document(doc_id)
-            batch.set(doc_ref, data)
-            count += 1
-
-            if count % 400 == 0:
-                batch.commit()
-                batch = db.db.batch()
-
-        if count % 400 != 0:
-            batch.commit()
+            entries[filename.replace('.json', '')] = data
 
-        self.stdout.write(f"Seeded {count} changelog entries.")
+        counts = self.writer.sync('card_changelogs', entries)
+        self.stdout.write(f"Seeded {len(entries)} changelog entries ({counts['written']} written, {counts['skipped']} unchanged).")
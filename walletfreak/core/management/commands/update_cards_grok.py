@@ -18,6 +18,14 @@ class Command(BaseCommand):
         parser.add_argument('--prompt', action='store_true', help='Output prompt for debugging')
         parser.add_argument('--batch-size', type=int, default=1,
                             help='Number of cards per API call (1=default, 3-5 recommended for cost savings)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of cards/batches sent to the API concurrently (default 1)')
+        parser.add_argument('--rpm', type=float, help='Max API requests per minute (default: GROK_REQUESTS_PER_MINUTE)')
+        parser.add_argument('--tpm', type=float, help='Max API tokens per minute (default: GROK_TOKENS_PER_MINUTE)')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Always call the API instead of replaying cached responses')
+        parser.add_argument('--offline', action='store_true',
+                            help='Only replay cached responses; cards without one fail instead of calling the API')
         parser.add_argument('--deprecate', type=str, help='Deprecate a card: slug:reason:successor1,successor2')
 
     def handle(self, *args, **options):
@@ -75,11 +83,23 @@ class Command(BaseCommand):
 
         # Run pipeline
         self.stdout.write(f"Processing {len(slugs)} cards...")
-        pipeline = CardUpdatePipeline(api_key=api_key, master_dir=master_dir, logger_obj=self.stdout)
+        workers = max(1, options.get('workers') or 1)
+        pipeline = CardUpdatePipeline(
+            api_key=api_key,
+            master_dir=master_dir,
+            logger_obj=self.stdout,
+            workers=workers,
+            requests_per_minute=options.get('rpm'),
+            tokens_per_minute=options.get('tpm'),
+            use_cache=not options.get('no_cache'),
+            offline=options.get('offline', False),
+        )
 
         batch_size = options.get('batch_size', 1)
         if batch_size > 1:
             self.stdout.write(f"Batch mode: {batch_size} cards per API call")
+        if workers > 1:
+            self.stdout.write(f"Concurrency: {workers} API calls in flight")
 
         results = pipeline.run(
             slugs=slugs,
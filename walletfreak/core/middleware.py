@@ -1,15 +1,41 @@
 """
 Middleware to handle Firebase authentication for Django admin access.
 """
+from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib.auth import login
 from .admin_auth import FirebaseAdminBackend
 from .services import FirestoreService
+from .services.request_scope import request_scope
 
 db = FirestoreService()
 
 
+class FirestoreRequestScopeMiddleware:
+    """
+    Reads each Firestore document at most once per request: the middleware,
+    context processors and view all share the profile (and anything else
+    read through get_document) instead of fetching it again.
+
+    Only GET/HEAD requests share documents; other methods may write, so
+    they read fresh but are still counted. The scope (with its counts) is
+    left on request.firestore_scope and, with FIRESTORE_READ_HEADER
+    (default: DEBUG), summarised in an X-Firestore-Reads header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_scope(share_documents=request.method in ('GET', 'HEAD')) as scope:
+            request.firestore_scope = scope
+            response = self.get_response(request)
+        if getattr(settings, 'FIRESTORE_READ_HEADER', settings.DEBUG):
+            response['X-Firestore-Reads'] = f'{scope.reads} reads, {scope.hits} deduplicated'
+        return response
+
+
 class FirebaseAdminMiddleware:
     """
     Middleware that checks Firebase authentication for admin access.
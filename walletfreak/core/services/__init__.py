@@ -8,6 +8,7 @@ from .datapoints import DataPointMixin
 from .subscriptions import SubscriptionMixin
 from .loyalty import LoyaltyMixin
 from .hotel_prices import HotelPriceMixin
+from .jobs import JobMixin
 
 class FirestoreService(
     UserMixin,
@@ -19,6 +20,7 @@ class FirestoreService(
     SubscriptionMixin,
     LoyaltyMixin,
     HotelPriceMixin,
+    JobMixin,
     BaseFirestoreService
 ):
     """
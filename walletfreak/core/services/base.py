@@ -1,6 +1,7 @@
 import firebase_admin
 from firebase_admin import firestore, storage
 from django.conf import settings
+from .request_scope import current_scope, forget_document
 
 class BaseFirestoreService:
     def __init__(self):
@@ -31,15 +32,24 @@ class BaseFirestoreService:
         return [{**doc.to_dict(), 'id': doc.id} for doc in docs]
 
     def get_document(self, collection_name, doc_id):
+        # Within a request each document is read at most once (see request_scope)
+        scope = current_scope()
+        path = f'{collection_name}/{doc_id}'
+        if scope is not None:
+            found, document = scope.get(path)
+            if found:
+                return document
         doc_ref = self.db.collection(collection_name).document(doc_id)
         doc = doc_ref.get()
-        if doc.exists:
-            return {**doc.to_dict(), 'id': doc.id}
-        return None
+        document = {**doc.to_dict(), 'id': doc.id} if doc.exists else None
+        if scope is not None:
+            scope.put(path, document)
+        return document
 
     def create_document(self, collection_name, data, doc_id=None, merge=False):
         if doc_id:
             self.db.collection(collection_name).document(doc_id).set(data, merge=merge)
+            forget_document(f'{collection_name}/{doc_id}')
             return doc_id
         else:
             update_time, doc_ref = self.db.collection(collection_name).add(data)
@@ -48,6 +58,8 @@ class BaseFirestoreService:
     def update_document(self, collection_name, doc_id, data):
         doc_ref = self.db.collection(collection_name).document(doc_id)
         doc_ref.update(data)
+        forget_document(f'{collection_name}/{doc_id}')
 
     def delete_document(self, collection_name, doc_id):
         self.db.collection(collection_name).document(doc_id).delete()
+        forget_document(f'{collection_name}/{doc_id}')
@@ -0,0 +1,348 @@
+"""
+Benefit periods: turns a benefit's `time_category` and the card's
+`anniversary_date` into periods, limits and usage.
+
+Shared by the web dashboard, the mobile wallet endpoint and the unused
+benefits reminder job so the three always agree on which period is current
+and how much of it is left.
+"""
+import calendar
+from datetime import datetime
+
+MONTH_LABELS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Benefits that are not "use it or lose it" credits; the wallet doesn't track them
+UNTRACKED_BENEFIT_TYPES = ('Protection', 'Bonus', 'Perk', 'Lounge', 'Status', 'Insurance')
+
+DEFAULT_TIME_CATEGORY = 'Annually (calendar year)'
+
+MONTHLY = 'monthly'
+QUARTERLY = 'quarterly'
+SEMI_ANNUAL = 'semi-annually'
+EVERY_4_YEARS = 'every 4 years'
+ANNIVERSARY = 'anniversary'
+CALENDAR_YEAR = 'calendar'
+
+
+def frequency_kind(time_category):
+    freq = (time_category or DEFAULT_TIME_CATEGORY).lower()
+    if 'monthly' in freq:
+        return MONTHLY
+    if 'semi-annually' in freq:
+        return SEMI_ANNUAL
+    if 'quarterly' in freq:
+        return QUARTERLY
+    if 'every 4 years' in freq:
+        return EVERY_4_YEARS
+    if 'anniversary' in freq:
+        return ANNIVERSARY
+    return CALENDAR_YEAR
+
+
+def _safe_datetime(year, month, day, *time):
+    # Feb 29 anniversaries fall on Feb 28 in other years
+    return datetime(year, month, min(day, calendar.monthrange(year, month)[1]), *time)
+
+
+def _period_status(used, is_full, limit):
+    if is_full or used >= limit:
+        return 'full'
+    return 'partial' if used > 0 else 'empty'
+
+
+def _period_usage(usage, key, flat_fallback=False):
+    """
+    (used, is_full) for one period of a benefit_usage entry. The wallet pages
+    only read `periods`; the reminder job has always fallen back to the flat
+    used/is_full of an entry without periods.
+    """
+    if 'periods' in usage:
+        data = (usage.get('periods') or {}).get(key) or {}
+    elif flat_fallback:
+        data = usage
+    else:
+        data = {}
+    return (data.get('used') or 0), bool(data.get('is_full', False))
+
+
+class PeriodClock:
+    """'Now' for one request or job run, split into the calendar parts periods use."""
+
+    def __init__(self, now=None):
+        self.now = now or datetime.now()
+        self.year = self.now.year
+        self.month = self.now.month
+        self.quarter = (self.month - 1) // 3 + 1
+        self.half = 1 if self.month <= 6 else 2
+
+
+class CardTerm:
+    """
+    A user card's anniversary resolved against the clock; computed once per
+    card and shared by all of its benefits.
+    """
+
+    def __init__(self, anniversary_date_str, clock):
+        year = clock.year
+        if anniversary_date_str == 'default':
+            # "I don't know" is stored as 'default': Jan 1st of the previous year
+            self.month, self.year, self.day = 1, year - 1, 1
+        else:
+            self.month, self.year, self.day = 1, year, 1
+            if anniversary_date_str:
+                try:
+                    opened = datetime.strptime(anniversary_date_str, '%Y-%m-%d')
+                    self.month, self.year, self.day = opened.month, opened.year, opened.day
+                except (TypeError, ValueError):
+                    pass
+
+        # Cards opened this year only have periods from their anniversary on
+        self.opened_this_year = self.year >= year
+        self.quarter = (self.month - 1) // 3 + 1
+
+        # Start of the current anniversary year, and the 4-year block around it
+        self.start_year = year - 1 if clock.now < _safe_datetime(year, self.month, self.day) else year
+        self.block_start = self.year + ((self.start_year - self.year) // 4) * 4
+        self.block_end = self.block_start + 4
+
+    def anniversary(self, year, *time):
+        return _safe_datetime(year, self.month, self.day, *time)
+
+
+class BenefitSchedule:
+    """
+    Catalog side of one dollar-valued benefit: its usage key, period kind and
+    per-period limits. Lives as long as the catalog snapshot it was built from.
+    """
+    __slots__ = ('benefit', 'benefit_id', 'benefit_type', 'frequency', 'kind', 'dollar_value', 'period_values', '_layouts')
+
+    def __init__(self, benefit, index):
+        self.benefit = benefit
+        self.benefit_id = benefit.get('id') or str(index)
+        self.benefit_type = benefit.get('benefit_type')
+        self.frequency = benefit.get('time_category') or DEFAULT_TIME_CATEGORY
+        self.kind = frequency_kind(self.frequency)
+        self.dollar_value = benefit.get('dollar_value')
+        self.period_values = benefit.get('period_values') or {}
+        self._layouts = {}
+
+    @property
+    def is_tracked(self):
+        return self.benefit_type not in UNTRACKED_BENEFIT_TYPES
+
+    def layout(self, year):
+        """
+        [(label, key, limit, number)] for the calendar-subdivided kinds
+        (months, quarters, halves) of `year`; memoized per year.
+        """
+        layout = self._layouts.get(year)
+        if layout is None:
+            dv = self.dollar_value
+            pv = self.period_values
+            if self.kind == MONTHLY:
+                keys = [(label, f"{year}_{m:02d}", m) for m, label in enumerate(MONTH_LABELS, start=1)]
+                divisor = 12
+            elif self.kind == QUARTERLY:
+                keys = [(f"Q{q}", f"{year}_Q{q}", q) for q in range(1, 5)]
+                divisor = 4
+            elif self.kind == SEMI_ANNUAL:
+                keys = [(f"H{h}", f"{year}_H{h}", h) for h in (1, 2)]
+                divisor = 2
+            else:
+                keys = []
+                divisor = 1
+            layout = tuple((label, key, pv.get(key, dv / divisor), n) for label, key, n in keys)
+            self._layouts[year] = layout
+        return layout
+
+    def current_window(self, term, clock):
+        """
+        The current period: (label, key, limit, start, end, reset_date).
+        `reset_date` is only set for annual and multi-year periods.
+        """
+        year = clock.year
+        dv = self.dollar_value
+        if self.kind in (MONTHLY, QUARTERLY, SEMI_ANNUAL):
+            number = {MONTHLY: clock.month, QUARTERLY: clock.quarter, SEMI_ANNUAL: clock.half}[self.kind]
+            label, key, limit, _ = self.layout(year)[number - 1]
+            if self.kind == MONTHLY:
+                start_month, end_month = clock.month, clock.month
+            elif self.kind == QUARTERLY:
+                start_month, end_month = (clock.quarter - 1) * 3 + 1, clock.quarter * 3
+            else:
+                start_month, end_month = (1, 6) if clock.half == 1 else (7, 12)
+            start = datetime(year, start_month, 1)
+            end = datetime(year, end_month, calendar.monthrange(year, end_month)[1], 23, 59, 59)
+            return label, key, limit, start, end, None
+
+        if self.kind == EVERY_4_YEARS:
+            key = f"{term.block_start}_{term.block_end}"
+            label = f"{term.block_start}-{term.block_end}"
+            start = term.anniversary(term.block_start)
+            reset = term.anniversary(term.block_end)
+        elif self.kind == ANNIVERSARY:
+            key = str(term.start_year)
+            label = str(year)
+            start = term.anniversary(term.start_year)
+            reset = term.anniversary(term.start_year + 1)
+        else:
+            key = str(year)
+            label = str(year)
+            start = datetime(year, 1, 1)
+            reset = datetime(year, 12, 31)
+        end = reset.replace(hour=23, minute=59, second=59)
+        # Single-period kinds are limited by the full dollar value on the wallet pages
+        return label, key, dv, start, end, reset.strftime('%b %d, %Y')
+
+    def is_available(self, number, term, clock):
+        """Whether a month / quarter / half has started since the card was opened."""
+        if self.kind == MONTHLY:
+            current, opened = clock.month, term.month
+        elif self.kind == QUARTERLY:
+            current, opened = clock.quarter, term.quarter
+        else:
+            if not term.opened_this_year:
+                return clock.month >= (1 if number == 1 else 7)
+            if number == 1:
+                return term.month <= 6
+            return (term.month <= 6 and clock.month >= 7) or (term.month >= 7 and clock.month >= term.month)
+        if not term.opened_this_year:
+            return number <= current
+        return opened <= number <= current
+
+
+def build_card_schedule(card):
+    """BenefitSchedules for a card's dollar-valued benefits, in catalog order."""
+    schedule = []
+    for idx, benefit in enumerate(card.get('benefits', []) or []):
+        dollar_value = benefit.get('dollar_value')
+        if isinstance(dollar_value, bool) or not isinstance(dollar_value, (int, float)) or dollar_value <= 0:
+            continue
+        schedule.append(BenefitSchedule(benefit, idx))
+    return schedule
+
+
+class BenefitScheduleIndex:
+    """Per-card benefit schedules for a whole catalog; built once per catalog snapshot."""
+
+    def __init__(self, cards=()):
+        self._by_card = {}
+        for card in cards:
+            self._by_card[card['id']] = (card.get('benefits'), build_card_schedule(card))
+
+    def for_card(self, card):
+        entry = self._by_card.get(card.get('id'))
+        # Copies of snapshot cards share its benefits list; anything else is built here
+        if entry is not None and entry[0] is card.get('benefits'):
+            return entry[1]
+        return build_card_schedule(card)
+
+
+class BenefitPeriodEngine:
+    """
+    Answers "current period, limit, used, remaining" for benefits against one
+    clock. `current()` is O(1) per benefit; `evaluate()` adds the full period
+    strip the wallet pages render.
+    """
+
+    def __init__(self, index=None, now=None, reminders=False):
+        self.index = index or BenefitScheduleIndex()
+        self.clock = PeriodClock(now)
+        # The reminder job's rules: flat usage fallback, and period_values
+        # overrides for single-period kinds too
+        self.reminders = reminders
+
+    def term(self, user_card):
+        return CardTerm(user_card.get('anniversary_date', ''), self.clock)
+
+    def _is_ignored(self, usage, start):
+        if not usage.get('is_ignored', False):
+            return False
+        # An ignore only holds for the period it was set in
+        last_updated = usage.get('last_updated')
+        if not last_updated:
+            return False
+        if getattr(last_updated, 'tzinfo', None):
+            last_updated = last_updated.replace(tzinfo=None)
+        try:
+            return not last_updated < start
+        except TypeError:
+            return True
+
+    def current(self, schedule, user_card, term=None):
+        term = term or self.term(user_card)
+        usage = (user_card.get('benefit_usage') or {}).get(schedule.benefit_id, {})
+        label, key, limit, start, end, reset_date = schedule.current_window(term, self.clock)
+        if self.reminders:
+            limit = schedule.period_values.get(key, limit)
+        used, is_full = _period_usage(usage, key, flat_fallback=self.reminders)
+        return {
+            'schedule': schedule,
+            'benefit': schedule.benefit,
+            'benefit_id': schedule.benefit_id,
+            'frequency': schedule.frequency,
+            'label': label,
+            'period_key': key,
+            'limit': limit,
+            'used': used,
+            'is_full': is_full,
+            'remaining': 0 if is_full else max(0, limit - used),
+            'status': _period_status(used, is_full, limit),
+            'reset_date': reset_date,
+            'days_until_expiration': (end - self.clock.now).days,
+            'is_ignored': self._is_ignored(usage, start),
+        }
+
+    def evaluate(self, schedule, user_card, term=None):
+        term = term or self.term(user_card)
+        result = self.current(schedule, user_card, term)
+        if schedule.kind in (MONTHLY, QUARTERLY, SEMI_ANNUAL):
+            usage = (user_card.get('benefit_usage') or {}).get(schedule.benefit_id, {})
+            current_key = result['period_key']
+            periods = []
+            for label, key, limit, number in schedule.layout(self.clock.year):
+                is_current = key == current_key
+                used, is_full = _period_usage(usage, key, flat_fallback=self.reminders and is_current)
+                periods.append({
+                    'label': label,
+                    'key': key,
+                    'status': _period_status(used, is_full, limit),
+                    'is_current': is_current,
+                    'max_value': limit,
+                    'is_available': schedule.is_available(number, term, self.clock),
+                    'used': used,
+                })
+        else:
+            periods = [{
+                'label': result['label'],
+                'key': result['period_key'],
+                'status': result['status'],
+                'is_current': True,
+                'max_value': result['limit'],
+                'used': result['used'],
+                'reset_date': result['reset_date'],
+            }]
+        result['periods'] = periods
+        result['ytd_used'] = sum(p['used'] for p in periods)
+        result['potential'] = sum(p['max_value'] for p in periods)
+        return result
+
+    def card_benefits(self, card_details, user_card, tracked_only=True, include_periods=True):
+        """Results for every dollar-valued benefit of one wallet card."""
+        term = self.term(user_card)
+        evaluate = self.evaluate if include_periods else self.current
+        return [
+            evaluate(schedule, user_card, term)
+            for schedule in self.index.for_card(card_details)
+            if schedule.is_tracked or not tracked_only
+        ]
+
+    def wallet_benefits(self, wallet, tracked_only=True, include_periods=True):
+        """
+        Batch form of card_benefits over a wallet of (user_card, card_details)
+        pairs. Returns [(user_card, card_details, [result, ...]), ...].
+        """
+        return [
+            (user_card, card_details, self.card_benefits(card_details, user_card, tracked_only, include_periods))
+            for user_card, card_details in wallet
+        ]
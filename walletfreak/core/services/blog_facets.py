@@ -0,0 +1,86 @@
+FACETS = ('tag', 'vendor', 'experience_level', 'read_time', 'premium')
+
+
+def _post_facet_values(post):
+    from blog.views.utils import parse_tags_helper
+    return {
+        'tag': set(parse_tags_helper(post.get('tags'))),
+        'vendor': {post['vendor']} if post.get('vendor') else set(),
+        'experience_level': {post['experience_level']} if post.get('experience_level') else set(),
+        'read_time': {post['read_time']} if post.get('read_time') else set(),
+        'premium': {True} if post.get('is_premium') else set(),
+    }
+
+
+class BlogFacetIndex:
+    """
+    Bitset per facet value over the published listing (bit i = post i).
+
+    Values selected within one facet are ORed, facets are ANDed, so any
+    filter combination is a handful of integer operations. Built with the
+    listing and cached inside it, so it always matches the posts it indexes.
+    """
+
+    def __init__(self, posts):
+        self.size = len(posts)
+        self.positions = {post.get('id'): i for i, post in enumerate(posts)}
+        self.all = (1 << self.size) - 1
+        self.bits = {facet: {} for facet in FACETS}
+        for i, post in enumerate(posts):
+            bit = 1 << i
+            for facet, values in _post_facet_values(post).items():
+                for value in values:
+                    self.bits[facet][value] = self.bits[facet].get(value, 0) | bit
+
+    def values(self, facet):
+        return sorted(self.bits[facet])
+
+    def _facet_mask(self, facet, selected):
+        mask = 0
+        for value in selected:
+            mask |= self.bits[facet].get(value, 0)
+        return mask
+
+    def mask(self, selections, skip=None):
+        """Bitset of posts matching {facet: [values]}; empty selections are ignored."""
+        mask = self.all
+        for facet, selected in selections.items():
+            if selected and facet != skip:
+                mask &= self._facet_mask(facet, selected)
+        return mask
+
+    def select(self, selections):
+        """Listing positions of matching posts, in listing order."""
+        mask = self.mask(selections)
+        positions = []
+        while mask:
+            low = mask & -mask
+            positions.append(low.bit_length() - 1)
+            mask ^= low
+        return positions
+
+    def counts(self, selections, within=None):
+        """
+        {facet: {value: count}}: how many posts each value would match given
+        the other facets' selections (a facet's own selection is ignored, so
+        its other values still show what picking them would add).
+        Restrict to positions in `within` (a bitset) when given.
+        """
+        out = {}
+        for facet in FACETS:
+            base = self.mask(selections, skip=facet)
+            if within is not None:
+                base &= within
+            out[facet] = {
+                value: (bits & base).bit_count()
+                for value, bits in self.bits[facet].items()
+            }
+        return out
+
+    def mask_for_ids(self, post_ids):
+        mask = 0
+        for post_id in post_ids:
+            i = self.positions.get(post_id)
+            if i is not None:
+                mask |= 1 << i
+        return mask
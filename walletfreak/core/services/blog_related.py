@@ -0,0 +1,72 @@
+import heapq
+import math
+from collections import Counter
+
+from .blog_search import tokenize
+
+# Weight of each source of features; tags and vendor are matched as whole values
+FEATURE_WEIGHTS = {'title': 3.0, 'tag': 4.0, 'vendor': 3.0, 'excerpt': 1.5, 'content': 1.0}
+# Highest TF-IDF features kept per post; bounds the cost of the similarity pass
+MAX_FEATURES_PER_POST = 40
+
+
+def _post_features(post, body):
+    from blog.views.utils import parse_tags_helper
+    features = Counter()
+    for field in ('title', 'excerpt', 'content'):
+        text = body if field == 'content' else post.get(field)
+        weight = FEATURE_WEIGHTS[field]
+        for term, tf in Counter(tokenize(text)).items():
+            features[term] += tf * weight
+    for tag in parse_tags_helper(post.get('tags')):
+        features[f'tag:{tag}'] += FEATURE_WEIGHTS['tag']
+    if post.get('vendor'):
+        features[f"vendor:{post['vendor'].lower()}"] += FEATURE_WEIGHTS['vendor']
+    return features
+
+
+def compute_related_posts(posts, bodies, k=3):
+    """
+    {post_id: [up to k related post ids]} for every post in `posts` (listing
+    order, newest first), in one pass.
+
+    Each post is a sparse, L2-normalised TF-IDF vector over its words, tags
+    and vendor; neighbours are ranked by cosine similarity, computed only
+    between posts that share a feature. Posts with fewer than k neighbours
+    are topped up with the newest other posts.
+    """
+    ids = [post.get('id') for post in posts]
+    raw = [_post_features(post, bodies.get(post.get('id'))) for post in posts]
+    n = len(posts)
+
+    df = Counter()
+    for features in raw:
+        df.update(features.keys())
+    idf = {f: math.log(n / count) for f, count in df.items()}
+
+    postings = {}
+    vectors = []
+    for i, features in enumerate(raw):
+        # Sublinear tf (every feature weight is >= 1) so a long body cannot drown out the tags
+        weighted = {f: (1 + math.log(tf)) * idf[f] for f, tf in features.items() if idf[f] > 0}
+        top = heapq.nlargest(MAX_FEATURES_PER_POST, weighted.items(), key=lambda item: item[1])
+        norm = math.sqrt(sum(w * w for _, w in top)) or 1.0
+        vector = [(f, w / norm) for f, w in top]
+        vectors.append(vector)
+        for f, w in vector:
+            postings.setdefault(f, []).append((i, w))
+
+    related = {}
+    for i, vector in enumerate(vectors):
+        scores = {}
+        for f, w in vector:
+            for j, other in postings[f]:
+                if j != i:
+                    scores[j] = scores.get(j, 0.0) + w * other
+        # Ties go to the newer post (lower listing position)
+        best = heapq.nsmallest(k, scores, key=lambda j: (-scores[j], j))
+        if len(best) < k:
+            best += [j for j in range(n) if j != i and j not in scores][:k - len(best)]
+        if ids[i]:
+            related[ids[i]] = [ids[j] for j in best]
+    return related
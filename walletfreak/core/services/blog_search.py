@@ -0,0 +1,172 @@
+import hashlib
+import json
+import math
+import re
+import threading
+from bisect import bisect_left
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from how i in is it of on or that the this to was what with you your'.split()
+)
+
+# Term-frequency weight of each field (BM25F-style: one weighted document per post)
+FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'excerpt': 1.5, 'content': 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Vocabulary terms a trailing prefix may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+def _post_fields(post, body):
+    from blog.views.utils import parse_tags_helper
+    return {
+        'title': post.get('title') or '',
+        'tags': ' '.join(parse_tags_helper(post.get('tags'))),
+        'excerpt': post.get('excerpt') or '',
+        'content': body or '',
+    }
+
+
+def _signature(fields):
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class BlogSearchIndex:
+    """
+    In-memory inverted index over published posts with BM25 ranking.
+
+    sync() brings the index in line with the cached listing + bodies and only
+    re-tokenizes posts whose indexed fields changed, so keeping it current
+    after an edit costs one post, not the whole blog.
+    """
+
+    def __init__(self):
+        self.postings = {}      # term -> {post_id: weighted tf}
+        self.doc_terms = {}     # post_id -> {term: weighted tf}
+        self.doc_length = {}    # post_id -> weighted length
+        self.signatures = {}    # post_id -> hash of indexed fields
+        self.total_length = 0.0
+        self.synced_token = None
+        self._vocabulary = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def sync(self, posts, bodies, token=None):
+        """Index `posts` (listing entries) with their `bodies`; drop posts no longer listed."""
+        with self._lock:
+            if token is not None and token == self.synced_token:
+                return
+            seen = set()
+            for post in posts:
+                post_id = post.get('id')
+                if not post_id:
+                    continue
+                seen.add(post_id)
+                fields = _post_fields(post, bodies.get(post_id))
+                signature = _signature(fields)
+                if self.signatures.get(post_id) != signature:
+                    self._remove(post_id)
+                    self._add(post_id, fields, signature)
+            for post_id in [p for p in self.doc_terms if p not in seen]:
+                self._remove(post_id)
+            self.synced_token = token
+
+    def _add(self, post_id, fields, signature):
+        terms = {}
+        length = 0.0
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                terms[term] = terms.get(term, 0.0) + weight
+                length += weight
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[post_id] = tf
+        self.doc_terms[post_id] = terms
+        self.doc_length[post_id] = length
+        self.signatures[post_id] = signature
+        self.total_length += length
+        self._vocabulary = None
+
+    def _remove(self, post_id):
+        terms = self.doc_terms.pop(post_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(post_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_length.pop(post_id, 0.0)
+        self.signatures.pop(post_id, None)
+        self._vocabulary = None
+
+    def _expand_prefix(self, prefix):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        i = bisect_left(vocabulary, prefix)
+        out = []
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix) and len(out) < MAX_PREFIX_EXPANSIONS:
+            out.append(vocabulary[i])
+            i += 1
+        return out
+
+    def search(self, query, limit=None, prefix=True):
+        """
+        Post ids matching every query term, best BM25 score first.
+
+        With prefix=True the last term also matches longer words ("chas" finds
+        "chase"), for typeahead; add a trailing space to match it exactly.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        prefix = prefix and not query[-1:].isspace()
+
+        with self._lock:
+            n = len(self.doc_terms)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+            # Each query term becomes a group of index terms (the prefix expands)
+            groups = [[t] for t in terms[:-1]]
+            groups.append(self._expand_prefix(terms[-1]) if prefix else [terms[-1]])
+
+            scores = None
+            for group in groups:
+                group_scores = {}
+                for term in group:
+                    posting = self.postings.get(term)
+                    if not posting:
+                        continue
+                    idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for post_id, tf in posting.items():
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_length[post_id] / avg_length)
+                        score = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                        # A prefix group counts its best-matching word once
+                        if score > group_scores.get(post_id, 0.0):
+                            group_scores[post_id] = score
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {p: s + group_scores[p] for p, s in scores.items() if p in group_scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores, key=lambda p: (-scores[p], p))
+        return ranked[:limit] if limit else ranked
+
+
+_index = BlogSearchIndex()
+
+
+def get_blog_search_index():
+    return _index
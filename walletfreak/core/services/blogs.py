@@ -1,19 +1,140 @@
 from firebase_admin import firestore
+import threading
+import time
 import uuid
 from datetime import datetime
-import threading
+from django.conf import settings
 from django.core.cache import cache
+from .blog_facets import BlogFacetIndex
+from .blog_related import compute_related_posts
+from .blog_search import get_blog_search_index
+from .counters import BufferedCounter, flush_increments
+
+
+# Two-tier cache for published posts: a light listing projection (no post
+# bodies) for list pages and filters, and the bodies keyed by post id, which
+# only content search needs. Both are rebuilt together, stale-while-revalidate.
+BLOG_LISTING_CACHE_KEY = 'blog_listing'
+BLOG_BODIES_CACHE_KEY = 'blog_bodies'
+# Heavy fields left out of the listing
+LISTING_EXCLUDED_FIELDS = ('content',)
+# Caches derived from the listing, dropped whenever a post changes
+BLOG_DERIVED_CACHE_KEYS = (
+    'blog_trending_and_contributors',
+    'home_latest_blog_posts',
+)
+
+# Materialized per-post comment summary: blogs/{id}/meta/comments
+COMMENT_SUMMARY_COLLECTION = 'meta'
+COMMENT_SUMMARY_DOC = 'comments'
+# Rebuilds that race with new comments are retried this many times
+COMMENT_SUMMARY_REBUILD_ATTEMPTS = 3
+
+_listing_lock = threading.Lock()
+_view_counter = None
+_view_counter_lock = threading.Lock()
+# Bumped by every invalidation so a rebuild that raced a write is not kept as fresh
+_listing_generation = 0
+
+
+def listing_projection(blog):
+    """Listing entry for a post: everything except the body, with an excerpt."""
+    entry = {k: v for k, v in blog.items() if k not in LISTING_EXCLUDED_FIELDS}
+    if not entry.get('excerpt'):
+        entry['excerpt'] = ' '.join((blog.get('content') or '').split()[:40])
+    return entry
+
+
+def _comment_time(comment):
+    created = comment.get('created_at')
+    return created.timestamp() if hasattr(created, 'timestamp') else 0
+
+
+def build_comment_summary(comments, page_size, inline_replies):
+    """
+    Summary of a post's comments: the total count, the ids of the newest
+    `page_size` top-level comments and, for each of those threads, its reply
+    count and newest `inline_replies` reply ids. `comments` need `root_id`.
+    """
+    newest = sorted(comments, key=_comment_time, reverse=True)
+    top_level = [c['id'] for c in newest if not c.get('parent_id')]
+    page = top_level[:page_size]
+    reply_ids = {root: [] for root in page}
+    reply_counts = {root: 0 for root in page}
+    for c in newest:
+        root = c.get('root_id')
+        if c.get('parent_id') and root in reply_counts:
+            reply_counts[root] += 1
+            if len(reply_ids[root]) < inline_replies:
+                reply_ids[root].append(c['id'])
+    return {
+        'count': len(comments),
+        'top_level_ids': page,
+        'has_more': len(top_level) > page_size,
+        'reply_ids': reply_ids,
+        'reply_counts': reply_counts,
+    }
+
+
+def add_to_comment_summary(summary, comment_id, root_id, page_size, inline_replies):
+    """Summary after a new comment (`root_id` None for a top-level comment)."""
+    summary = {
+        'count': summary.get('count', 0) + 1,
+        'top_level_ids': list(summary.get('top_level_ids', [])),
+        'has_more': summary.get('has_more', False),
+        'reply_ids': {k: list(v) for k, v in summary.get('reply_ids', {}).items()},
+        'reply_counts': dict(summary.get('reply_counts', {})),
+    }
+    if root_id is None:
+        summary['top_level_ids'].insert(0, comment_id)
+        summary['reply_ids'][comment_id] = []
+        summary['reply_counts'][comment_id] = 0
+        for dropped in summary['top_level_ids'][page_size:]:
+            summary['reply_ids'].pop(dropped, None)
+            summary['reply_counts'].pop(dropped, None)
+            summary['has_more'] = True
+        del summary['top_level_ids'][page_size:]
+    elif root_id in summary['reply_counts']:
+        summary['reply_counts'][root_id] += 1
+        summary['reply_ids'][root_id] = ([comment_id] + summary['reply_ids'].get(root_id, []))[:inline_replies]
+    return summary
+
+
+def build_comment_threads(top_level, replies, reply_counts=None):
+    """
+    Nest `replies` under their parents within each top-level thread, newest
+    first. Each thread gets `reply_count` and `more_replies` (replies it has
+    that were not loaded).
+    """
+    threads = [{**c, 'replies': []} for c in top_level]
+    nodes = {c['id']: c for c in threads}
+    for reply in sorted(replies, key=_comment_time, reverse=True):
+        nodes[reply['id']] = {**reply, 'replies': []}
+    loaded = {c['id']: 0 for c in threads}
+    for reply in sorted(replies, key=_comment_time, reverse=True):
+        root = reply.get('root_id')
+        parent = nodes.get(reply.get('parent_id')) or nodes.get(root)
+        if parent is None or root not in loaded:
+            continue
+        parent['replies'].append(nodes[reply['id']])
+        loaded[root] += 1
+    for thread in threads:
+        count = (reply_counts or {}).get(thread['id'], loaded[thread['id']])
+        thread['reply_count'] = count
+        thread['more_replies'] = max(0, count - loaded[thread['id']])
+    return threads
+
 
 class BlogMixin:
     def get_blogs(self, status=None, limit=None):
         """Get blogs, optionally filtered by status, with dynamic author info"""
-        # Try cache first if requesting all published blogs (common path)
+        # All published posts (the common path) come from the cached listing,
+        # which leaves out the post bodies
         if status == 'published' and limit is None:
-            cache_key = 'all_published_blogs'
-            cached_blogs = cache.get(cache_key)
-            if cached_blogs:
-                return cached_blogs
+            return self.get_published_blog_listing()
+        return self._fetch_blogs(status, limit)
 
+    def _fetch_blogs(self, status=None, limit=None):
         from google.cloud.firestore import FieldFilter
         query = self.db.collection('blogs')
         if status:
@@ -35,13 +156,127 @@ class BlogMixin:
                     self._enrich_with_author_data(blog, user)
                 else:
                     self._enrich_with_author_data(blog, None)
-        
-        # Set cache if this was the published list
-        if status == 'published' and limit is None:
-            cache.set('all_published_blogs', blogs, 60 * 60)
             
         return blogs
-    
+
+    def get_published_blog_listing(self):
+        """
+        Listing projection of every published post, newest first.
+
+        Served from cache; once older than BLOG_LISTING_FRESH_SECONDS it is
+        still returned while one background rebuild runs, so only a cold
+        process ever waits on Firestore.
+        """
+        return self._get_listing_entry()['blogs']
+
+    def get_published_blog_facets(self):
+        """(listing, BlogFacetIndex) from the same cached build, so positions line up."""
+        entry = self._get_listing_entry()
+        return entry['blogs'], entry['facets']
+
+    def get_related_blogs(self, blog_id):
+        """
+        Listing entries of the posts most similar to `blog_id`, best first.
+        Precomputed for every post whenever the listing is rebuilt.
+        """
+        entry = self._get_listing_entry()
+        related_ids = entry.get('related', {}).get(blog_id)
+        if related_ids is None:
+            # Not published (e.g. an editor previewing a draft): newest posts
+            k = getattr(settings, 'BLOG_RELATED_POSTS', 3)
+            return [b for b in entry['blogs'] if b.get('id') != blog_id][:k]
+        by_id = {b['id']: b for b in entry['blogs']}
+        return [by_id[i] for i in related_ids if i in by_id]
+
+    def _get_listing_entry(self):
+        entry = cache.get(BLOG_LISTING_CACHE_KEY)
+        if entry is None:
+            with _listing_lock:
+                return cache.get(BLOG_LISTING_CACHE_KEY) or self._rebuild_blog_listing()
+        if time.time() - entry['built_at'] >= getattr(settings, 'BLOG_LISTING_FRESH_SECONDS', 600):
+            self._refresh_blog_listing_async()
+        return entry
+
+    def get_published_blog_bodies(self):
+        """{post_id: content} for published posts (the second cache tier)."""
+        bodies = cache.get(BLOG_BODIES_CACHE_KEY)
+        if bodies is None:
+            with _listing_lock:
+                bodies = cache.get(BLOG_BODIES_CACHE_KEY)
+                if bodies is None:
+                    self._rebuild_blog_listing()
+                    bodies = cache.get(BLOG_BODIES_CACHE_KEY) or {}
+        return bodies
+
+    def _rebuild_blog_listing(self):
+        """Read published posts once and store both cache tiers. Call with _listing_lock held."""
+        generation = _listing_generation
+        blogs = self._fetch_blogs(status='published')
+        entry = {
+            'token': uuid.uuid4().hex,
+            'blogs': [listing_projection(b) for b in blogs],
+            'facets': None,
+            'related': {},
+            # A write landed while we were reading: serve this, but refresh again
+            'built_at': time.time() if generation == _listing_generation else 0,
+        }
+        max_age = getattr(settings, 'BLOG_LISTING_MAX_AGE_SECONDS', 24 * 60 * 60)
+        entry['facets'] = BlogFacetIndex(entry['blogs'])
+        bodies = {b['id']: b.get('content', '') for b in blogs}
+        entry['related'] = compute_related_posts(
+            entry['blogs'], bodies, k=getattr(settings, 'BLOG_RELATED_POSTS', 3)
+        )
+        cache.set(BLOG_BODIES_CACHE_KEY, bodies, max_age)
+        cache.set(BLOG_LISTING_CACHE_KEY, entry, max_age)
+        # Derived caches rebuilt from the old listing while this ran must not outlive it
+        cache.delete_many(list(BLOG_DERIVED_CACHE_KEYS))
+        # Re-tokenizes only the posts that changed
+        get_blog_search_index().sync(entry['blogs'], bodies, entry['token'])
+        return entry
+
+    def search_blogs(self, query, limit=None):
+        """
+        Ids of published posts matching `query`, best match first (BM25 over
+        title, tags, excerpt and body; the last word matches as a prefix).
+        """
+        entry = self._get_listing_entry()
+        index = get_blog_search_index()
+        if index.synced_token != entry.get('token'):
+            # Listing came from another rebuild (or the cache was restored)
+            index.sync(entry['blogs'], self.get_published_blog_bodies(), entry.get('token'))
+        return index.search(query, limit=limit)
+
+    def _refresh_blog_listing_async(self):
+        """Rebuild the listing on a background thread unless a rebuild is already running."""
+        if not _listing_lock.acquire(blocking=False):
+            return
+
+        def refresh():
+            try:
+                self._rebuild_blog_listing()
+            except Exception as e:
+                print(f"Error refreshing blog listing: {e}")
+            finally:
+                _listing_lock.release()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def invalidate_blog_caches(self, *slugs):
+        """
+        Drop the cached posts for `slugs` and everything derived from the
+        listing, and rebuild the listing in the background.
+        """
+        global _listing_generation
+        _listing_generation += 1
+        cache.delete_many(
+            [f'blog_slug_{slug}' for slug in slugs if slug] + list(BLOG_DERIVED_CACHE_KEYS)
+        )
+        entry = cache.get(BLOG_LISTING_CACHE_KEY)
+        if entry is not None:
+            entry['built_at'] = 0
+            cache.set(BLOG_LISTING_CACHE_KEY, entry, getattr(settings, 'BLOG_LISTING_MAX_AGE_SECONDS', 24 * 60 * 60))
+            self._refresh_blog_listing_async()
+
     def get_blog_by_slug(self, slug):
         """Get blog post by slug with dynamic author info"""
         cache_key = f'blog_slug_{slug}'
@@ -85,18 +320,15 @@ class BlogMixin:
         # data usually contains 'slug'
         doc_id = data.get('slug')
         
-        # Trigger notification if published immediately
-        if data.get('status') == 'published':
-             # We need to ensure we don't block the request. 
-             # In production, use a task queue. 
-             # Here, we can use threading similar to the signal, or just let it be sync if acceptable (might slow down publish).
-             # Let's use threading to be safe.
-             threading.Thread(target=self._trigger_blog_notification, args=(data,)).start()
+        blog_id = self.create_document('blogs', data, doc_id=doc_id)
+        self.invalidate_blog_caches(doc_id)
 
-        # Invalidate cache for blog list
-        cache.delete('all_published_blogs')
+        # Notify subscribers if published immediately. Queued as a durable job
+        # (after the write, so the job can read the post) to keep the request fast.
+        if data.get('status') == 'published':
+            self.enqueue_job('blog_notification', {'blog_id': blog_id}, max_attempts=1)
 
-        return self.create_document('blogs', data, doc_id=doc_id)
+        return blog_id
 
     def update_blog(self, blog_id, data):
         """Update an existing blog post"""
@@ -126,29 +358,14 @@ class BlogMixin:
                  # If user manually edits a published post but doesn't change published_at, we don't want to re-notify.
                  pass
         
-        if should_notify:
-             # We need full blog data for the email (title, excerpt, slug)
-             # 'data' might be partial. Merge with existing or fetch after update?
-             # Let's fetch the full updated doc *after* the update to be sure we have everything.
-             # Actually, we can just pass 'data' if it has title/slug, but safe to fetch.
-             def notify_after_update():
-                 # Small delay or just fetch (consistency might be eventually consistent but usually fine)
-                 full_blog = self.get_blog_by_id(blog_id)
-                 if full_blog:
-                     self._trigger_blog_notification(full_blog)
-             
-             threading.Thread(target=notify_after_update).start()
-
         self.update_document('blogs', blog_id, data)
+
+        if should_notify:
+             # The job reads the full post (title, excerpt, slug) once the update has landed
+             self.enqueue_job('blog_notification', {'blog_id': blog_id}, max_attempts=1)
         
-        # Invalidate caches
-        cache.delete('all_published_blogs')
-        if current_slug:
-            cache.delete(f'blog_slug_{current_slug}')
-        
-        # If the slug is being updated, we should also invalidate the new slug (though unlikely to be cached yet)
-        if 'slug' in data and data['slug'] != current_slug:
-             cache.delete(f'blog_slug_{data["slug"]}')
+        # Invalidate caches, including the new slug if it changed
+        self.invalidate_blog_caches(current_slug, data.get('slug'))
 
     def delete_blog(self, blog_id):
         """Delete a blog post"""
@@ -163,9 +380,7 @@ class BlogMixin:
         self.delete_document('blogs', blog_id)
         
         # Invalidate caches
-        cache.delete('all_published_blogs')
-        if slug:
-            cache.delete(f'blog_slug_{slug}')
+        self.invalidate_blog_caches(slug)
         
     def _trigger_blog_notification(self, blog_data):
         """
@@ -273,56 +488,242 @@ The WalletFreak Team
             print(f"Error in blog notification thread: {e}")
 
     def increment_blog_view_count(self, blog_id):
-        """Increment the view count for a blog post"""
-        try:
-            doc_ref = self.db.collection('blogs').document(blog_id)
-            doc_ref.update({'view_count': firestore.Increment(1)})
-            return True
-        except Exception as e:
-            print(f"Error incrementing view count: {e}")
+        """
+        Count a view of a blog post. Views are buffered in memory and written
+        as one Increment(n) per post every BLOG_VIEW_FLUSH_SECONDS (or once
+        BLOG_VIEW_FLUSH_THRESHOLD views are pending), not once per page view.
+        """
+        if not blog_id:
             return False
+        self._blog_view_counter().add(blog_id)
+        return True
+
+    def _blog_view_counter(self):
+        global _view_counter
+        if _view_counter is None:
+            with _view_counter_lock:
+                if _view_counter is None:
+                    _view_counter = BufferedCounter(
+                        lambda counts: flush_increments(self.db, 'blogs', 'view_count', counts),
+                        interval=getattr(settings, 'BLOG_VIEW_FLUSH_SECONDS', 30),
+                        threshold=getattr(settings, 'BLOG_VIEW_FLUSH_THRESHOLD', 200),
+                    )
+        return _view_counter
 
     # Comment Methods
+    def _comments_ref(self, blog_id):
+        return self.db.collection('blogs').document(blog_id).collection('comments')
+
+    def _comment_summary_ref(self, blog_id):
+        return self.db.collection('blogs').document(blog_id).collection(COMMENT_SUMMARY_COLLECTION).document(COMMENT_SUMMARY_DOC)
+
+    def _enrich_comments(self, comments):
+        """Attach current author data to comments (one user lookup for all of them)."""
+        author_uids = [c.get('author_uid') for c in comments if c.get('author_uid')]
+        if not author_uids:
+            return comments
+        users_map = self.get_users_by_ids(author_uids)
+        for c in comments:
+            uid = c.get('author_uid')
+            if uid and uid in users_map:
+                # Dynamic author data
+                self._enrich_with_author_data(c, users_map[uid])
+                # Backward compat for templates expecting 'author_name'
+                c['author_name'] = c['author_real_name']
+            else:
+                self._enrich_with_author_data(c, None)
+                c['author_name'] = 'Anonymous'
+        return comments
+
     def get_blog_comments(self, blog_id):
         """Get all comments for a blog post, ordered by date"""
         try:
-            comments_ref = self.db.collection('blogs').document(blog_id).collection('comments')
-            query = comments_ref.order_by('created_at', direction=firestore.Query.DESCENDING)
+            query = self._comments_ref(blog_id).order_by('created_at', direction=firestore.Query.DESCENDING)
             comments = [doc.to_dict() | {'id': doc.id} for doc in query.stream()]
-            
-            # Collect author UIDs using a set to handle duplicates
-            author_uids = []
-            for c in comments:
-                if c.get('author_uid'):
-                    author_uids.append(c.get('author_uid'))
-            
-            if not author_uids:
-                return comments
-                
-            # Fetch user profiles
-            users_map = self.get_users_by_ids(author_uids)
-            
-            # Map user data to comments
-            for c in comments:
-                uid = c.get('author_uid')
-                if uid and uid in users_map:
-                    user = users_map[uid]
-                    # Dynamic author data
-                    self._enrich_with_author_data(c, user)
-                    # Backward compat for templates expecting 'author_name'
-                    c['author_name'] = c['author_real_name']
-                else:
-                    self._enrich_with_author_data(c, None)
-                    c['author_name'] = 'Anonymous'
-            
-            return comments
+            return self._enrich_comments(comments)
         except Exception as e:
             print(f"Error getting blog comments: {e}")
             return []
 
+    def get_blog_comment(self, blog_id, comment_id):
+        doc = self._comments_ref(blog_id).document(comment_id).get()
+        return doc.to_dict() | {'id': doc.id} if doc.exists else None
+
+    def get_comment_summary(self, blog_id):
+        """
+        The post's materialized comment summary (see build_comment_summary),
+        built from all comments the first time it is needed.
+        """
+        doc = self._comment_summary_ref(blog_id).get()
+        if doc.exists:
+            return doc.to_dict()
+        return self.rebuild_comment_summary(blog_id)
+
+    def rebuild_comment_summary(self, blog_id):
+        """
+        Recompute a post's comment summary from every comment. Also fills in
+        `root_id` on comments written before threads tracked it.
+
+        A comment added while this runs finds no summary to update, so after
+        writing, the post's comment count is checked against the summary and
+        the rebuild repeats if one slipped in. If they still disagree, the
+        summary is removed and the next read builds it again.
+        """
+        for _ in range(COMMENT_SUMMARY_REBUILD_ATTEMPTS):
+            summary = self._build_comment_summary(blog_id)
+            self._comment_summary_ref(blog_id).set(summary)
+            if self._count_comments(blog_id) == summary['count']:
+                return summary
+        self._comment_summary_ref(blog_id).delete()
+        return summary
+
+    def _count_comments(self, blog_id):
+        return int(self._comments_ref(blog_id).count().get()[0][0].value)
+
+    def _build_comment_summary(self, blog_id):
+        comments = {doc.id: doc.to_dict() | {'id': doc.id} for doc in self._comments_ref(blog_id).stream()}
+        batch = self.db.batch()
+        pending = 0
+        for c in comments.values():
+            if not c.get('parent_id') or c.get('root_id'):
+                continue
+            root, seen = c, set()
+            while root.get('parent_id') in comments and root['id'] not in seen:
+                seen.add(root['id'])
+                root = comments[root['parent_id']]
+            c['root_id'] = root['id']
+            batch.update(self._comments_ref(blog_id).document(c['id']), {'root_id': root['id']})
+            pending += 1
+            if pending == 400:
+                batch.commit()
+                batch, pending = self.db.batch(), 0
+        if pending:
+            batch.commit()
+
+        return build_comment_summary(
+            list(comments.values()),
+            getattr(settings, 'BLOG_COMMENTS_PAGE_SIZE', 20),
+            getattr(settings, 'BLOG_COMMENT_INLINE_REPLIES', 5),
+        )
+
+    def _add_to_comment_summary(self, blog_id, comment_id, root_id):
+        summary_ref = self._comment_summary_ref(blog_id)
+        transaction = self.db.transaction()
+
+        @firestore.transactional
+        def update_in_transaction(transaction, summary_ref):
+            snapshot = summary_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                # Built from scratch (including this comment) on next read
+                return
+            transaction.set(summary_ref, add_to_comment_summary(
+                snapshot.to_dict(), comment_id, root_id,
+                getattr(settings, 'BLOG_COMMENTS_PAGE_SIZE', 20),
+                getattr(settings, 'BLOG_COMMENT_INLINE_REPLIES', 5),
+            ))
+
+        update_in_transaction(transaction, summary_ref)
+
+    def get_blog_comment_page(self, blog_id, cursor=None):
+        """
+        One page of comment threads, newest first:
+        {'comments': [...], 'total': int or None, 'next_cursor': str or None}.
+
+        The first page comes from the comment summary plus one batched read
+        of the comments it lists (threads show their newest replies; the rest
+        load through get_comment_thread). Later pages continue after the
+        `cursor` comment and carry their threads' replies in full.
+        """
+        try:
+            if cursor is None:
+                summary = self.get_comment_summary(blog_id)
+                ids = list(summary.get('top_level_ids', []))
+                for reply_ids in summary.get('reply_ids', {}).values():
+                    ids.extend(reply_ids)
+                coll = self._comments_ref(blog_id)
+                comments = {
+                    doc.id: doc.to_dict() | {'id': doc.id}
+                    for doc in self.db.get_all([coll.document(i) for i in ids])
+                    if doc.exists
+                }
+                top_level = [comments[i] for i in summary.get('top_level_ids', []) if i in comments]
+                replies = [c for c in comments.values() if c.get('parent_id')]
+                reply_counts = summary.get('reply_counts', {})
+                has_more = summary.get('has_more', False)
+                total = summary.get('count', len(comments))
+            else:
+                top_level, has_more = self._scan_top_level_comments(blog_id, cursor)
+                replies = self._get_thread_replies(blog_id, [c['id'] for c in top_level])
+                reply_counts = None
+                total = None
+
+            self._enrich_comments(top_level + replies)
+            return {
+                'comments': build_comment_threads(top_level, replies, reply_counts),
+                'total': total,
+                'next_cursor': top_level[-1]['id'] if has_more and top_level else None,
+            }
+        except Exception as e:
+            print(f"Error getting blog comment page: {e}")
+            return {'comments': [], 'total': 0, 'next_cursor': None}
+
+    def _scan_top_level_comments(self, blog_id, cursor):
+        """Top-level comments after `cursor` (newest first) and whether more follow."""
+        page_size = getattr(settings, 'BLOG_COMMENTS_PAGE_SIZE', 20)
+        after = self._comments_ref(blog_id).document(cursor).get()
+        if not after.exists:
+            return [], False
+        base = self._comments_ref(blog_id).order_by('created_at', direction=firestore.Query.DESCENDING)
+        top_level = []
+        while True:
+            # Replies are interleaved by date; skip them rather than needing a composite index
+            docs = list(base.start_after(after).limit(page_size * 2).stream())
+            for doc in docs:
+                comment = doc.to_dict() | {'id': doc.id}
+                if comment.get('parent_id'):
+                    continue
+                if len(top_level) == page_size:
+                    return top_level, True
+                top_level.append(comment)
+            if len(docs) < page_size * 2:
+                return top_level, False
+            after = docs[-1]
+
+    def _get_thread_replies(self, blog_id, root_ids):
+        from google.cloud.firestore import FieldFilter
+        replies = []
+        for i in range(0, len(root_ids), 30):
+            query = self._comments_ref(blog_id).where(filter=FieldFilter('root_id', 'in', root_ids[i:i + 30]))
+            replies.extend(doc.to_dict() | {'id': doc.id} for doc in query.stream())
+        return replies
+
+    def get_comment_thread(self, blog_id, root_id):
+        """A top-level comment with all of its replies nested, or None."""
+        root = self.get_blog_comment(blog_id, root_id)
+        if root is None or root.get('parent_id'):
+            return None
+        replies = self._get_thread_replies(blog_id, [root_id])
+        self._enrich_comments([root] + replies)
+        return build_comment_threads([root], replies)[0]
+
     def add_blog_comment(self, blog_id, user_uid, content, parent_id=None):
         """Add a comment to a blog post"""
         try:
+            comments_ref = self._comments_ref(blog_id)
+            # Replies remember their thread so it can be loaded with one query
+            root_id = None
+            if parent_id:
+                parent = self.get_blog_comment(blog_id, parent_id)
+                if parent is None:
+                    return None
+                root_id = parent.get('root_id') or (parent_id if not parent.get('parent_id') else None)
+                if root_id is None:
+                    # Parent predates root_id: walk up to the top-level comment
+                    node = parent
+                    while node and node.get('parent_id'):
+                        node = self.get_blog_comment(blog_id, node['parent_id'])
+                    root_id = node['id'] if node else parent_id
+
             comment_data = {
                 'content': content,
                 'author_uid': user_uid,
@@ -331,17 +732,18 @@ The WalletFreak Team
                 'created_at': firestore.SERVER_TIMESTAMP,
                 'updated_at': firestore.SERVER_TIMESTAMP,
                 'parent_id': parent_id,
+                'root_id': root_id,
                 'upvote_count': 0,
                 'downvote_count': 0
             }
             
-            comments_ref = self.db.collection('blogs').document(blog_id).collection('comments')
             _, doc_ref = comments_ref.add(comment_data)
             
             # Increment comment count on blog
             self.db.collection('blogs').document(blog_id).update({
                 'comment_count': firestore.Increment(1)
             })
+            self._add_to_comment_summary(blog_id, doc_ref.id, root_id)
             
             return {**comment_data, 'id': doc_ref.id}
         except Exception as e:
@@ -351,13 +753,14 @@ The WalletFreak Team
     def delete_blog_comment(self, blog_id, comment_id):
         """Soft delete a comment"""
         try:
-            self.db.collection('blogs').document(blog_id).collection('comments').document(comment_id).update({
+            self._comments_ref(blog_id).document(comment_id).update({
                 'is_deleted': True,
                 'content': '<deleted>',
                 'updated_at': firestore.SERVER_TIMESTAMP
             })
             
             # NOTE: We do NOT decrement the comment count, as the comment placeholder remains.
+            # The comment summary only holds ids and counts, so it needs no change either.
             
             return True
         except Exception as e:
@@ -619,3 +1022,11 @@ The WalletFreak Team
         except Exception as e:
             print(f"Error removing user vote on blog: {e}")
             return False
+
+
+def run_blog_notification_job(payload, job):
+    """Job handler: email subscribers about a newly published post."""
+    from core.services import db
+    blog = db.get_blog_by_id(payload['blog_id'])
+    if blog:
+        db._trigger_blog_notification(blog)
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_COLLECTION = 'seed_manifests'
+MAX_BATCH_OPS = 500
+
+
+def content_hash(data):
+    """Stable SHA-256 of a JSON document; key order does not matter."""
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def manifest_id(path):
+    """Manifest document id for a collection path ('/' is not allowed in ids)."""
+    return path.replace('/', '__')
+
+
+class BulkSyncWriter:
+    """
+    Diff-only writer for seeding Firestore from local JSON.
+
+    Every synced collection has a manifest document in seed_manifests holding
+    {doc_id: content hash} for what was last written there. sync() compares the
+    local documents against it and queues only new or changed documents (plus
+    deletes for documents that disappeared locally, when pruning). Queued
+    operations are packed into 500-op batches and committed concurrently on a
+    thread pool. A manifest entry is only updated once its batch has committed,
+    so anything that failed is written again on the next run.
+
+    Use as a context manager, or call close() to wait for the last batches and
+    persist the manifests.
+    """
+
+    def __init__(self, client, max_workers=8, batch_size=MAX_BATCH_OPS, force=False):
+        self.client = client
+        self.batch_size = min(batch_size, MAX_BATCH_OPS)
+        self.force = force
+        self.stats = {'written': 0, 'skipped': 0, 'deleted': 0, 'batches': 0, 'errors': 0}
+        self._manifests = {}
+        self._dirty = set()
+        self._ops = []
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._started = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self._started
+
+    @property
+    def changed(self):
+        return bool(self.stats['written'] or self.stats['deleted'])
+
+    def prefetch(self, paths):
+        """Load the manifests for `paths` in one round trip."""
+        missing = [p for p in dict.fromkeys(paths) if p not in self._manifests]
+        if not missing:
+            return
+        coll = self.client.collection(MANIFEST_COLLECTION)
+        refs = [coll.document(manifest_id(p)) for p in missing]
+        found = {}
+        try:
+            for snap in self.client.get_all(refs):
+                if snap.exists:
+                    found[snap.id] = snap.to_dict() or {}
+        except Exception as e:
+            print(f"Error loading seed manifests: {e}")
+        for path in missing:
+            doc = found.get(manifest_id(path))
+            self._manifests[path] = dict(doc.get('hashes') or {}) if doc is not None else None
+
+    def _manifest(self, path):
+        if path not in self._manifests:
+            self.prefetch([path])
+        return self._manifests[path]
+
+    def sync(self, path, docs, prune=False, merge=False):
+        """
+        Bring collection `path` in line with `docs` ({doc_id: data}).
+
+        Unchanged documents are skipped. With prune=True, documents that exist
+        remotely but not in `docs` are deleted. Returns this call's
+        {'written', 'skipped', 'deleted'} counts.
+        """
+        manifest = self._manifest(path)
+        counts = {'written': 0, 'skipped': 0, 'deleted': 0}
+        coll = self.client.collection(path)
+
+        known = manifest or {}
+        for doc_id, data in docs.items():
+            digest = content_hash(data)
+            if not self.force and manifest is not None and known.get(doc_id) == digest:
+                counts['skipped'] += 1
+                continue
+            self._queue(('set', coll.document(doc_id), data, merge, path, doc_id, digest))
+            counts['written'] += 1
+
+        if prune:
+            if manifest is None or self.force:
+                # No record of what we wrote before: ask Firestore once.
+                try:
+                    remote_ids = [snap.id for snap in coll.stream()]
+                except Exception as e:
+                    print(f"Error listing {path}: {e}")
+                    remote_ids = []
+            else:
+                remote_ids = list(known)
+            for doc_id in remote_ids:
+                if doc_id not in docs:
+                    self._queue(('delete', coll.document(doc_id), None, False, path, doc_id, None))
+                    counts['deleted'] += 1
+
+        if manifest is None:
+            # Adopt the collection even if everything in it was already current
+            self._manifests[path] = {}
+            self._dirty.add(path)
+
+        for key in counts:
+            self.stats[key] += counts[key]
+        return counts
+
+    def _queue(self, op):
+        self._ops.append(op)
+        if len(self._ops) >= self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        if not self._ops:
+            return
+        ops, self._ops = self._ops, []
+        self._futures.append((self._executor.submit(self._commit, ops), ops))
+
+    def _commit(self, ops):
+        batch = self.client.batch()
+        for kind, ref, data, merge, _path, _doc_id, _digest in ops:
+            if kind == 'set':
+                batch.set(ref, data, merge=merge)
+            else:
+                batch.delete(ref)
+        batch.commit()
+
+    def _drain(self):
+        """Wait for submitted batches and record what committed in the manifests."""
+        futures, self._futures = self._futures, []
+        for future, ops in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error committing batch of {len(ops)} writes: {e}")
+                self.stats['errors'] += len(ops)
+                continue
+            self.stats['batches'] += 1
+            for kind, _ref, _data, _merge, path, doc_id, digest in ops:
+                manifest = self._manifests.setdefault(path, {})
+                if manifest is None:
+                    manifest = self._manifests[path] = {}
+                if kind == 'set':
+                    manifest[doc_id] = digest
+                else:
+                    manifest.pop(doc_id, None)
+                self._dirty.add(path)
+
+    def flush(self):
+        """Commit everything queued so far and wait for it."""
+        self._submit()
+        self._drain()
+
+    def close(self):
+        self.flush()
+        if self._dirty:
+            coll = self.client.collection(MANIFEST_COLLECTION)
+            dirty, self._dirty = sorted(self._dirty), set()
+            for i in range(0, len(dirty), self.batch_size):
+                batch = self.client.batch()
+                for path in dirty[i:i + self.batch_size]:
+                    batch.set(coll.document(manifest_id(path)), {
+                        'path': path,
+                        'hashes': self._manifests.get(path) or {},
+                    })
+                try:
+                    batch.commit()
+                except Exception as e:
+                    print(f"Error saving seed manifests: {e}")
+        self._executor.shutdown(wait=True)
@@ -8,6 +8,9 @@ class CardMixin:
         super().__init__(*args, **kwargs)
         self._cards_cache = None
 from django.core.cache import cache
+from .catalog import CatalogSnapshot, catalog_holder
+from .benefit_periods import BenefitPeriodEngine, BenefitScheduleIndex
+from .request_scope import current_scope, forget_documents
 
 class CardMixin:
     def __init__(self, *args, **kwargs):
@@ -16,9 +19,93 @@ class CardMixin:
     
     def _invalidate_cards_cache(self):
         """Invalidate the cards cache (call this when cards are updated)"""
-        cache.delete('all_cards')
+        self.bump_catalog_version()
+
+    def _fetch_catalog_version(self):
+        """
+        Read the catalog version stamp from catalog_meta/master_cards.
+        Returns None if the doc has never been written. Raises on Firestore errors.
+        """
+        snap = self.db.collection('catalog_meta').document('master_cards').get()
+        if snap.exists:
+            return (snap.to_dict() or {}).get('version')
+        return None
+
+    def bump_catalog_version(self):
+        """
+        Mark the card catalog as changed. Every worker picks up the new version on
+        its next version check and rebuilds its snapshot; this worker drops its
+        snapshot immediately.
+        """
+        try:
+            self.db.collection('catalog_meta').document('master_cards').set({
+                'version': firestore.Increment(1),
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            }, merge=True)
+        except Exception as e:
+            print(f"Error bumping catalog version: {e}")
+        catalog_holder.clear()
+
+    def get_catalog_snapshot(self, build=True):
+        """
+        Return the shared CatalogSnapshot for this worker.
+
+        The remote version stamp is checked at most once every
+        CATALOG_VERSION_CHECK_SECONDS; the catalog is only rebuilt when the
+        version actually changed. With build=False, returns None instead of
+        hydrating the catalog when no current snapshot exists.
+        """
+        holder = catalog_holder
+        snapshot = holder.snapshot
+        if snapshot is not None and not holder.is_check_due() and not holder.is_expired():
+            return snapshot
+        if snapshot is None and not build:
+            return None
+
+        with holder.build_lock:
+            # Another thread may have refreshed while we waited for the lock
+            snapshot = holder.snapshot
+            if snapshot is not None and not holder.is_check_due() and not holder.is_expired():
+                return snapshot
+
+            try:
+                version = self._fetch_catalog_version()
+            except Exception as e:
+                print(f"Error reading catalog version: {e}")
+                if snapshot is not None and not holder.is_expired():
+                    # Keep serving what we have rather than rebuilding blind
+                    holder.mark_checked()
+                    return snapshot
+                version = None
+
+            if snapshot is not None and snapshot.version == version and not holder.is_expired():
+                holder.mark_checked()
+                return snapshot
+
+            if not build:
+                holder.clear()
+                return None
+
+            cards = self._load_catalog()
+            if not cards:
+                return None
+            snapshot = CatalogSnapshot(cards, version=version)
+            holder.replace(snapshot)
+            return snapshot
 
     
+    def get_benefit_period_engine(self, now=None, reminders=False):
+        """
+        BenefitPeriodEngine over the current catalog. Benefit schedules are
+        compiled once per catalog version; the engine itself is per call.
+        `reminders` applies the unused-benefit reminder job's usage rules.
+        """
+        snapshot = self.get_catalog_snapshot()
+        if snapshot is None:
+            return BenefitPeriodEngine(now=now, reminders=reminders)
+        index = snapshot.derived('benefit_schedules', lambda s: BenefitScheduleIndex(s.cards))
+        return BenefitPeriodEngine(index, now=now, reminders=reminders)
+
     def get_cards_basic(self):
         """
         Get basic card info without subcollections (benefits, rates, bonuses).
@@ -65,13 +152,13 @@ class CardMixin:
         # But `get_structure` is complex. 
         # Simplification: If cache has it, return it (it's full). If not, we fetch what we asked.
         
-        cached_cards_all = cache.get('all_cards')
-        all_cards_map = {c['id']: c for c in cached_cards_all} if cached_cards_all else {}
+        snapshot = self.get_catalog_snapshot(build=False)
+        all_cards_map = snapshot.cards_by_id if snapshot else {}
         
         for slug in slugs:
-            # Check Full List Cache first
+            # Check the shared catalog snapshot first
             if slug in all_cards_map:
-                hydrated_cards.append(all_cards_map[slug])
+                hydrated_cards.append(dict(all_cards_map[slug]))
                 continue
                 
             # Check individual cache
@@ -117,14 +204,24 @@ class CardMixin:
 
         Args:
             include_deprecated: If True, include cards with is_active=False.
+
+        Each card is a shallow copy of the shared catalog snapshot, so callers may
+        set top-level keys (categories, in_wallet, match_score...) freely, but
+        nested benefits / earning_rates are shared and must not be mutated.
         """
-        # Check cache first
-        cached_cards = cache.get('all_cards')
-        if cached_cards:
-            if include_deprecated:
-                return cached_cards
-            return [c for c in cached_cards if c.get('is_active', True)]
+        snapshot = self.get_catalog_snapshot()
+        if snapshot is None:
+            return []
+        return [
+            dict(c) for c in snapshot.cards
+            if include_deprecated or c.get('is_active', True)
+        ]
 
+    def _load_catalog(self):
+        """
+        Fetch and hydrate the full catalog from Firestore.
+        Only called by get_catalog_snapshot when the catalog version changed.
+        """
         # 1. Fetch all master cards
         cards_snapshot = self.get_collection('master_cards')
         # Sort cards by name for consistent ordering
@@ -204,39 +301,8 @@ class CardMixin:
             card['card_questions'] = self._process_card_questions(card.get('card_questions', []))
             card['benefits'].sort(key=lambda x: x.get('benefit_id') or '')
 
-        result = list(cards_map.values())
-        
-        # Update cache
-        # Update cache (Cache for 24 hours as per user request: "does not change very often")
-        cache.set('all_cards', result, timeout=86400)
-        
-        return result
+        return list(cards_map.values())
     
-    def get_card_by_slug(self, slug):
-        if not slug:
-            return None
-            
-        # 1. Try to find in full cache first
-        cached_cards = cache.get('all_cards')
-        if cached_cards:
-            for c in cached_cards:
-                if c.get('slug') == slug or c.get('id') == slug:
-                    return c
-        
-        # 2. Try specific cache
-        cache_key = f'card_{slug}'
-        cached_card = cache.get(cache_key)
-        if cached_card:
-            return cached_card
-
-        # 3. Fetch from DB
-        card_data = self.get_document('master_cards', slug)
-        if card_data:
-            self._enrich_card_with_subcollections(slug, card_data)
-            cache.set(cache_key, card_data, timeout=86400)
-            
-        return card_data
-        
     # Other methods... check _process_signup_bonuses etc are preserved in replacement if outside?
     # No, I am replacing from line 26 to 338 (get_user_card_count to get_user_cards)
     
@@ -258,7 +324,24 @@ class CardMixin:
         hydrate: If True, merges with Master Card data (Requires fetching Master Cards).
                  If False, returns only User Card data (Lightweight).
         include_subcollections: passed to get_specific_cards if hydrate is True.
+
+        Within a request the same lookup is made at most once (see request_scope).
         """
+        scope = current_scope()
+        path = f'users/{uid}/user_cards?status={status}&hydrate={hydrate}&include={include_subcollections}'
+        if scope is not None:
+            found, user_cards = scope.get(path)
+            if found:
+                return user_cards
+        user_cards = self._fetch_user_cards(uid, status, hydrate, include_subcollections)
+        if scope is not None:
+            scope.put(path, user_cards)
+        return user_cards
+
+    def _forget_user_cards(self, uid):
+        forget_documents(f'users/{uid}/user_cards?')
+
+    def _fetch_user_cards(self, uid, status, hydrate, include_subcollections):
         query = self.db.collection('users').document(uid).collection('user_cards')
         if status:
             query = query.where(filter=FieldFilter('status', '==', status))
@@ -338,6 +421,15 @@ class CardMixin:
 
     
     def get_card_by_slug(self, slug):
+        if not slug:
+            return None
+
+        snapshot = self.get_catalog_snapshot(build=False)
+        if snapshot:
+            card = snapshot.get(slug)
+            if card:
+                return dict(card)
+
         card_data = self.get_document('master_cards', slug)
         if card_data:
             self._enrich_card_with_subcollections(slug, card_data)
@@ -494,6 +586,8 @@ class CardMixin:
         
         user_card_ref = user_ref.collection('user_cards').document(card_id)
         user_card_ref.set(user_card_data, merge=True)
+        self._forget_user_cards(uid)
+        self.invalidate_match_scores(uid)
         
         try:
             current_cards = self.get_user_cards(uid, status='active')
@@ -536,6 +630,8 @@ class CardMixin:
     def update_card_status(self, uid, user_card_id, new_status):
         ref = self.db.collection('users').document(uid).collection('user_cards').document(user_card_id)
         ref.update({'status': new_status})
+        self._forget_user_cards(uid)
+        self.invalidate_match_scores(uid)
 
     def remove_card_from_user(self, uid, user_card_id):
         doc_ref = self.db.collection('users').document(uid).collection('user_cards').document(user_card_id)
@@ -545,6 +641,8 @@ class CardMixin:
         if doc.exists:
             card_slug = doc_ref.id 
             doc_ref.delete()
+            self._forget_user_cards(uid)
+            self.invalidate_match_scores(uid)
         else:
             return None
         
@@ -567,6 +665,7 @@ class CardMixin:
     def update_card_details(self, uid, user_card_id, data):
         ref = self.db.collection('users').document(uid).collection('user_cards').document(user_card_id)
         ref.update(data)
+        self._forget_user_cards(uid)
 
     def update_benefit_usage(self, uid, user_card_id, benefit_name, usage_amount, period_key=None, is_full=False, increment=False):
         card_ref = self.db.collection('users').document(uid).collection('user_cards').document(user_card_id)
@@ -591,6 +690,7 @@ class CardMixin:
                 update_data[f'benefit_usage.{benefit_name}.used'] = usage_amount
             
         card_ref.update(update_data)
+        self._forget_user_cards(uid)
 
     def migrate_benefit_usage(self, uid, user_card_id, card_data):
         """Migrate orphaned benefit_usage keys to current versions using benefit_version_map.
@@ -657,6 +757,7 @@ class CardMixin:
 
         if migrations:
             card_ref.update({'benefit_usage': updated_usage})
+            self._forget_user_cards(uid)
 
         return migrations
 
@@ -667,3 +768,4 @@ class CardMixin:
             f'benefit_usage.{benefit_name}.last_updated': firestore.SERVER_TIMESTAMP
         }
         card_ref.update(update_data)
+        self._forget_user_cards(uid)
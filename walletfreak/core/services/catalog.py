@@ -0,0 +1,85 @@
+import threading
+import time
+
+from django.conf import settings
+
+
+class CatalogSnapshot:
+    """
+    Immutable, process-wide view of the hydrated card catalog.
+
+    Built once per catalog version and shared by every request in the worker,
+    so readers never pay for unpickling ~150 cards with their subcollections.
+    Card dicts (and their nested benefits / earning_rates) are shared and must
+    be treated as read-only; use `CardMixin.get_cards()` when you need copies
+    you can annotate.
+    """
+
+    def __init__(self, cards, version=None):
+        self.version = version
+        self.cards = tuple(cards)
+        self.cards_by_id = {c['id']: c for c in self.cards}
+        for c in self.cards:
+            slug = c.get('slug')
+            if slug and slug not in self.cards_by_id:
+                self.cards_by_id[slug] = c
+        self.built_at = time.time()
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def get(self, slug):
+        return self.cards_by_id.get(slug)
+
+    def derived(self, name, builder):
+        """
+        Memoize a structure derived from this snapshot (e.g. a rate index).
+        `builder` is called with the snapshot the first time `name` is
+        requested; the result lives exactly as long as this catalog version.
+        """
+        value = self._derived.get(name)
+        if value is not None:
+            return value
+        with self._derived_lock:
+            value = self._derived.get(name)
+            if value is None:
+                value = builder(self)
+                self._derived[name] = value
+        return value
+
+
+class CatalogHolder:
+    """
+    Holds the current CatalogSnapshot for this worker and decides when the
+    remote catalog version needs to be checked again.
+    """
+
+    def __init__(self, check_interval=30, max_age=86400):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.build_lock = threading.Lock()
+
+    def is_check_due(self):
+        return (time.time() - self.checked_at) >= self.check_interval
+
+    def is_expired(self):
+        # Safety net for deployments without a catalog_meta doc: the version
+        # never changes there, so fall back to the old 24h cache lifetime.
+        return self.snapshot is None or (time.time() - self.snapshot.built_at) >= self.max_age
+
+    def mark_checked(self):
+        self.checked_at = time.time()
+
+    def replace(self, snapshot):
+        self.snapshot = snapshot
+        self.mark_checked()
+
+    def clear(self):
+        self.snapshot = None
+        self.checked_at = 0.0
+
+
+catalog_holder = CatalogHolder(
+    check_interval=getattr(settings, 'CATALOG_VERSION_CHECK_SECONDS', 30),
+)
@@ -0,0 +1,99 @@
+import atexit
+import threading
+
+# Firestore caps a batch at 500 writes
+MAX_BATCH_OPS = 500
+
+
+class BufferedCounter:
+    """
+    Collects increments per key in memory and hands them to `flush_fn` as
+    {key: n} in the background: every `interval` seconds, or sooner once
+    `threshold` increments are pending. Pending counts are also flushed when
+    the process exits.
+
+    add() never does I/O, so counting stays off the request path.
+    """
+
+    def __init__(self, flush_fn, interval=30, threshold=200):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.threshold = threshold
+        self._pending = {}
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def add(self, key, n=1):
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + n
+            self._pending_total += n
+            over = self._pending_total >= self.threshold
+            if self._thread is None and not self._closed:
+                self._start()
+        if over:
+            self._wake.set()
+
+    @property
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='buffered-counter', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Hand everything pending to flush_fn. Returns the number of increments flushed."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                total, self._pending_total = self._pending_total, 0
+            if not pending:
+                return 0
+            try:
+                self.flush_fn(pending)
+            except Exception as e:
+                print(f"Error flushing buffered counts: {e}")
+            return total
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+
+def flush_increments(client, collection, field, counts):
+    """
+    Apply {doc_id: n} as one Increment(n) per document, in batched writes.
+    If a batch fails (e.g. a document was deleted), its documents are retried
+    one by one so the rest still land.
+    """
+    from firebase_admin import firestore
+
+    coll = client.collection(collection)
+    items = list(counts.items())
+    for start in range(0, len(items), MAX_BATCH_OPS):
+        chunk = items[start:start + MAX_BATCH_OPS]
+        batch = client.batch()
+        for doc_id, n in chunk:
+            batch.update(coll.document(doc_id), {field: firestore.Increment(n)})
+        try:
+            batch.commit()
+        except Exception as e:
+            print(f"Batched {field} flush failed, retrying individually: {e}")
+            for doc_id, n in chunk:
+                try:
+                    coll.document(doc_id).update({field: firestore.Increment(n)})
+                except Exception as e:
+                    print(f"Error flushing {field} for {collection}/{doc_id}: {e}")
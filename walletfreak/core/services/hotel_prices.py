@@ -1,7 +1,43 @@
 import hashlib
 import re
 from datetime import datetime, timedelta
-from google.cloud.firestore_v1 import ArrayUnion, SERVER_TIMESTAMP
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP, Increment, Maximum, Minimum
+
+# Monthly rollups of daily-rate observations (see save_hotel_daily_rates)
+RATE_MONTHS_COLLECTION = 'rate_months'
+
+
+def fold_observations(observations):
+    """Aggregate a list of legacy {rate, observed_at} observations into night stats."""
+    rated = [o for o in observations if o.get('rate')]
+    if not rated:
+        return None
+    rates = [o['rate'] for o in rated]
+    return {
+        'count': len(rates),
+        'sum': sum(rates),
+        'min': min(rates),
+        'max': max(rates),
+        'latest_rate': rated[-1]['rate'],
+        'latest_observed_at': rated[-1].get('observed_at', ''),
+    }
+
+
+def merge_night_stats(a, b):
+    """Combine two night aggregates; the newer latest observation wins."""
+    if not a:
+        return dict(b) if b else None
+    if not b:
+        return dict(a)
+    newer = b if str(b.get('latest_observed_at') or '') >= str(a.get('latest_observed_at') or '') else a
+    return {
+        'count': a['count'] + b['count'],
+        'sum': a['sum'] + b['sum'],
+        'min': min(a['min'], b['min']),
+        'max': max(a['max'], b['max']),
+        'latest_rate': newer.get('latest_rate'),
+        'latest_observed_at': newer.get('latest_observed_at', ''),
+    }
 
 
 class HotelPriceMixin:
@@ -40,23 +76,41 @@ class HotelPriceMixin:
         }, merge=True)
         return hotel_key
 
-    def save_hotel_daily_rates(self, hotels, check_in, check_out, location_text):
-        """
-        For each hotel, append a price observation to each stay-night's
-        daily_rates subcollection document.
-        Returns a dict mapping hotel name -> hotel_key for downstream use.
-        """
-        from datetime import date as date_type
-
+    def _stay_nights(self, check_in, check_out):
+        """ISO dates of each night from check-in up to the day before check-out."""
         ci = datetime.strptime(check_in, '%Y-%m-%d').date()
         co = datetime.strptime(check_out, '%Y-%m-%d').date()
-
-        # Generate list of stay nights (check-in to day before check-out)
-        stay_nights = []
+        nights = []
         d = ci
         while d < co:
-            stay_nights.append(d.isoformat())
+            nights.append(d.isoformat())
             d += timedelta(days=1)
+        return nights
+
+    def _rate_month_ref(self, hotel_key, month):
+        return (
+            self.db.collection('hotel_prices')
+            .document(hotel_key)
+            .collection(RATE_MONTHS_COLLECTION)
+            .document(month)
+        )
+
+    def save_hotel_daily_rates(self, hotels, check_in, check_out, location_text):
+        """
+        Record one price observation per hotel for each stay night.
+
+        Observations are folded into monthly rollup documents,
+        hotel_prices/{hotel_key}/rate_months/{YYYY-MM}, which keep per-night
+        aggregates (count, sum, min, max, latest rate) under `nights`. The
+        aggregates are updated with server-side transforms, so one write per
+        hotel per month covers every night of the stay and nothing is lost to
+        concurrent searches.
+        Returns a dict mapping hotel name -> hotel_key for downstream use.
+        """
+        stay_nights = self._stay_nights(check_in, check_out)
+        months = {}
+        for night in stay_nights:
+            months.setdefault(night[:7], []).append(night)
 
         hotel_keys = {}
         batch = self.db.batch()
@@ -85,32 +139,30 @@ class HotelPriceMixin:
             }, merge=True)
             ops += 1
 
-            # Append observation to each stay night
-            observation = {
-                'rate': rate,
-                'observed_at': datetime.utcnow().isoformat(),
-                'source': 'serpapi',
-            }
-
-            for night in stay_nights:
-                doc_ref = (
-                    self.db.collection('hotel_prices')
-                    .document(hotel_key)
-                    .collection('daily_rates')
-                    .document(night)
-                )
-                batch.set(doc_ref, {
-                    'latest_rate': rate,
-                    'latest_observed_at': SERVER_TIMESTAMP,
-                    'observations': ArrayUnion([observation]),
+            observed_at = datetime.utcnow().isoformat()
+            for month, nights in months.items():
+                batch.set(self._rate_month_ref(hotel_key, month), {
+                    'month': month,
+                    'nights': {
+                        night: {
+                            'count': Increment(1),
+                            'sum': Increment(rate),
+                            'min': Minimum(rate),
+                            'max': Maximum(rate),
+                            'latest_rate': rate,
+                            'latest_observed_at': observed_at,
+                        }
+                        for night in nights
+                    },
+                    'last_updated': SERVER_TIMESTAMP,
                 }, merge=True)
                 ops += 1
 
-                # Firestore batch limit is 500 ops
-                if ops >= 490:
-                    batch.commit()
-                    batch = self.db.batch()
-                    ops = 0
+            # Firestore batch limit is 500 ops
+            if ops >= 490:
+                batch.commit()
+                batch = self.db.batch()
+                ops = 0
 
         if ops > 0:
             batch.commit()
@@ -141,44 +193,142 @@ class HotelPriceMixin:
             return data.get('hotels', []), data.get('fetched_at')
         return None, None
 
-    def get_hotel_price_history(self, hotel_key, stay_date):
+    def get_hotel_night_stats(self, hotel_key, stay_date):
         """
-        Get the observations array for a specific hotel + stay night.
-        Returns list of observation dicts or empty list.
+        Price aggregates for one hotel + stay night:
+        {count, sum, min, max, latest_rate, latest_observed_at}, or None.
         """
-        doc_ref = (
-            self.db.collection('hotel_prices')
-            .document(hotel_key)
-            .collection('daily_rates')
-            .document(stay_date)
-        )
-        doc = doc_ref.get()
-        if doc.exists:
-            data = doc.to_dict()
-            return data.get('observations', [])
-        return []
+        return self.get_hotel_night_stats_many([hotel_key], stay_date).get(hotel_key)
+
+    def get_hotel_night_stats_many(self, hotel_keys, stay_date):
+        """
+        Night aggregates for many hotels in one get_all round trip.
+
+        Reads the monthly rollup and, for hotels that have not been compacted
+        yet, the legacy daily_rates/{stay_date} document; both are merged.
+        Returns {hotel_key: stats} for hotels with observations.
+        """
+        hotel_keys = list(dict.fromkeys(k for k in hotel_keys if k))
+        if not hotel_keys:
+            return {}
+
+        refs = []
+        for hotel_key in hotel_keys:
+            refs.append(self._rate_month_ref(hotel_key, stay_date[:7]))
+            refs.append(
+                self.db.collection('hotel_prices')
+                .document(hotel_key)
+                .collection('daily_rates')
+                .document(stay_date)
+            )
+
+        stats = {}
+        try:
+            for doc in self.db.get_all(refs):
+                if not doc.exists:
+                    continue
+                data = doc.to_dict() or {}
+                if doc.reference.parent.id == RATE_MONTHS_COLLECTION:
+                    night = (data.get('nights') or {}).get(stay_date)
+                else:
+                    night = fold_observations(data.get('observations', []))
+                if not night or not night.get('count'):
+                    continue
+                # {month|night} -> {rate_months|daily_rates} -> hotel_prices/{hotel_key}
+                hotel_key = doc.reference.parent.parent.id
+                stats[hotel_key] = merge_night_stats(stats.get(hotel_key), night)
+        except Exception as e:
+            print(f"Error fetching hotel price stats: {e}")
+        return stats
 
     def get_hotel_price_summary(self, hotel_key, check_in):
         """
         Get price summary for a hotel's first stay night.
         Returns dict with prior observations info, or None.
         """
-        observations = self.get_hotel_price_history(hotel_key, check_in)
-        if not observations or len(observations) < 2:
-            return None
+        return self.get_hotel_price_summaries([hotel_key], check_in).get(hotel_key)
 
-        # Exclude the most recent (just-added) observation
-        prior = observations[:-1]
-        prior_rates = [o['rate'] for o in prior if o.get('rate')]
-        if not prior_rates:
-            return None
+    def get_hotel_price_summaries(self, hotel_keys, stay_date):
+        """
+        Price summaries for many hotels' `stay_date` night in one get_all round trip.
 
-        avg_prior = sum(prior_rates) / len(prior_rates)
-        latest_prior = prior[-1]
+        Summaries describe everything stored so far, so call this *before*
+        save_hotel_daily_rates to compare a fresh search against prior prices.
+        Returns {hotel_key: summary} for hotels that have prior observations.
+        """
+        return {
+            hotel_key: self._summarize_night_stats(night)
+            for hotel_key, night in self.get_hotel_night_stats_many(hotel_keys, stay_date).items()
+        }
 
+    @staticmethod
+    def _summarize_night_stats(night):
         return {
-            'prior_avg': round(avg_prior, 0),
-            'prior_count': len(prior_rates),
-            'last_rate': latest_prior.get('rate'),
-            'last_observed_at': latest_prior.get('observed_at', ''),
+            'prior_avg': round(night['sum'] / night['count'], 0),
+            'prior_count': night['count'],
+            'prior_min': night.get('min'),
+            'prior_max': night.get('max'),
+            'last_rate': night.get('latest_rate'),
+            'last_observed_at': night.get('latest_observed_at', ''),
         }
+
+    def compact_hotel_daily_rates(self, hotel_key, dry_run=False):
+        """
+        Fold a hotel's legacy daily_rates/{night} observation arrays into the
+        monthly rollups and delete them.
+
+        Each month is committed as one batch (rollup update + deletes), so a
+        night is never counted twice or lost if the run is interrupted and
+        repeated. Returns {'nights': n, 'observations': n, 'months': n}.
+        """
+        hotel_ref = self.db.collection('hotel_prices').document(hotel_key)
+        months = {}
+        for doc in hotel_ref.collection('daily_rates').stream():
+            months.setdefault(doc.id[:7], []).append(doc)
+
+        counts = {'nights': 0, 'observations': 0, 'months': len(months)}
+        if not months:
+            return counts
+
+        month_refs = {month: self._rate_month_ref(hotel_key, month) for month in months}
+        existing = {}
+        for snap in self.db.get_all(list(month_refs.values())):
+            if snap.exists:
+                existing[snap.id] = (snap.to_dict() or {}).get('nights') or {}
+
+        for month, docs in sorted(months.items()):
+            nights = {}
+            for doc in docs:
+                folded = fold_observations((doc.to_dict() or {}).get('observations', []))
+                if not folded:
+                    continue
+                night = {
+                    'count': Increment(folded['count']),
+                    'sum': Increment(folded['sum']),
+                    'min': Minimum(folded['min']),
+                    'max': Maximum(folded['max']),
+                }
+                current = existing.get(month, {}).get(doc.id)
+                # Rollup writes postdate the legacy arrays, so only fill in
+                # the latest rate where the rollup has none or an older one
+                if not current or str(current.get('latest_observed_at') or '') < str(folded['latest_observed_at']):
+                    night['latest_rate'] = folded['latest_rate']
+                    night['latest_observed_at'] = folded['latest_observed_at']
+                nights[doc.id] = night
+                counts['observations'] += folded['count']
+            counts['nights'] += len(docs)
+
+            if dry_run:
+                continue
+            batch = self.db.batch()
+            if nights:
+                batch.set(month_refs[month], {
+                    'month': month,
+                    'nights': nights,
+                    'last_updated': SERVER_TIMESTAMP,
+                }, merge=True)
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+
+        return counts
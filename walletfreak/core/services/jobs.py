@@ -0,0 +1,231 @@
+import os
+import random
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+
+JOBS_COLLECTION = 'jobs'
+
+# job_type -> dotted path of handler(payload, job). A handler that raises is
+# retried with backoff until max_attempts; job['is_last_attempt'] tells it
+# when to record a permanent failure of its own.
+DEFAULT_JOB_HANDLERS = {
+    'strategy_analysis': 'booking_optimizer.strategy_service.run_strategy_analysis_job',
+    'blog_notification': 'core.services.blogs.run_blog_notification_job',
+    'benefit_reminders': 'core.management.commands.check_unused_benefits.run_benefit_reminders_job',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def get_job_executor():
+    """Process-wide bounded pool for jobs dispatched right after enqueue."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'JOB_WORKERS', 4),
+                    thread_name_prefix='jobs',
+                )
+    return _executor
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for a job that has failed `attempts` times."""
+    base = getattr(settings, 'JOB_RETRY_BASE_SECONDS', 30)
+    cap = getattr(settings, 'JOB_RETRY_MAX_SECONDS', 30 * 60)
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def is_claimable(job, now):
+    """Queued and due, or running on a worker whose lease has lapsed."""
+    status = job.get('status')
+    if status == 'queued':
+        run_after = job.get('run_after')
+        return run_after is None or run_after <= now
+    if status == 'running':
+        lease = job.get('lease_expires_at')
+        return lease is not None and lease <= now
+    return False
+
+
+class JobMixin:
+    """
+    Durable background jobs stored in the `jobs` collection.
+
+    enqueue_job() records the job and, unless JOBS_RUN_INLINE is False, hands
+    it to this process's bounded pool. Running a job means claiming it in a
+    transaction with a lease; if the process dies mid-job the lease lapses and
+    the run_jobs command (or the jobs cron endpoint) picks it up again, so no
+    work is lost on scale-down.
+    """
+
+    def _job_handler(self, job_type):
+        handlers = {**DEFAULT_JOB_HANDLERS, **getattr(settings, 'JOB_HANDLERS', {})}
+        path = handlers.get(job_type)
+        if not path:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+        return import_string(path)
+
+    def enqueue_job(self, job_type, payload, max_attempts=3, run_inline=None):
+        """Record a job and return its id."""
+        now = _now()
+        _, doc_ref = self.db.collection(JOBS_COLLECTION).add({
+            'type': job_type,
+            'payload': payload,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': max_attempts,
+            'run_after': now,
+            'created_at': now,
+            'updated_at': now,
+            'last_error': None,
+        })
+        if run_inline is None:
+            run_inline = getattr(settings, 'JOBS_RUN_INLINE', True)
+        if run_inline:
+            get_job_executor().submit(self.run_job, doc_ref.id)
+        return doc_ref.id
+
+    def get_job(self, job_id):
+        return self.get_document(JOBS_COLLECTION, job_id)
+
+    def get_jobs(self, job_ids):
+        """{job_id: job} for the given ids in one round trip."""
+        job_ids = list(dict.fromkeys(j for j in job_ids if j))
+        if not job_ids:
+            return {}
+        coll = self.db.collection(JOBS_COLLECTION)
+        return {
+            snap.id: snap.to_dict() | {'id': snap.id}
+            for snap in self.db.get_all([coll.document(j) for j in job_ids])
+            if snap.exists
+        }
+
+    def get_due_job_ids(self, limit=50):
+        """
+        Ids of jobs that are queued and due, or whose running lease has lapsed.
+        Each status is paged through until `limit` due jobs are found, so a
+        backlog of jobs backing off cannot hide the due ones behind it.
+        """
+        now = _now()
+        coll = self.db.collection(JOBS_COLLECTION)
+        page_size = limit * 4
+        due = []
+        for status in ('queued', 'running'):
+            last = None
+            while len(due) < limit:
+                query = coll.where(filter=FieldFilter('status', '==', status)).limit(page_size)
+                if last is not None:
+                    query = query.start_after(last)
+                snaps = list(query.stream())
+                for snap in snaps:
+                    if is_claimable(snap.to_dict(), now):
+                        due.append(snap.id)
+                if len(snaps) < page_size:
+                    break
+                last = snaps[-1]
+        return due[:limit]
+
+    def claim_job(self, job_id, worker_id=None, lease_seconds=None):
+        """
+        Atomically take a claimable job. Returns the job (attempts already
+        incremented) or None if it is not claimable or another worker won.
+        """
+        worker_id = worker_id or default_worker_id()
+        lease_seconds = lease_seconds or getattr(settings, 'JOB_LEASE_SECONDS', 600)
+        doc_ref = self.db.collection(JOBS_COLLECTION).document(job_id)
+        transaction = self.db.transaction()
+
+        @firestore.transactional
+        def claim_in_transaction(transaction, doc_ref):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            job = snapshot.to_dict()
+            now = _now()
+            if not is_claimable(job, now):
+                return None
+            update = {
+                'status': 'running',
+                'attempts': job.get('attempts', 0) + 1,
+                'worker': worker_id,
+                'started_at': now,
+                'lease_expires_at': now + timedelta(seconds=lease_seconds),
+                'updated_at': now,
+            }
+            transaction.update(doc_ref, update)
+            return job | update | {'id': job_id}
+
+        return claim_in_transaction(transaction, doc_ref)
+
+    def run_job(self, job_id, worker_id=None):
+        """
+        Claim and execute one job. Returns its new status, or None if it was
+        not claimable.
+        """
+        try:
+            job = self.claim_job(job_id, worker_id)
+        except Exception as e:
+            print(f"Error claiming job {job_id}: {e}")
+            return None
+        if job is None:
+            return None
+
+        doc_ref = self.db.collection(JOBS_COLLECTION).document(job_id)
+        job['is_last_attempt'] = job['attempts'] >= job.get('max_attempts', 1)
+        try:
+            self._job_handler(job['type'])(job.get('payload') or {}, job)
+        except Exception as e:
+            print(f"Job {job_id} ({job.get('type')}) attempt {job['attempts']} failed: {e}")
+            now = _now()
+            update = {'last_error': str(e)[:1000], 'updated_at': now, 'lease_expires_at': None}
+            if job['is_last_attempt']:
+                update |= {'status': 'failed', 'finished_at': now}
+            else:
+                update |= {'status': 'queued', 'run_after': now + timedelta(seconds=retry_delay(job['attempts']))}
+            doc_ref.update(update)
+            return update['status']
+
+        now = _now()
+        doc_ref.update({
+            'status': 'succeeded',
+            'finished_at': now,
+            'updated_at': now,
+            'lease_expires_at': None,
+        })
+        return 'succeeded'
+
+    def prune_finished_jobs(self, older_than_days=7, limit=400):
+        """Delete succeeded/failed jobs finished more than `older_than_days` ago."""
+        cutoff = _now() - timedelta(days=older_than_days)
+        coll = self.db.collection(JOBS_COLLECTION)
+        batch = self.db.batch()
+        deleted = 0
+        for status in ('succeeded', 'failed'):
+            query = coll.where(filter=FieldFilter('status', '==', status)).limit(limit)
+            for snap in query.stream():
+                finished_at = snap.to_dict().get('finished_at')
+                if finished_at and finished_at < cutoff and deleted < limit:
+                    batch.delete(snap.reference)
+                    deleted += 1
+        if deleted:
+            batch.commit()
+        return deleted
@@ -0,0 +1,232 @@
+import json
+
+import numpy as np
+
+
+def _rate_categories(cats):
+    """Earning-rate categories as a list of strings (list, JSON string or bare string)."""
+    if isinstance(cats, str):
+        try:
+            cats = json.loads(cats)
+        except Exception:
+            cats = [cats]
+    if not isinstance(cats, list):
+        cats = [str(cats)]
+    return [str(c) for c in cats]
+
+
+def _category_weight(cat_name):
+    cat_lower = cat_name.lower()
+    if 'grocery' in cat_lower or 'groceries' in cat_lower or 'dining' in cat_lower or 'restaurant' in cat_lower:
+        return 1.0
+    if 'travel' in cat_lower or 'gas' in cat_lower or 'mobile wallet' in cat_lower or 'transit' in cat_lower or 'flight' in cat_lower or 'hotel' in cat_lower:
+        return 0.8
+    if 'online' in cat_lower or 'retail' in cat_lower or 'entertainment' in cat_lower or 'streaming' in cat_lower:
+        return 0.5
+    return 0.2
+
+
+def _sub_roi(card):
+    sub = card.get('sign_up_bonus', {})
+    if not sub:
+        return 0.0
+    try:
+        value = float(sub.get('value', 0) or 0)
+        spend = float(sub.get('spend_amount', 0) or 0)
+        currency = sub.get('currency', 'Points')
+        cpp = float(card.get('points_value_cpp', 1.0) or 1.0)
+        af = float(card.get('annual_fee', 0) or 0)
+    except Exception:
+        return 0.0
+    if value == 0:
+        return 0.0
+    dollar_value = value
+    if 'cash' not in str(currency).lower():
+        dollar_value = value * (cpp / 100.0)
+    net_value = dollar_value - af
+    if spend <= 0:
+        return 100.0 if net_value > 0 else 0.0
+    return min(100.0, (net_value / spend) * 100.0)
+
+
+def _card_tags(card):
+    tags = set()
+    for b in card.get('benefits', []):
+        cats = b.get('category', []) or b.get('benefit_category', [])
+        if isinstance(cats, str):
+            cats = [cats]
+        for c in cats:
+            tags.add(c.lower())
+        short = b.get('short_description') or b.get('benefit_description_short')
+        if short:
+            tags.add(short.lower())
+    for r in card.get('earning_rates', []):
+        for c in _rate_categories(r.get('category', [])):
+            tags.add(c.lower())
+    tags.add(card.get('name', '').lower())
+    return tags
+
+
+class MatchScoreEngine:
+    """
+    Array form of the 4-dimension match score (see PersonalityMixin.calculate_match_scores).
+
+    Everything that depends only on the catalog is laid out once per catalog
+    snapshot: every (card, category, rate) earning entry as parallel arrays
+    (a sparse cards x categories rate matrix), per-category weights, SUB ROI,
+    annual fees and the student-card mask. Scoring a user is then one
+    best-rate vector over the category columns plus a few array operations.
+    """
+
+    def __init__(self, cards):
+        self.cards = list(cards)
+        n = len(self.cards)
+        self.ids = [c['id'] for c in self.cards]
+        self.rows = {}
+        for i, c in enumerate(self.cards):
+            self.rows.setdefault(c['id'], i)
+
+        self.columns = {}     # raw category name -> column
+        entry_card, entry_col, entry_rate = [], [], []
+        for i, card in enumerate(self.cards):
+            for r in card.get('earning_rates', []):
+                rate_val = float(r.get('rate', 0) or 0)
+                for cat in _rate_categories(r.get('category', [])):
+                    col = self.columns.setdefault(cat, len(self.columns))
+                    entry_card.append(i)
+                    entry_col.append(col)
+                    entry_rate.append(rate_val)
+
+        column_names = list(self.columns)
+        self.entry_card = np.asarray(entry_card, dtype=np.intp)
+        self.entry_col = np.asarray(entry_col, dtype=np.intp)
+        self.entry_rate = np.asarray(entry_rate, dtype=np.float64)
+        column_weight = np.asarray([_category_weight(c) for c in column_names], dtype=np.float64)
+        self.entry_weight = column_weight[self.entry_col] if column_names else np.zeros(0)
+        self.all_purchases_cols = np.asarray(
+            [col for col, name in enumerate(column_names) if name.lower() == 'all purchases'], dtype=np.intp)
+
+        self.sub_roi = np.asarray([_sub_roi(c) for c in self.cards], dtype=np.float64).reshape(n)
+        self.annual_fee = np.asarray([float(c.get('annual_fee', 0) or 0) for c in self.cards], dtype=np.float64).reshape(n)
+        self.is_student = np.asarray([
+            'student' in (c.get('name') or '').lower() or 'student' in (c.get('slug') or '').lower()
+            for c in self.cards
+        ], dtype=bool).reshape(n)
+
+        # Alignment inputs: per-card tags, plus one joined string so "keyword in
+        # any tag" is a single substring test (NUL never occurs in a keyword).
+        self.tags = [_card_tags(c) for c in self.cards]
+        self.joined_tags = ['\x00'.join(t) for t in self.tags]
+        self._keyword_hits = {}
+
+    def rows_for(self, cards):
+        """
+        Engine rows for `cards`, or None if any card is not this engine's.
+        Copies from CardMixin.get_cards() share their nested lists with the
+        snapshot, which is what we check; anything else needs its own engine.
+        """
+        rows = np.empty(len(cards), dtype=np.intp)
+        for k, card in enumerate(cards):
+            i = self.rows.get(card.get('id'))
+            if i is None:
+                return None
+            own = self.cards[i]
+            if card is not own and (card.get('earning_rates') is not own.get('earning_rates')
+                                    or card.get('benefits') is not own.get('benefits')):
+                return None
+            rows[k] = i
+        return rows
+
+    def user_best_rates(self, user_cards):
+        """{category: best rate the wallet earns}, matching the catalog's raw category names."""
+        best_rates = {}
+        for card in user_cards or []:
+            for r in card.get('earning_rates', []):
+                rate_val = float(r.get('rate', 0) or 0)
+                for cat in _rate_categories(r.get('category', [])):
+                    if rate_val > best_rates.get(cat, 0.0):
+                        best_rates[cat] = rate_val
+        return best_rates
+
+    def incremental_utility(self, user_best_rates):
+        """Dimension 1 for every card: sum of weighted rate gains over the wallet, x20, capped at 100."""
+        n = len(self.cards)
+        if not len(self.entry_card):
+            return np.zeros(n)
+        # Wallet's best rate per column; unknown categories compare against
+        # the wallet's All Purchases rate (1x if none)
+        user_vec = np.full(len(self.columns), user_best_rates.get('All Purchases', 1.0))
+        for cat, rate in user_best_rates.items():
+            col = self.columns.get(cat)
+            if col is not None:
+                user_vec[col] = rate
+        user_vec[self.all_purchases_cols] = user_best_rates.get('All Purchases', user_best_rates.get('General', 1.0))
+
+        gains = np.maximum(0.0, self.entry_rate - user_vec[self.entry_col]) * self.entry_weight
+        utility = np.bincount(self.entry_card, weights=gains, minlength=n)
+        return np.minimum(100.0, utility * 20.0)
+
+    def _keyword_vector(self, kw):
+        hits = self._keyword_hits.get(kw)
+        if hits is None:
+            hits = np.asarray([
+                kw in joined or any(tag in kw for tag in tags)
+                for joined, tags in zip(self.joined_tags, self.tags)
+            ], dtype=bool)
+            self._keyword_hits[kw] = hits
+        return hits
+
+    def personality_alignment(self, personality):
+        """Dimension 2 for every card: % of personality keywords matched, x1.5 for slot cards, capped at 100."""
+        n = len(self.cards)
+        keywords = {k.lower() for k in personality.get('categories', [])}
+        if not keywords:
+            return np.zeros(n)
+        matches = np.zeros(n)
+        for kw in keywords:
+            matches += self._keyword_vector(kw)
+        percent = matches / len(keywords) * 100.0
+
+        slot_cards = set()
+        for slot in personality.get('slots', []):
+            slot_cards.update(slot.get('cards', []))
+        if slot_cards:
+            in_slot = np.asarray([
+                c.get('id') in slot_cards or bool(c.get('slug') and c.get('slug') in slot_cards)
+                for c in self.cards
+            ], dtype=bool)
+            percent = np.where(in_slot, percent * 1.5, percent)
+        return np.minimum(100.0, percent)
+
+    def fee_affinity(self, user_avg_fee):
+        """Dimension 4 for every card: 1 - |fee - wallet avg fee| / 500, as a percentage."""
+        return np.maximum(0.0, (1.0 - np.abs(self.annual_fee - user_avg_fee) / 500.0) * 100.0)
+
+    def score(self, personality, user_cards, rows=None):
+        """
+        Final 0-100 match score for every card (or for `rows` only).
+        Cards already in the wallet score 0.
+        """
+        user_cards = user_cards or []
+        user_avg_fee = 0
+        if user_cards:
+            user_avg_fee = sum(float(c.get('annual_fee', 0) or 0) for c in user_cards) / len(user_cards)
+
+        final = (self.incremental_utility(self.user_best_rates(user_cards)) * 0.45
+                 + self.personality_alignment(personality) * 0.35
+                 + self.sub_roi * 0.15
+                 + self.fee_affinity(user_avg_fee) * 0.05)
+
+        # Student cards are rarely the right pick for established users
+        if len(user_cards) >= 2:
+            final = np.where(self.is_student, final * 0.1, final)
+        final = np.clip(final, 0.0, 100.0)
+
+        owned_ids = {c.get('id') for c in user_cards}
+        owned_slugs = {c.get('slug') for c in user_cards}
+        owned = np.asarray([
+            c['id'] in owned_ids or c.get('slug') in owned_slugs for c in self.cards
+        ], dtype=bool)
+        final[owned] = 0.0
+
+        return final if rows is None else final[rows]
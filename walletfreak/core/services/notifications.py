@@ -2,9 +2,13 @@ from firebase_admin import firestore
 from django.conf import settings
 
 class NotificationMixin:
-    def get_user_notification_preferences(self, uid):
-        """Get user notification preferences"""
-        user = self.get_user_profile(uid)
+    def get_user_notification_preferences(self, uid, user=None):
+        """
+        Get user notification preferences.
+        Pass `user` when the profile is already loaded to skip the read.
+        """
+        if user is None:
+            user = self.get_user_profile(uid)
         default_prefs = {
             'benefit_expiration': {
                 'enabled': True,
@@ -50,21 +54,20 @@ class NotificationMixin:
         self.db.collection('users').document(uid).update({
             'notification_preferences': preferences
         })
+        self.invalidate_user_profiles(uid)
 
     def update_last_benefit_notification_time(self, uid):
         """Update user's last benefit email sent time"""
         self.db.collection('users').document(uid).update({
             'last_benefit_email_sent_at': firestore.SERVER_TIMESTAMP
         })
+        self.invalidate_user_profiles(uid)
 
-    def send_email_notification(self, to, subject, html_content=None, text_content=None, bcc=None):
+    def build_email_document(self, to, subject, html_content=None, text_content=None, bcc=None):
         """
-        Send an email via the Firebase Trigger Email Extension by writing to the 'mail' collection.
-        Supports single 'to' address and optional list of 'bcc' addresses.
+        Document for the 'mail' collection (Firebase Trigger Email Extension).
+        Callers that write mail in batches use this directly.
         """
-        if not to and not bcc:
-            return None
-            
         email_data = {
             'to': to if to else [], 
             'from': f'Wallet Freak <{settings.DEFAULT_FROM_EMAIL}>', 
@@ -86,6 +89,19 @@ class NotificationMixin:
         if text_content:
              email_data['message']['text'] = text_content
 
+        return email_data
+
+    def send_email_notification(self, to, subject, html_content=None, text_content=None, bcc=None):
+        """
+        Send an email via the Firebase Trigger Email Extension by writing to the 'mail' collection.
+        Supports single 'to' address and optional list of 'bcc' addresses.
+        """
+        if not to and not bcc:
+            return None
+
+        email_data = self.build_email_document(to, subject, html_content, text_content, bcc)
+        final_bcc = email_data['bcc']
+
         # BATCHING LOGIC
         # Firestore/SMTP often has limits (e.g. 500 recipients). User requested 250.
         try:
@@ -1,5 +1,17 @@
+import hashlib
+import json
+import time
+
+from firebase_admin import firestore
 from django.core.cache import cache
 
+from .match_engine import MatchScoreEngine
+
+# Match score entries are kept for a day; a hit that can't be checked
+# against the caller's wallet only trusts entries this recent (seconds)
+MATCH_SCORES_TTL = 86400
+MATCH_SCORES_UNCHECKED_TTL = 300
+
 class PersonalityMixin:
     def get_personalities(self):
         # 1. Check cache
@@ -73,6 +85,8 @@ class PersonalityMixin:
         else:
             # Create user profile if it doesn't exist
             user_ref.set(update_data)
+        self.invalidate_user_profiles(uid)
+        self.invalidate_match_scores(uid)
     
     def get_user_assigned_personality(self, uid):
         """
@@ -112,6 +126,8 @@ class PersonalityMixin:
             'personality_score': 0,
             'personality_assigned_at': None
         })
+        self.invalidate_user_profiles(uid)
+        self.invalidate_match_scores(uid)
 
     def get_quiz_questions(self):
         """Get all quiz questions sorted by stage"""
@@ -150,6 +166,7 @@ class PersonalityMixin:
             'survey_personality': personality_id,
             'survey_completed_at': firestore.SERVER_TIMESTAMP
         })
+        self.invalidate_user_profiles(uid)
         
         return doc_ref.id
     
@@ -190,265 +207,90 @@ class PersonalityMixin:
         
         Returns a dictionary {card_id: score}.
         """
-        scores = {}
-        
-        # 0. Check for Empty Wallet logic no longer applies strictly as we need to recommend cards regardless
-        # But if user_cards is empty, Incremental Utility is just absolute utility
-        
         if not user_personality:
             # Fallback or simple score? For now return 0s
-            for card in all_cards:
-                scores[card['id']] = 0
-            return scores
-
-        # Pre-process User Best Rates for Dimension 1
-        user_best_rates = self._get_user_best_rates(user_cards)
-        
-        # Pre-process User Avg Fee for Dimension 4
-        user_avg_fee = 0
-        if user_cards:
-            total_fees = sum(float(c.get('annual_fee', 0) or 0) for c in user_cards)
-            user_avg_fee = total_fees / len(user_cards)
-        else:
-            user_avg_fee = 95 # Default anchor if wallet is empty
-            if not user_cards: user_avg_fee = 0
-
-        for card in all_cards:
-            c_id = card['id']
-            # Skip if card is already in user's wallet
-            is_owned = False
-            for owned in user_cards:
-                if owned.get('id') == c_id or owned.get('slug') == card.get('slug'):
-                    is_owned = True
-                    break
-            
-            if is_owned:
-                scores[c_id] = 0
-                continue
+            return {card['id']: 0 for card in all_cards}
 
-            # --- Dimension 1: Incremental Utility (45%) ---
-            d1_score = self._calculate_incremental_utility(card, user_best_rates)
-            
-            # --- Dimension 2: Personality Alignment (35%) ---
-            d2_score = self._calculate_personality_alignment(card, user_personality)
-            
-            # --- Dimension 3: SUB ROI (15%) ---
-            d3_score = self._calculate_sub_roi(card)
-            
-            # --- Dimension 4: Fee Affinity (5%) ---
-            d4_score = self._calculate_fee_affinity(card, user_avg_fee)
-            
-            # --- Weighted Aggregation ---
-            final_score = (d1_score * 0.45) + (d2_score * 0.35) + (d3_score * 0.15) + (d4_score * 0.05)
-            
-            # PENALTY: Student Cards for established users
-            # If user has >= 2 cards, they likely don't need a student card
-            # Scale down significantly (e.g. 10% of original score) rather than complete 0
-            name = card.get('name') or ''
-            slug = card.get('slug') or ''
-            is_student_card = 'student' in name.lower() or 'student' in slug.lower()
-            if is_student_card and len(user_cards) >= 2:
-                final_score *= 0.1
+        all_cards = list(all_cards)
+        if not all_cards:
+            return {}
 
-            scores[c_id] = min(100.0, max(0.0, final_score))
-            
-        return scores
+        # Score against the engine precomputed for the current catalog; cards
+        # that didn't come from it (stale or hand-built) get a throwaway engine.
+        rows = None
+        snapshot = self.get_catalog_snapshot(build=False)
+        if snapshot is not None:
+            engine = snapshot.derived('match_score_engine', lambda s: MatchScoreEngine(s.cards))
+            rows = engine.rows_for(all_cards)
+        if rows is None:
+            engine = MatchScoreEngine(all_cards)
 
-    def _get_user_best_rates(self, user_cards):
-        """
-        Returns a dictionary: { 'CategoryName': max_rate_found }
-        """
-        best_rates = {}
-        if not user_cards:
-            return best_rates
-            
-        for card in user_cards:
-            rates = card.get('earning_rates', [])
-            for r in rates:
-                rate_val = float(r.get('rate', 0) or 0)
-                cats = r.get('category', [])
-                if isinstance(cats, str):
-                    try:
-                        import json
-                        cats = json.loads(cats)
-                    except:
-                        cats = [cats]
-                
-                # Normalize cats to list
-                if not isinstance(cats, list):
-                    cats = [str(cats)]
-                    
-                for cat in cats:
-                    current_max = best_rates.get(cat, 0.0)
-                    if rate_val > current_max:
-                        best_rates[cat] = rate_val
-        return best_rates
+        final = engine.score(user_personality, user_cards, rows=rows)
+        return dict(zip((card['id'] for card in all_cards), final.tolist()))
 
-    def _calculate_incremental_utility(self, card, user_best_rates):
-        """
-        Dimension 1: Incremental Utility
-        Iterate through candidate card's earning rates.
-        Delta = CardRate - UserBestRate (min 0)
-        Score = sum(Delta * Weight)
-        """
-        total_utility = 0.0
-        
-        # Category Weights
-        def get_weight(cat_name):
-            cat_lower = cat_name.lower()
-            if 'grocery' in cat_lower or 'groceries' in cat_lower or 'dining' in cat_lower or 'restaurant' in cat_lower:
-                return 1.0
-            if 'travel' in cat_lower or 'gas' in cat_lower or 'mobile wallet' in cat_lower or 'transit' in cat_lower or 'flight' in cat_lower or 'hotel' in cat_lower:
-                return 0.8
-            if 'online' in cat_lower or 'retail' in cat_lower or 'entertainment' in cat_lower or 'streaming' in cat_lower:
-                return 0.5
-            return 0.2
+    # Match Score Cache
+    def _match_scores_cache_key(self, uid):
+        return f'match_scores_{uid}'
 
-        rates = card.get('earning_rates', [])
-        
-        for r in rates:
-            rate_val = float(r.get('rate', 0) or 0)
-            cats = r.get('category', [])
-            if isinstance(cats, str):
-                try:
-                    import json
-                    cats = json.loads(cats)
-                except:
-                    cats = [cats]
-            if not isinstance(cats, list):
-                cats = [str(cats)]
+    @staticmethod
+    def _wallet_fingerprint(user_cards):
+        entries = sorted(
+            (str(c.get('card_id') or c.get('id')), str(c.get('status'))) for c in user_cards or []
+        )
+        return hashlib.sha1(json.dumps(entries).encode('utf-8')).hexdigest()
 
-            for cat in cats:
-                if cat.lower() == 'all purchases':
-                    user_best = user_best_rates.get('All Purchases', user_best_rates.get('General', 1.0))
-                else:
-                    user_best = user_best_rates.get(cat, user_best_rates.get('All Purchases', 1.0))
-                
-                delta = max(0.0, rate_val - user_best)
-                weight = get_weight(cat)
-                
-                total_utility += delta * weight
-                
-        # Normalize to 0-100 scale based on max possible gap
-        # Uses multiplier 20.0 as derived from example (1.2 raw -> 24 score)
-        normalized_score = total_utility * 20.0
-        return min(100.0, normalized_score)
+    @staticmethod
+    def _personality_key(personality):
+        if not personality:
+            return None
+        return personality.get('slug') or personality.get('id')
 
-    def _calculate_personality_alignment(self, card, personality):
+    def get_user_match_scores(self, uid, user_cards=None, user_personality=None):
         """
-        Dimension 2: Personality Alignment
-        % of BenefitCategory + Keywords matches.
+        Cached {card_id: score} over the whole catalog for a user.
+
+        The entry records the wallet fingerprint (card slugs + statuses), the
+        personality slug and the catalog version it was scored against. When
+        the caller passes the user's cards / personality, the entry is checked
+        against them. Callers that omit either skip its Firestore read, but
+        then only trust entries younger than MATCH_SCORES_UNCHECKED_TTL, since
+        a wallet or personality write that missed the eager invalidation (made
+        on another worker) would otherwise stick for a day.
         """
-        # Targets: Personality Categories (Keywords)
-        target_keywords = set([k.lower() for k in personality.get('categories', [])])
-        
-        # Sources: Card Benefit Categories + Short Titles + Name
-        card_tags = set()
-        
-        # Benefits
-        for b in card.get('benefits', []):
-            # parse_updates.py normalizes to 'category' and 'short_description'
-            cats = b.get('category', []) or b.get('benefit_category', [])
-            if isinstance(cats, str): cats = [cats]
-            for c in cats:
-                card_tags.add(c.lower())
-            
-            short = b.get('short_description') or b.get('benefit_description_short')
-            if short:
-                card_tags.add(short.lower())
-        
-        # Earning Categories (Why not? If it earns on Apple, it aligns with Apple personality)
-        for r in card.get('earning_rates', []):
-            cats = r.get('category', [])
-            if isinstance(cats, str):
-                try:
-                    import json
-                    cats = json.loads(cats)
-                except:
-                    cats = [cats]
-            if not isinstance(cats, list): cats = [str(cats)]
-            for c in cats:
-                card_tags.add(c.lower())
+        snapshot = self.get_catalog_snapshot()
+        if snapshot is None:
+            return {}
+        catalog_version = snapshot.version if snapshot.version is not None else snapshot.built_at
 
-        card_tags.add(card.get('name', '').lower())
-        
-        # Match
-        matches = 0
-        if not target_keywords: 
-            return 0.0
+        key = self._match_scores_cache_key(uid)
+        entry = cache.get(key)
+        if entry and entry['catalog_version'] == catalog_version:
+            recent = time.time() - entry.get('scored_at', 0) <= MATCH_SCORES_UNCHECKED_TTL
+            if user_cards is None:
+                wallet_ok = recent
+            else:
+                wallet_ok = entry['wallet'] == self._wallet_fingerprint(user_cards)
+            if user_personality is None:
+                personality_ok = recent
+            else:
+                personality_ok = entry['personality'] == self._personality_key(user_personality)
+            if wallet_ok and personality_ok:
+                return entry['scores']
 
-        for kw in target_keywords:
-            for tag in card_tags:
-                if kw in tag or tag in kw: # Loose match
-                    matches += 1
-                    break
-        
-        percent_match = 0
-        if len(target_keywords) > 0:
-            percent_match = (matches / len(target_keywords)) * 100.0
-            
-        # Slot Multiplier
-        in_slot = False
-        c_id = card.get('id')
-        c_slug = card.get('slug')
-        
-        for slot in personality.get('slots', []):
-            slot_cards = slot.get('cards', [])
-            if c_id in slot_cards or (c_slug and c_slug in slot_cards):
-                in_slot = True
-                break
-                
-        if in_slot:
-            percent_match *= 1.5
-            
-        return min(100.0, percent_match)
+        if user_cards is None:
+            user_cards = self.get_user_cards(uid)
+        if user_personality is None:
+            user_personality = self.get_user_assigned_personality(uid)
 
-    def _calculate_sub_roi(self, card):
-        """
-        Dimension 3: Sign-Up Bonus ROI
-        """
-        sub = card.get('sign_up_bonus', {})
-        if not sub:
-            return 0.0
-            
-        try:
-            value = float(sub.get('value', 0) or 0)
-            spend = float(sub.get('spend_amount', 0) or 0)
-            currency = sub.get('currency', 'Points')
-            cpp = float(card.get('points_value_cpp', 1.0) or 1.0)
-            af = float(card.get('annual_fee', 0) or 0)
-        except:
-            return 0.0
-            
-        if value == 0:
-            return 0.0
-            
-        dollar_value = value
-        if 'cash' not in str(currency).lower():
-            dollar_value = value * (cpp / 100.0)
-            
-        net_value = dollar_value - af
-        
-        if spend <= 0:
-            return 100.0 if net_value > 0 else 0.0
-            
-        roi = (net_value / spend) * 100.0
-        
-        # Cap ROI score at 100 for >100% ROI? 
-        # Or should 20% ROI be a score of 20? 
-        # Let's simple cap at 100.
-        return min(100.0, roi)
+        scores = self.calculate_match_scores(user_personality, user_cards, snapshot.cards)
+        cache.set(key, {
+            'wallet': self._wallet_fingerprint(user_cards),
+            'personality': self._personality_key(user_personality),
+            'catalog_version': catalog_version,
+            'scores': scores,
+            'scored_at': time.time(),
+        }, timeout=MATCH_SCORES_TTL)
+        return scores
 
-    def _calculate_fee_affinity(self, card, user_avg_fee):
-        """
-        Dimension 4: Fee & Strategy Affinity
-        Formula: 1 - (|CardFee - AvgFee| / 500)
-        """
-        card_fee = float(card.get('annual_fee', 0) or 0)
-        
-        diff = abs(card_fee - user_avg_fee)
-        denom = 500.0
-        
-        similarity = 1.0 - (diff / denom)
-        
-        return max(0.0, similarity * 100.0)
+    def invalidate_match_scores(self, uid):
+        cache.delete(self._match_scores_cache_key(uid))
@@ -0,0 +1,66 @@
+import copy
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('firestore_request_scope', default=None)
+
+
+class RequestScope:
+    """
+    Documents read during one request, keyed by path ('users/<uid>'), plus
+    read counters. With share_documents=False (requests that may write) it
+    only counts.
+    """
+
+    def __init__(self, share_documents=True):
+        self.share_documents = share_documents
+        self.documents = {}
+        self.reads = 0
+        self.hits = 0
+
+    def get(self, path):
+        """(found, document) for a path already read in this request."""
+        if not self.share_documents or path not in self.documents:
+            return False, None
+        self.hits += 1
+        return True, copy.deepcopy(self.documents[path])
+
+    def put(self, path, document):
+        self.reads += 1
+        if self.share_documents:
+            self.documents[path] = copy.deepcopy(document)
+
+    def forget(self, path):
+        self.documents.pop(path, None)
+
+    def forget_prefix(self, prefix):
+        for path in [p for p in self.documents if p.startswith(prefix)]:
+            del self.documents[path]
+
+
+def current_scope():
+    return _current.get()
+
+
+@contextmanager
+def request_scope(share_documents=True):
+    scope = RequestScope(share_documents)
+    token = _current.set(scope)
+    try:
+        yield scope
+    finally:
+        _current.reset(token)
+
+
+def forget_document(path):
+    """Drop `path` from the current request's documents after writing it."""
+    scope = _current.get()
+    if scope is not None:
+        scope.forget(path)
+
+
+def forget_documents(prefix):
+    """Drop every shared result whose path starts with `prefix` (e.g. a query's)."""
+    scope = _current.get()
+    if scope is not None:
+        scope.forget_prefix(prefix)
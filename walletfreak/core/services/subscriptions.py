@@ -25,6 +25,7 @@ class SubscriptionMixin:
                 'stripe_customer_id': stripe_customer_id,
                 'updated_at': firestore.SERVER_TIMESTAMP
             })
+            self.invalidate_user_profiles(uid)
             return True
         except Exception as e:
             print(f"Error updating stripe_customer_id for {uid}: {e}")
@@ -59,6 +60,7 @@ class SubscriptionMixin:
                 data['is_premium'] = False
 
             self.db.collection('users').document(uid).update(data)
+            self.invalidate_user_profiles(uid)
             return True
         except Exception as e:
             print(f"Error updating subscription for {uid}: {e}")
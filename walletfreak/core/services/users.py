@@ -1,4 +1,13 @@
+from django.conf import settings
+from django.core.cache import cache
 from firebase_admin import firestore
+from .request_scope import forget_document
+
+# Fields of a user profile that author enrichment reads (see get_users_by_ids)
+AUTHOR_PROFILE_FIELDS = (
+    'username', 'name', 'first_name', 'last_name', 'photo_url',
+    'is_premium', 'subscription_status',
+)
 
 class UserMixin:
     def _enrich_with_author_data(self, data, user):
@@ -44,11 +53,14 @@ class UserMixin:
         return self.get_document('users', uid)
 
     def create_user_profile(self, uid, data):
-        return self.create_document('users', data, doc_id=uid)
+        result = self.create_document('users', data, doc_id=uid)
+        self.invalidate_user_profiles(uid)
+        return result
         
     def update_user_email(self, uid, email):
         """Update user email in Firestore"""
         self.db.collection('users').document(uid).update({'email': email})
+        self.invalidate_user_profiles(uid)
 
     def update_user_name(self, uid, first_name, last_name):
         """Update user first and last name in Firestore"""
@@ -56,46 +68,59 @@ class UserMixin:
             'first_name': first_name,
             'last_name': last_name,
         })
+        self.invalidate_user_profiles(uid)
 
     def get_users_by_ids(self, uids):
-        """Get multiple user profiles by IDs"""
+        """
+        Author profiles ({uid: fields}) for the given uids, limited to
+        AUTHOR_PROFILE_FIELDS. Served from a per-uid cache (author_profile_<uid>);
+        misses are read with one batched get_all. Unknown uids are left out.
+        """
         if not uids:
             return {}
             
         try:
-            # Firestore 'in' query is limited to 30 items
-            # We need to chunk the requests
-            unique_uids = list(set(uids))
+            unique_uids = list(dict.fromkeys(u for u in uids if u))
+            cached = cache.get_many([f'author_profile_{uid}' for uid in unique_uids])
             users_map = {}
-            # Chunk into groups of 30
-            chunk_size = 30
-            for i in range(0, len(unique_uids), chunk_size):
-                chunk = unique_uids[i:i + chunk_size]
-                if not chunk:
-                    continue
+            missing = []
+            for uid in unique_uids:
+                profile = cached.get(f'author_profile_{uid}')
+                if profile is None:
+                    missing.append(uid)
+                elif profile:
+                    users_map[uid] = profile
                     
-                # Use '__name__' sentinel for document ID filtering
-                # Note: For 'in' queries with document IDs, we might need to use references or just try __name__
-                # But '__name__' usually expects full paths (collection/id).
-                # A safer way with the python client is often just FieldPath.document_id() but imports are failing.
-                # Let's try importing FieldPath from google.cloud.firestore_v1
-                try:
-                    from google.cloud.firestore_v1.field_path import FieldPath
-                    query = self.db.collection('users').where(FieldPath.document_id(), 'in', chunk)
-                except ImportError:
-                    # Fallback to string literal if import fails (though __name__ might behave differently depending on client version)
-                    query = self.db.collection('users').where('__name__', 'in', chunk)
-                    
-                docs = query.stream()
+            if missing:
+                coll = self.db.collection('users')
+                fetched = {uid: {} for uid in missing}
+                for doc in self.db.get_all([coll.document(uid) for uid in missing]):
+                    if doc.exists:
+                        data = doc.to_dict()
+                        fetched[doc.id] = {k: data[k] for k in AUTHOR_PROFILE_FIELDS if k in data}
+                # Unknown users are cached as {} so they are not re-read on every page
+                cache.set_many(
+                    {f'author_profile_{uid}': profile for uid, profile in fetched.items()},
+                    getattr(settings, 'USER_PROFILE_CACHE_SECONDS', 60 * 60),
+                )
+                users_map.update((uid, profile) for uid, profile in fetched.items() if profile)
                 
-                for doc in docs:
-                    users_map[doc.id] = doc.to_dict()
-                    
             return users_map
         except Exception as e:
             print(f"Error getting users by IDs: {e}")
             return {}
 
+    def invalidate_user_profiles(self, *uids):
+        """
+        Drop cached profiles after any write to a user's document: the author
+        projections, the full profile FirebaseAdminMiddleware caches and the
+        copy read earlier in this request.
+        """
+        uids = [uid for uid in uids if uid]
+        cache.delete_many([f'author_profile_{uid}' for uid in uids] + [f'user_profile_{uid}' for uid in uids])
+        for uid in uids:
+            forget_document(f'users/{uid}')
+
     def is_username_taken(self, username, exclude_uid=None):
         """Check if a username is already taken by another user"""
         try:
@@ -128,11 +153,12 @@ class UserMixin:
 
         # 1. Update user profile
         self.db.collection('users').document(uid).set({'username': username}, merge=True)
-        
+        self.invalidate_user_profiles(uid)
 
     def update_user_avatar(self, uid, photo_url):
         """Update user avatar in Firestore"""
         self.db.collection('users').document(uid).update({'photo_url': photo_url})
+        self.invalidate_user_profiles(uid)
 
     def generate_unique_username(self, first_name, last_name, uid):
         """
@@ -168,6 +194,7 @@ class UserMixin:
 
     def set_super_staff(self, uid, is_staff):
         self.db.collection('users').document(uid).update({'is_super_staff': is_staff})
+        self.invalidate_user_profiles(uid)
 
     # Editor Methods
     def is_editor(self, uid):
@@ -176,6 +203,7 @@ class UserMixin:
 
     def set_editor(self, uid, is_editor):
         self.db.collection('users').document(uid).update({'is_editor': is_editor})
+        self.invalidate_user_profiles(uid)
 
     def can_manage_blogs(self, uid):
         """Check if user can manage blogs (either super_staff or editor)"""
@@ -208,6 +236,7 @@ class UserMixin:
             data['subscription_period_end'] = current_period_end
             
         self.db.collection('users').document(uid).set(data, merge=True)
+        self.invalidate_user_profiles(uid)
 
     # Hotel Strategy Methods
     def save_hotel_strategy(self, uid, strategy_data):
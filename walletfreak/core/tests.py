@@ -70,3 +70,1041 @@ class UsernameGenerationTest(TestCase):
             username = db.generate_unique_username('Bob', 'Smith', 'uid123456')
             # Fallback format: bobsmith_uid123 (6 chars of uid)
             self.assertEqual(username, 'bobsmith_uid123')
+
+class CatalogSnapshotTest(TestCase):
+    def setUp(self):
+        from core.services.catalog import catalog_holder
+        self.holder = catalog_holder
+        self.holder.clear()
+        self.addCleanup(self.holder.clear)
+
+    def _cards(self):
+        return [
+            {'id': 'amex-gold', 'slug': 'amex-gold', 'name': 'Gold', 'is_active': True, 'benefits': []},
+            {'id': 'old-card', 'slug': 'old-card', 'name': 'Old', 'is_active': False, 'benefits': []},
+        ]
+
+    def test_rebuilds_only_when_version_changes(self):
+        from core.services import db
+        from unittest.mock import patch
+
+        with patch.object(db, '_fetch_catalog_version', return_value=1), \
+             patch.object(db, '_load_catalog', side_effect=lambda: self._cards()) as load:
+            self.assertEqual(len(db.get_cards()), 1)
+            self.holder.checked_at = 0  # force a version check
+            self.assertEqual(len(db.get_cards(include_deprecated=True)), 2)
+            self.assertEqual(load.call_count, 1)
+
+        with patch.object(db, '_fetch_catalog_version', return_value=2), \
+             patch.object(db, '_load_catalog', side_effect=lambda: self._cards()) as load:
+            self.holder.checked_at = 0
+            db.get_cards()
+            self.assertEqual(load.call_count, 1)
+            self.assertEqual(self.holder.snapshot.version, 2)
+
+    def test_get_cards_returns_copies(self):
+        from core.services import db
+        from unittest.mock import patch
+
+        with patch.object(db, '_fetch_catalog_version', return_value=1), \
+             patch.object(db, '_load_catalog', side_effect=lambda: self._cards()):
+            cards = db.get_cards()
+            cards[0]['in_wallet'] = True
+            self.assertNotIn('in_wallet', db.get_cards()[0])
+            self.assertEqual(db.get_card_by_slug('amex-gold')['name'], 'Gold')
+
+class MatchScoreTest(TestCase):
+    def setUp(self):
+        from core.services.catalog import catalog_holder
+        catalog_holder.clear()
+        self.addCleanup(catalog_holder.clear)
+        self.personality = {'categories': ['Dining'], 'slots': []}
+
+    def _cards(self):
+        return [
+            {'id': 'dining-card', 'slug': 'dining-card', 'name': 'Dining Card', 'annual_fee': 0, 'is_active': True,
+             'benefits': [],
+             'earning_rates': [{'rate': 4, 'category': ['Dining']}, {'rate': 1, 'category': ['All Purchases']}]},
+            {'id': 'student-card', 'slug': 'student-card', 'name': 'Student Card', 'annual_fee': 95, 'is_active': True,
+             'benefits': [],
+             'earning_rates': [{'rate': 2, 'category': '["Travel"]'}]},
+        ]
+
+    def test_scores_match_four_dimension_formula(self):
+        from core.services import db
+
+        cards = self._cards()
+        scores = db.calculate_match_scores(self.personality, [], cards)
+        # 60 utility * .45 + 100 alignment * .35 + 0 SUB + 100 fee affinity * .05
+        self.assertAlmostEqual(scores['dining-card'], 67.0)
+
+        scores = db.calculate_match_scores(self.personality, [cards[1]], cards)
+        self.assertEqual(scores['student-card'], 0)
+        # Wallet avg fee 95 -> fee affinity 81
+        self.assertAlmostEqual(scores['dining-card'], 66.05)
+
+    def test_catalog_cards_use_snapshot_engine(self):
+        from core.services import db
+        from unittest.mock import patch
+
+        with patch.object(db, '_fetch_catalog_version', return_value=1), \
+             patch.object(db, '_load_catalog', side_effect=lambda: self._cards()):
+            cards = db.get_cards()
+            scores = db.calculate_match_scores(self.personality, [], cards)
+            snapshot = db.get_catalog_snapshot(build=False)
+            self.assertIn('match_score_engine', snapshot._derived)
+        self.assertEqual(scores, db.calculate_match_scores(self.personality, [], self._cards()))
+
+class MatchScoreCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from core.services.catalog import catalog_holder
+        catalog_holder.clear()
+        cache.delete('match_scores_uid1')
+        self.addCleanup(catalog_holder.clear)
+        self.addCleanup(cache.delete, 'match_scores_uid1')
+        self.personality = {'id': 'foodie', 'slug': 'foodie', 'categories': ['Dining'], 'slots': []}
+
+    _cards = MatchScoreTest._cards
+
+    def test_scores_cached_until_wallet_changes(self):
+        from core.services import db
+        from unittest.mock import patch
+
+        wallet = [{'id': 'student-card', 'card_id': 'student-card', 'status': 'active', 'annual_fee': 95}]
+        with patch.object(db, '_fetch_catalog_version', return_value=1), \
+             patch.object(db, '_load_catalog', side_effect=lambda: self._cards()), \
+             patch.object(db, 'get_user_cards', return_value=wallet) as get_user_cards, \
+             patch.object(db, 'get_user_assigned_personality', return_value=self.personality), \
+             patch.object(db, 'calculate_match_scores', wraps=db.calculate_match_scores) as calculate:
+            scores = db.get_user_match_scores('uid1')
+            self.assertEqual(scores['student-card'], 0)
+            self.assertEqual(db.get_user_match_scores('uid1'), scores)
+            self.assertEqual(db.get_user_match_scores('uid1', wallet, self.personality), scores)
+            self.assertEqual(calculate.call_count, 1)
+            self.assertEqual(get_user_cards.call_count, 1)
+
+            # A wallet the entry wasn't scored against is rescored
+            db.get_user_match_scores('uid1', [], self.personality)
+            self.assertEqual(calculate.call_count, 2)
+
+            db.invalidate_match_scores('uid1')
+            db.get_user_match_scores('uid1')
+            self.assertEqual(calculate.call_count, 3)
+
+    def test_unchecked_hits_expire_sooner(self):
+        import time
+        from core.services import db
+        from core.services.personalities import MATCH_SCORES_UNCHECKED_TTL
+        from unittest.mock import patch
+
+        wallet = [{'id': 'student-card', 'card_id': 'student-card', 'status': 'active', 'annual_fee': 95}]
+        now = time.time()
+        with patch.object(db, '_fetch_catalog_version', return_value=1), \
+             patch.object(db, '_load_catalog', side_effect=lambda: self._cards()), \
+             patch.object(db, 'get_user_cards', return_value=wallet) as get_user_cards, \
+             patch.object(db, 'get_user_assigned_personality', return_value=self.personality), \
+             patch.object(db, 'calculate_match_scores', wraps=db.calculate_match_scores) as calculate, \
+             patch('core.services.personalities.time.time', return_value=now):
+            db.get_user_match_scores('uid1', wallet, self.personality)
+            db.get_user_match_scores('uid1')
+            self.assertEqual((calculate.call_count, get_user_cards.call_count), (1, 0))
+
+        later = now + MATCH_SCORES_UNCHECKED_TTL + 1
+        with patch.object(db, '_fetch_catalog_version', return_value=1), \
+             patch.object(db, '_load_catalog', side_effect=lambda: self._cards()), \
+             patch.object(db, 'get_user_cards', return_value=wallet) as get_user_cards, \
+             patch.object(db, 'get_user_assigned_personality', return_value=self.personality), \
+             patch.object(db, 'calculate_match_scores', wraps=db.calculate_match_scores) as calculate, \
+             patch('core.services.personalities.time.time', return_value=later):
+            # Checked against the wallet, the entry still holds
+            db.get_user_match_scores('uid1', wallet, self.personality)
+            self.assertEqual(calculate.call_count, 0)
+            # Unchecked, it is too old to trust
+            db.get_user_match_scores('uid1')
+            self.assertEqual((calculate.call_count, get_user_cards.call_count), (1, 1))
+
+            # Wallet checked but personality not: trusted only while recent
+            db.get_user_match_scores('uid1', wallet)
+            self.assertEqual(calculate.call_count, 1)
+
+        with patch.object(db, '_fetch_catalog_version', return_value=1), \
+             patch.object(db, '_load_catalog', side_effect=lambda: self._cards()), \
+             patch.object(db, 'get_user_cards', return_value=wallet) as get_user_cards, \
+             patch.object(db, 'get_user_assigned_personality', return_value=self.personality) as get_personality, \
+             patch.object(db, 'calculate_match_scores', wraps=db.calculate_match_scores) as calculate, \
+             patch('core.services.personalities.time.time', return_value=later + MATCH_SCORES_UNCHECKED_TTL + 1):
+            db.get_user_match_scores('uid1', wallet)
+            self.assertEqual((calculate.call_count, get_personality.call_count, get_user_cards.call_count), (1, 1, 0))
+
+class BenefitPeriodTest(TestCase):
+    def _engine(self):
+        from datetime import datetime
+        from core.services.benefit_periods import BenefitPeriodEngine
+        return BenefitPeriodEngine(now=datetime(2026, 5, 10, 12, 0))
+
+    def _card(self):
+        return {'id': 'gold', 'benefits': [
+            {'id': 'dining', 'benefit_type': 'Credit', 'description': 'Dining', 'dollar_value': 120, 'time_category': 'Monthly'},
+            {'id': 'travel', 'benefit_type': 'Credit', 'description': 'Travel', 'dollar_value': 300, 'time_category': 'Annually (anniversary year)'},
+            {'id': 'lounge', 'benefit_type': 'Lounge', 'description': 'Lounge', 'dollar_value': 50},
+            {'id': 'insurance', 'benefit_type': 'Credit', 'description': 'No value'},
+        ]}
+
+    def test_current_period_limit_and_usage(self):
+        user_card = {'anniversary_date': '2024-08-15', 'benefit_usage': {
+            'dining': {'periods': {'2026_05': {'used': 4}, '2026_04': {'used': 10}}},
+            'travel': {'periods': {'2025': {'used': 100}}},
+        }}
+        dining, travel = self._engine().card_benefits(self._card(), user_card)
+
+        self.assertEqual(dining['period_key'], '2026_05')
+        self.assertEqual((dining['limit'], dining['used'], dining['remaining']), (10.0, 4, 6.0))
+        self.assertEqual(dining['status'], 'partial')
+        self.assertEqual(len(dining['periods']), 12)
+        self.assertEqual(dining['ytd_used'], 14)
+        self.assertEqual(dining['days_until_expiration'], 21)
+
+        # Anniversary year started Aug 15, 2025
+        self.assertEqual(travel['period_key'], '2025')
+        self.assertEqual(travel['remaining'], 200)
+        self.assertEqual(travel['periods'][0]['reset_date'], 'Aug 15, 2026')
+
+    def test_default_anniversary_and_stale_ignore(self):
+        from datetime import datetime
+        user_card = {'anniversary_date': 'default', 'benefit_usage': {
+            'travel': {'is_ignored': True, 'last_updated': datetime(2025, 12, 1)},
+        }}
+        results = self._engine().card_benefits(self._card(), user_card, include_periods=False)
+        travel = results[1]
+        self.assertEqual(travel['period_key'], '2026')
+        # Ignored during the previous anniversary year, so it no longer applies
+        self.assertFalse(travel['is_ignored'])
+        self.assertEqual(len(self._engine().card_benefits(self._card(), user_card, tracked_only=False)), 3)
+
+
+class BenefitPeriodLegacyUsageTest(TestCase):
+    """The engine against the pre-engine dashboard and reminder formulas."""
+
+    DIVISORS = {'Monthly': 12, 'Quarterly': 4, 'Semi-annually': 2}
+    CATEGORIES = ['Monthly', 'Quarterly', 'Semi-annually', 'Annually (calendar year)',
+                  'Annually (anniversary year)', 'Every 4 years']
+    USAGES = [
+        {},
+        {'used': 75, 'is_full': False},
+        {'used': 500, 'is_full': True},
+        {'periods': {}},
+        {'used': 75, 'periods': {}},
+    ]
+
+    @classmethod
+    def _dashboard(cls, category, benefit, key, usage):
+        divisor = cls.DIVISORS.get(category)
+        dv = benefit['dollar_value']
+        limit = benefit.get('period_values', {}).get(key, dv / divisor) if divisor else dv
+        data = usage.get('periods', {}).get(key, {})
+        return limit, data.get('used', 0), data.get('is_full', False)
+
+    @classmethod
+    def _reminder(cls, category, benefit, key, usage):
+        divisor = cls.DIVISORS.get(category)
+        dv = benefit['dollar_value']
+        limit = benefit.get('period_values', {}).get(key, dv / divisor if divisor else dv)
+        data = usage['periods'].get(key, {}) if 'periods' in usage else usage
+        return limit, data.get('used', 0), data.get('is_full', False)
+
+    def _check(self, reminders, reference):
+        from datetime import datetime
+        from core.services.benefit_periods import BenefitPeriodEngine
+        engine = BenefitPeriodEngine(now=datetime(2026, 5, 10, 12, 0), reminders=reminders)
+        for category in self.CATEGORIES:
+            for usage in self.USAGES:
+                for overrides in (False, True):
+                    benefit = {'id': 'credit', 'benefit_type': 'Credit', 'dollar_value': 240,
+                               'time_category': category}
+                    user_card = {'anniversary_date': '2024-08-15', 'benefit_usage': {'credit': usage}}
+                    key = engine.card_benefits({'benefits': [benefit]}, user_card)[0]['period_key']
+                    if overrides:
+                        benefit['period_values'] = {key: 50}
+                    with self.subTest(category=category, usage=usage, overrides=overrides):
+                        result = engine.card_benefits({'benefits': [benefit]}, user_card)[0]
+                        self.assertEqual((result['limit'], result['used'], result['is_full']),
+                                         reference(category, benefit, key, usage))
+                        current = next(p for p in result['periods'] if p['is_current'])
+                        self.assertEqual(current['max_value'], result['limit'])
+
+    def test_wallet_pages_match_dashboard(self):
+        self._check(False, self._dashboard)
+
+    def test_reminders_match_reminder_job(self):
+        self._check(True, self._reminder)
+
+    def test_flat_usage_not_shown_on_wallet_pages(self):
+        from datetime import datetime
+        from core.services.benefit_periods import BenefitPeriodEngine
+        benefit = {'id': 'dining', 'benefit_type': 'Credit', 'dollar_value': 120, 'time_category': 'Monthly'}
+        user_card = {'benefit_usage': {'dining': {'used': 90}}}
+        result = BenefitPeriodEngine(now=datetime(2026, 5, 10)).card_benefits({'benefits': [benefit]}, user_card)[0]
+        self.assertEqual((result['used'], result['ytd_used'], result['status']), (0, 0, 'empty'))
+
+
+class BulkSyncWriterTest(TestCase):
+    def _client(self, manifest=None):
+        from unittest.mock import MagicMock
+        client = MagicMock()
+        snap = MagicMock(exists=manifest is not None, id='programs')
+        snap.to_dict.return_value = {'hashes': manifest or {}}
+        client.get_all.return_value = [snap]
+        client.collection.return_value.document.side_effect = lambda doc_id: doc_id
+        return client
+
+    def test_content_hash_ignores_key_order(self):
+        from core.services.bulk_writer import content_hash
+        self.assertEqual(content_hash({'a': 1, 'b': [1, 2]}), content_hash({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(content_hash({'a': 1}), content_hash({'a': 2}))
+
+    def test_sync_writes_only_changed_docs_and_prunes(self):
+        from core.services.bulk_writer import BulkSyncWriter, content_hash
+        manifest = {'same': content_hash({'v': 1}), 'edited': content_hash({'v': 1}), 'gone': 'x'}
+        client = self._client(manifest)
+        with BulkSyncWriter(client, max_workers=2) as writer:
+            counts = writer.sync('programs', {'same': {'v': 1}, 'edited': {'v': 2}, 'new': {'v': 3}}, prune=True)
+
+        self.assertEqual(counts, {'written': 2, 'skipped': 1, 'deleted': 1})
+        batch = client.batch.return_value
+        self.assertEqual(sorted(c.args[0] for c in batch.set.call_args_list if c.args[0] != 'programs'), ['edited', 'new'])
+        batch.delete.assert_called_once_with('gone')
+        # Manifest now reflects what was committed
+        saved = [c.args[1] for c in batch.set.call_args_list if c.args[0] == 'programs'][0]
+        self.assertEqual(set(saved['hashes']), {'same', 'edited', 'new'})
+        self.assertEqual(saved['hashes']['edited'], content_hash({'v': 2}))
+
+
+class GrokClientRetryTest(TestCase):
+    def _response(self, status, body=None, headers=None):
+        from unittest.mock import MagicMock
+        response = MagicMock(status_code=status, ok=status < 400, headers=headers or {}, text='')
+        response.json.return_value = body or {}
+        if status >= 400:
+            import requests
+            response.raise_for_status.side_effect = requests.HTTPError(str(status))
+        return response
+
+    def test_retries_rate_limited_and_server_errors(self):
+        from unittest.mock import MagicMock, patch
+        from core.card_pipeline.grok_client import GrokClient, RateLimiter
+        body = {
+            'usage': {'input_tokens': 100, 'output_tokens': 50},
+            'output': [{'type': 'message', 'content': [{'type': 'output_text', 'text': '{"ok": true}'}]}],
+        }
+        session = MagicMock()
+        session.post.side_effect = [
+            self._response(429, headers={'Retry-After': '3'}),
+            self._response(503),
+            self._response(200, body),
+        ]
+        client = GrokClient('key', session=session, rate_limiter=RateLimiter(600, 100000), timeout=12)
+        with patch('core.card_pipeline.grok_client.time.sleep') as sleep:
+            result = client.call_with_usage('prompt')
+
+        self.assertEqual(result.data, {'ok': True})
+        self.assertEqual(result.usage.total_tokens, 150)
+        self.assertEqual(session.post.call_count, 3)
+        self.assertEqual(session.post.call_args.kwargs['timeout'], 12)
+        # Retry-After is honoured over a shorter jittered backoff
+        self.assertGreaterEqual(sleep.call_args_list[0].args[0], 3)
+
+    def test_gives_up_after_max_retries(self):
+        from unittest.mock import MagicMock, patch
+        from core.card_pipeline.grok_client import GrokClient
+        session = MagicMock()
+        session.post.return_value = self._response(500)
+        client = GrokClient('key', session=session, max_retries=2)
+        with patch('core.card_pipeline.grok_client.time.sleep'):
+            result = client.call_with_usage('prompt')
+        self.assertIsNone(result.data)
+        self.assertEqual(session.post.call_count, 3)
+
+    def test_token_bucket_waits_when_empty(self):
+        from core.card_pipeline.grok_client import TokenBucket
+        bucket = TokenBucket(60)  # one per second
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertAlmostEqual(bucket.reserve(2), 2.0, delta=0.1)
+
+
+class GrokResponseCacheTest(TestCase):
+    def _client(self, cache, **kwargs):
+        from unittest.mock import MagicMock
+        from core.card_pipeline.grok_client import GrokClient
+        response = MagicMock(status_code=200, ok=True)
+        response.json.return_value = {
+            'usage': {'input_tokens': 10, 'output_tokens': 5},
+            'output': [{'type': 'message', 'content': [{'type': 'output_text', 'text': '{"n": 1}'}]}],
+        }
+        session = MagicMock()
+        session.post.return_value = response
+        return GrokClient('key', session=session, cache=cache, **kwargs), session
+
+    def test_replays_cached_response_and_counts_hits(self):
+        import tempfile
+        from core.card_pipeline.grok_client import ResponseCache
+        with tempfile.TemporaryDirectory() as tmp:
+            client, session = self._client(ResponseCache(tmp))
+            first = client.call_with_usage('prompt')
+            second = client.call_with_usage('prompt')
+            bypass = client.call_with_usage('prompt', use_cache=False)
+
+            self.assertEqual((first.usage.cache_misses, first.usage.total_tokens), (1, 15))
+            self.assertEqual(second.data, {'n': 1})
+            self.assertEqual((second.usage.cache_hits, second.usage.total_tokens), (1, 0))
+            self.assertEqual(bypass.usage.cache_hits, 0)
+            self.assertEqual(session.post.call_count, 2)
+
+            # Offline replays hits and never calls the API on a miss
+            offline, offline_session = self._client(ResponseCache(tmp), offline=True)
+            self.assertEqual(offline.call('prompt'), {'n': 1})
+            self.assertIsNone(offline.call('other prompt'))
+            offline_session.post.assert_not_called()
+
+    def test_ttl_and_lru_eviction(self):
+        import os, tempfile, time
+        from core.card_pipeline.grok_client import ResponseCache
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(tmp, ttl=60)
+            cache.set('old', {'v': 1})
+            self.assertEqual(cache.get('old'), {'v': 1})
+            with open(os.path.join(tmp, 'old.json'), 'w') as f:
+                f.write('{"created": %f, "response": {"v": 1}}' % (time.time() - 120))
+            self.assertIsNone(cache.get('old'))
+
+            cache = ResponseCache(tmp, ttl=None, max_bytes=200)
+            cache.set('a', {'v': 'x' * 40})
+            cache.set('b', {'v': 'y' * 40})
+            os.utime(os.path.join(tmp, 'b.json'), (time.time() - 100, time.time() - 100))
+            cache.get('a')
+            cache.set('c', {'v': 'z' * 40})
+            self.assertIsNone(cache.get('b'))
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('c'))
+
+
+class HotelPriceSummaryTest(TestCase):
+    def _snap(self, hotel_key, collection, data):
+        from unittest.mock import MagicMock
+        snap = MagicMock(exists=True)
+        snap.reference.parent.id = collection
+        snap.reference.parent.parent.id = hotel_key
+        snap.to_dict.return_value = data
+        return snap
+
+    def test_summaries_merge_rollups_and_legacy_nights_in_one_round_trip(self):
+        from unittest.mock import MagicMock, patch
+        from core.services import db
+        client = MagicMock()
+        client.get_all.return_value = [
+            self._snap('a', 'rate_months', {'nights': {'2026-03-01': {
+                'count': 2, 'sum': 300, 'min': 140, 'max': 160,
+                'latest_rate': 160, 'latest_observed_at': '2026-02-10T00:00:00'}}}),
+            self._snap('a', 'daily_rates', {'observations': [
+                {'rate': 100, 'observed_at': '2026-01-01T00:00:00'},
+                {'rate': 120, 'observed_at': '2026-01-02T00:00:00'}]}),
+            self._snap('b', 'daily_rates', {'observations': [{'rate': 90, 'observed_at': '2026-01-01T00:00:00'}]}),
+            MagicMock(exists=False),
+        ]
+        with patch.object(db, '_db', client):
+            summaries = db.get_hotel_price_summaries(['a', 'b', 'c', 'a'], '2026-03-01')
+
+        client.get_all.assert_called_once()
+        # Rollup + legacy document per hotel
+        self.assertEqual(len(client.get_all.call_args.args[0]), 6)
+        self.assertEqual(set(summaries), {'a', 'b'})
+        self.assertEqual(summaries['a']['prior_count'], 4)
+        self.assertEqual(summaries['a']['prior_avg'], 130)
+        self.assertEqual((summaries['a']['prior_min'], summaries['a']['prior_max']), (100, 160))
+        self.assertEqual(summaries['a']['last_rate'], 160)
+        self.assertEqual(summaries['b']['last_rate'], 90)
+
+    def test_daily_rates_write_one_rollup_per_month(self):
+        from unittest.mock import MagicMock, patch
+        from core.services import db
+        client = MagicMock()
+        with patch.object(db, '_db', client):
+            db.save_hotel_daily_rates(
+                [{'name': 'Park Hyatt', 'rate_per_night': 500}, {'name': 'No Rate'}],
+                '2026-03-30', '2026-04-02', 'Tokyo',
+            )
+
+        batch = client.batch.return_value
+        batch.commit.assert_called_once()
+        rollups = [c.args[1] for c in batch.set.call_args_list if 'nights' in c.args[1]]
+        # Profile + March + April for a three-night stay
+        self.assertEqual(batch.set.call_count, 3)
+        self.assertEqual([r['month'] for r in rollups], ['2026-03', '2026-04'])
+        self.assertEqual(sorted(rollups[0]['nights']), ['2026-03-30', '2026-03-31'])
+        self.assertEqual(rollups[1]['nights']['2026-04-01']['latest_rate'], 500)
+
+
+class JobQueueTest(TestCase):
+    def _client(self, job):
+        from unittest.mock import MagicMock
+        client = MagicMock()
+        snapshot = MagicMock(exists=True)
+        snapshot.to_dict.return_value = job
+        doc_ref = client.collection.return_value.document.return_value
+        doc_ref.get.return_value = snapshot
+        return client, doc_ref
+
+    def test_claimable_jobs(self):
+        from datetime import datetime, timedelta, timezone
+        from core.services.jobs import is_claimable
+        now = datetime.now(timezone.utc)
+        self.assertTrue(is_claimable({'status': 'queued', 'run_after': now}, now))
+        self.assertFalse(is_claimable({'status': 'queued', 'run_after': now + timedelta(seconds=5)}, now))
+        # A running job is only taken over once its worker's lease lapses
+        self.assertFalse(is_claimable({'status': 'running', 'lease_expires_at': now + timedelta(minutes=1)}, now))
+        self.assertTrue(is_claimable({'status': 'running', 'lease_expires_at': now - timedelta(seconds=1)}, now))
+        self.assertFalse(is_claimable({'status': 'succeeded'}, now))
+
+    def test_failed_attempt_is_requeued_with_backoff_then_fails_for_good(self):
+        from unittest.mock import MagicMock, patch
+        from core.services import db
+        handler = MagicMock(side_effect=RuntimeError('grok down'))
+        for attempts, expected in ((0, 'queued'), (2, 'failed')):
+            client, doc_ref = self._client({'type': 'strategy_analysis', 'payload': {'uid': 'u'},
+                                            'status': 'queued', 'attempts': attempts, 'max_attempts': 3})
+            with patch.object(db, '_db', client), \
+                    patch('core.services.jobs.firestore.transactional', lambda fn: fn), \
+                    patch.object(type(db), '_job_handler', return_value=handler):
+                self.assertEqual(db.run_job('job1'), expected)
+
+            claim = client.transaction.return_value.update.call_args.args[1]
+            self.assertEqual((claim['status'], claim['attempts']), ('running', attempts + 1))
+            final = doc_ref.update.call_args.args[0]
+            self.assertEqual(final['status'], expected)
+            self.assertEqual(final['last_error'], 'grok down')
+            if expected == 'queued':
+                self.assertGreater(final['run_after'], claim['started_at'])
+        self.assertTrue(handler.call_args.args[1]['is_last_attempt'])
+
+    def test_due_jobs_are_found_behind_backed_off_ones(self):
+        from datetime import datetime, timedelta, timezone
+        from unittest.mock import MagicMock, patch
+        from core.services import db
+        now = datetime.now(timezone.utc)
+        later = now + timedelta(minutes=30)
+        jobs = [(f'backoff{i:03d}', {'status': 'queued', 'run_after': later}) for i in range(10)]
+        jobs += [('due1', {'status': 'queued', 'run_after': now}), ('due2', {'status': 'queued', 'run_after': now})]
+        jobs += [('lapsed', {'status': 'running', 'lease_expires_at': now - timedelta(seconds=1)})]
+
+        class Query:
+            def __init__(self, status, size=None, after=None):
+                self.status, self.size, self.after = status, size, after
+
+            def limit(self, size):
+                return Query(self.status, size, self.after)
+
+            def start_after(self, snap):
+                return Query(self.status, self.size, snap.id)
+
+            def stream(self):
+                rows = [(i, j) for i, j in jobs if j['status'] == self.status and (self.after is None or i > self.after)]
+                return [MagicMock(id=i, to_dict=MagicMock(return_value=j)) for i, j in rows[:self.size]]
+
+        client = MagicMock()
+        client.collection.return_value.where.side_effect = lambda filter: Query(filter.value)
+        with patch.object(db, '_db', client):
+            self.assertEqual(db.get_due_job_ids(limit=2), ['due1', 'due2'])
+            self.assertEqual(db.get_due_job_ids(limit=3), ['due1', 'due2', 'lapsed'])
+
+
+class BlogListingCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_listing_leaves_out_bodies_and_serves_stale_while_refreshing(self):
+        import time
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from core.services import db
+        posts = [{'id': 'p1', 'slug': 'p1', 'title': 'Amex Gold review', 'content': 'long body ' * 100}]
+        with patch.object(type(db), '_fetch_blogs', return_value=posts) as fetch:
+            listing = db.get_blogs(status='published')
+            self.assertNotIn('content', listing[0])
+            self.assertTrue(listing[0]['excerpt'].startswith('long body'))
+            self.assertEqual(db.get_published_blog_bodies(), {'p1': 'long body ' * 100})
+            db.get_blogs(status='published')
+            self.assertEqual(fetch.call_count, 1)
+
+            # Stale: the old listing is returned at once, a rebuild runs behind it
+            with self.settings(BLOG_LISTING_FRESH_SECONDS=0):
+                fetch.return_value = posts + [{'id': 'p2', 'slug': 'p2', 'title': 'New', 'content': ''}]
+                self.assertEqual(len(db.get_blogs(status='published')), 1)
+                for _ in range(50):
+                    if len(cache.get('blog_listing')['blogs']) == 2:
+                        break
+                    time.sleep(0.01)
+            self.assertEqual(len(db.get_blogs(status='published')), 2)
+
+    def test_invalidation_drops_exact_keys(self):
+        from django.core.cache import cache
+        from core.services import db
+        cache.set('blog_slug_p1', {'id': 'p1'})
+        cache.set('blog_slug_other', {'id': 'other'})
+        cache.set('blog_trending_and_contributors', {'trending': []})
+        db.invalidate_blog_caches('p1')
+        self.assertIsNone(cache.get('blog_slug_p1'))
+        self.assertIsNone(cache.get('blog_trending_and_contributors'))
+        self.assertIsNotNone(cache.get('blog_slug_other'))
+
+    def test_derived_caches_built_during_a_rebuild_are_dropped(self):
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from core.services import db
+        posts = [{'id': 'p1', 'slug': 'p1', 'title': 'Old post', 'content': ''}]
+        with patch.object(type(db), '_fetch_blogs', return_value=posts), \
+                patch.object(type(db), '_refresh_blog_listing_async'):
+            db.get_blogs(status='published')
+            db.invalidate_blog_caches('p1')
+            # A homepage request in the window caches from the old listing...
+            cache.set('home_latest_blog_posts', db.get_blogs(status='published'))
+            cache.set('blog_trending_and_contributors', {'trending': posts})
+            # ...until the rebuild behind the write finishes
+            posts.clear()
+            db._rebuild_blog_listing()
+        self.assertIsNone(cache.get('home_latest_blog_posts'))
+        self.assertIsNone(cache.get('blog_trending_and_contributors'))
+        self.assertEqual(cache.get('blog_listing')['blogs'], [])
+
+
+class BlogSearchIndexTest(TestCase):
+    posts = [
+        {'id': 'review', 'title': 'Chase Sapphire Reserve review', 'tags': "['review', 'chase']", 'excerpt': ''},
+        {'id': 'mention', 'title': 'Lounge access guide', 'tags': ['guide'], 'excerpt': 'Airport lounges'},
+        {'id': 'other', 'title': 'Amex Platinum perks', 'tags': [], 'excerpt': 'Credits'},
+    ]
+    bodies = {'review': 'The sapphire card.', 'mention': 'You can also get in with a Chase Sapphire card.', 'other': 'Amex.'}
+
+    def test_ranked_and_prefix_search(self):
+        from core.services.blog_search import BlogSearchIndex
+        index = BlogSearchIndex()
+        index.sync(self.posts, self.bodies)
+
+        # Title/tag matches outrank a passing mention in the body
+        self.assertEqual(index.search('chase sapphire'), ['review', 'mention'])
+        # Every term must match; the last one may be a prefix for typeahead
+        self.assertEqual(index.search('chase plat'), [])
+        self.assertEqual(index.search('plat'), ['other'])
+        self.assertEqual(index.search('plat '), [])
+
+    def test_sync_is_incremental(self):
+        from core.services.blog_search import BlogSearchIndex
+        index = BlogSearchIndex()
+        index.sync(self.posts, self.bodies, token='v1')
+        signatures = dict(index.signatures)
+
+        edited = [dict(self.posts[0], title='Hyatt transfer guide')] + self.posts[1:2]
+        index.sync(edited, self.bodies, token='v2')
+        self.assertEqual(index.search('hyatt'), ['review'])
+        self.assertEqual(index.search('amex'), [])
+        self.assertEqual(index.signatures['mention'], signatures['mention'])
+        self.assertEqual(len(index), 2)
+
+
+class BlogFacetIndexTest(TestCase):
+    posts = [
+        {'id': 'a', 'tags': "['guide', 'tips']", 'vendor': 'Chase', 'read_time': 'short'},
+        {'id': 'b', 'tags': ['review'], 'vendor': 'Amex', 'read_time': 'long', 'is_premium': True},
+        {'id': 'c', 'tags': 'Guide', 'vendor': 'Amex', 'read_time': 'short'},
+    ]
+
+    def test_select_ors_within_and_ands_across_facets(self):
+        from core.services.blog_facets import BlogFacetIndex
+        index = BlogFacetIndex(self.posts)
+        self.assertEqual(index.select({}), [0, 1, 2])
+        self.assertEqual(index.select({'tag': ['guide', 'review']}), [0, 1, 2])
+        self.assertEqual(index.select({'tag': ['guide'], 'vendor': ['Amex']}), [2])
+        self.assertEqual(index.select({'premium': [True], 'read_time': ['short']}), [])
+        self.assertEqual(index.values('tag'), ['guide', 'review', 'tips'])
+
+    def test_counts_ignore_the_facets_own_selection(self):
+        from core.services.blog_facets import BlogFacetIndex
+        index = BlogFacetIndex(self.posts)
+        counts = index.counts({'vendor': ['Chase'], 'read_time': ['short']})
+        self.assertEqual(counts['vendor'], {'Chase': 1, 'Amex': 1})
+        self.assertEqual(counts['read_time'], {'short': 1, 'long': 0})
+        self.assertEqual(counts['tag']['guide'], 1)
+        # Restricted to search hits
+        within = index.mask_for_ids(['c'])
+        self.assertEqual(index.counts({}, within=within)['vendor'], {'Chase': 0, 'Amex': 1})
+
+
+class BufferedViewCounterTest(TestCase):
+    def test_views_are_buffered_and_flushed_as_one_increment_per_post(self):
+        from core.services.counters import BufferedCounter
+        flushed = []
+        counter = BufferedCounter(flushed.append, interval=3600, threshold=1000)
+        for _ in range(5):
+            counter.add('a')
+        counter.add('b', 2)
+        self.assertEqual(flushed, [])
+        self.assertEqual(counter.flush(), 7)
+        self.assertEqual(flushed, [{'a': 5, 'b': 2}])
+        self.assertEqual(counter.flush(), 0)
+        counter.close()
+
+    def test_flush_falls_back_to_single_updates_when_a_batch_fails(self):
+        from unittest.mock import MagicMock
+        from core.services.counters import flush_increments
+        client = MagicMock()
+        client.batch.return_value.commit.side_effect = Exception('NOT_FOUND')
+        docs = client.collection.return_value.document
+        flush_increments(client, 'blogs', 'view_count', {'a': 3, 'b': 1})
+        self.assertEqual(client.batch.return_value.update.call_count, 2)
+        self.assertEqual(docs.return_value.update.call_count, 2)
+        self.assertEqual(docs.return_value.update.call_args_list[0].args[0]['view_count'].value, 3)
+
+
+class RelatedPostsTest(TestCase):
+    def test_neighbours_ranked_by_shared_tags_vendor_and_words(self):
+        from core.services.blog_related import compute_related_posts
+        posts = [
+            {'id': 'new', 'title': 'Weekend news roundup', 'tags': ['news']},
+            {'id': 'csr', 'title': 'Sapphire Reserve lounge access', 'tags': ['lounges'], 'vendor': 'Chase'},
+            {'id': 'amex', 'title': 'Platinum lounge access', 'tags': ['lounges'], 'vendor': 'Amex'},
+            {'id': 'csp', 'title': 'Sapphire Preferred transfer partners', 'tags': ['points'], 'vendor': 'Chase'},
+        ]
+        bodies = {'csr': 'Priority Pass lounges with the Sapphire card.', 'amex': 'Centurion lounges.'}
+        related = compute_related_posts(posts, bodies, k=2)
+
+        self.assertEqual(related['csr'], ['amex', 'csp'])
+        self.assertEqual(related['csp'], ['csr', 'new'])
+        # Nothing in common: newest other posts
+        self.assertEqual(related['new'], ['csr', 'amex'])
+
+    def test_get_related_blogs_reads_the_cached_listing(self):
+        import time
+        from django.core.cache import cache
+        from core.services import db
+        from core.services.blogs import BLOG_LISTING_CACHE_KEY
+        entry = {
+            'token': 't', 'built_at': time.time(), 'facets': None,
+            'blogs': [{'id': 'a', 'slug': 'a'}, {'id': 'b', 'slug': 'b'}, {'id': 'c', 'slug': 'c'}],
+            'related': {'a': ['c', 'b']},
+        }
+        cache.set(BLOG_LISTING_CACHE_KEY, entry)
+        try:
+            self.assertEqual([b['id'] for b in db.get_related_blogs('a')], ['c', 'b'])
+            self.assertEqual([b['id'] for b in db.get_related_blogs('draft')], ['a', 'b', 'c'])
+        finally:
+            cache.delete(BLOG_LISTING_CACHE_KEY)
+
+
+class CommentSummaryTest(TestCase):
+    def _comments(self):
+        from datetime import datetime, timedelta
+        start = datetime(2026, 1, 1)
+        rows = [('a', None, None), ('b', None, None), ('a1', 'a', 'a'), ('a2', 'a1', 'a'), ('c', None, None), ('a3', 'a', 'a')]
+        return [
+            {'id': cid, 'parent_id': parent, 'root_id': root, 'created_at': start + timedelta(minutes=i)}
+            for i, (cid, parent, root) in enumerate(rows)
+        ]
+
+    def test_incremental_summary_matches_a_rebuild(self):
+        from core.services.blogs import add_to_comment_summary, build_comment_summary
+        comments = self._comments()
+        summary = build_comment_summary([], page_size=2, inline_replies=2)
+        for c in comments:
+            summary = add_to_comment_summary(summary, c['id'], c['root_id'], page_size=2, inline_replies=2)
+
+        expected = build_comment_summary(comments, page_size=2, inline_replies=2)
+        self.assertEqual(summary, expected)
+        self.assertEqual(expected['top_level_ids'], ['c', 'b'])
+        self.assertTrue(expected['has_more'])
+        self.assertEqual(expected['count'], 6)
+
+        # Thread 'a' as the newest page: replies newest first, capped
+        summary = build_comment_summary(comments, page_size=3, inline_replies=2)
+        self.assertEqual(summary['reply_ids']['a'], ['a3', 'a2'])
+        self.assertEqual(summary['reply_counts']['a'], 3)
+
+    def test_threads_nest_replies_and_report_unloaded_ones(self):
+        from core.services.blogs import build_comment_threads
+        comments = {c['id']: c for c in self._comments()}
+        threads = build_comment_threads(
+            [comments['a']], [comments['a3'], comments['a2']], reply_counts={'a': 3}
+        )
+        thread = threads[0]
+        # a2's parent (a1) was not loaded, so it hangs off the thread root
+        self.assertEqual([r['id'] for r in thread['replies']], ['a3', 'a2'])
+        self.assertEqual((thread['reply_count'], thread['more_replies']), (3, 1))
+
+        full = build_comment_threads([comments['a']], [comments['a1'], comments['a2'], comments['a3']])[0]
+        self.assertEqual([r['id'] for r in full['replies']], ['a3', 'a1'])
+        self.assertEqual([r['id'] for r in full['replies'][1]['replies']], ['a2'])
+        self.assertEqual(full['more_replies'], 0)
+
+    def test_rebuild_repeats_when_a_comment_slips_in(self):
+        from unittest.mock import MagicMock, patch
+        from core.services import db
+        comments = self._comments()
+
+        def docs(rows):
+            return [MagicMock(id=c['id'], to_dict=MagicMock(return_value=dict(c))) for c in rows]
+
+        comments_ref = MagicMock()
+        # 'a3' is added after the first stream, while its summary was still missing
+        comments_ref.stream.side_effect = [docs(comments[:5]), docs(comments)]
+        comments_ref.count.return_value.get.return_value = [[MagicMock(value=6)]]
+        summary_ref = MagicMock()
+        with patch.object(db, '_db', MagicMock()), \
+             patch.object(db, '_comments_ref', return_value=comments_ref), \
+             patch.object(db, '_comment_summary_ref', return_value=summary_ref):
+            summary = db.rebuild_comment_summary('post')
+        self.assertEqual(summary['count'], 6)
+        self.assertEqual([call.args[0]['count'] for call in summary_ref.set.call_args_list], [5, 6])
+        summary_ref.delete.assert_not_called()
+
+        # Never settles: no summary is left behind
+        comments_ref.stream.side_effect = lambda: docs(comments[:5])
+        summary_ref.reset_mock()
+        with patch.object(db, '_db', MagicMock()), \
+             patch.object(db, '_comments_ref', return_value=comments_ref), \
+             patch.object(db, '_comment_summary_ref', return_value=summary_ref):
+            db.rebuild_comment_summary('post')
+        summary_ref.delete.assert_called_once()
+
+
+class UserProfileCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def _client(self, users):
+        from unittest.mock import MagicMock
+        client = MagicMock()
+        client.collection.return_value.document.side_effect = lambda uid: MagicMock(id=uid)
+
+        def get_all(refs):
+            for ref in refs:
+                uid = ref.id
+                snap = MagicMock(id=uid, exists=uid in users)
+                snap.to_dict.return_value = dict(users.get(uid, {}))
+                yield snap
+
+        client.get_all.side_effect = get_all
+        return client
+
+    def test_profiles_are_batched_projected_and_cached(self):
+        from unittest.mock import patch
+        from core.services import db
+        client = self._client({'u1': {'username': 'amy', 'email': 'amy@example.com'}, 'u2': {'username': 'bo'}})
+        with patch.object(db, '_db', client):
+            users = db.get_users_by_ids(['u1', 'u2', 'u1', 'ghost'])
+            self.assertEqual(users, {'u1': {'username': 'amy'}, 'u2': {'username': 'bo'}})
+            self.assertEqual(client.get_all.call_count, 1)
+
+            # Hits (and the unknown uid) come from cache
+            self.assertEqual(db.get_users_by_ids(['u2', 'ghost']), {'u2': {'username': 'bo'}})
+            self.assertEqual(client.get_all.call_count, 1)
+
+            db.update_user_avatar('u2', '/static/a.png')
+            db.get_users_by_ids(['u1', 'u2'])
+            self.assertEqual(client.get_all.call_count, 2)
+            self.assertEqual([ref.id for ref in client.get_all.call_args.args[0]], ['u2'])
+
+    def test_author_cache_does_not_clobber_the_middleware_profile(self):
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from core.services import db
+        cache.set('user_profile_u1', {'username': 'amy', 'is_super_staff': True})
+        client = self._client({'u1': {'username': 'amy', 'is_super_staff': True}})
+        with patch.object(db, '_db', client):
+            db.get_users_by_ids(['u1'])
+            self.assertTrue(cache.get('user_profile_u1')['is_super_staff'])
+            db.update_user_name('u1', 'Amy', 'Lee')
+        self.assertIsNone(cache.get('user_profile_u1'))
+
+
+class RequestScopeTest(TestCase):
+    def _client(self):
+        from unittest.mock import MagicMock
+        client = MagicMock()
+        snapshot = MagicMock(exists=True, id='u1')
+        snapshot.to_dict.return_value = {'subscription_status': 'active', 'is_editor': True}
+        client.collection.return_value.document.return_value.get.return_value = snapshot
+        return client
+
+    def test_documents_are_read_once_per_request(self):
+        from unittest.mock import patch
+        from core.services import db
+        from core.services.request_scope import request_scope
+        client = self._client()
+        doc_get = client.collection.return_value.document.return_value.get
+        with patch.object(db, '_db', client):
+            with request_scope() as scope:
+                profile = db.get_user_profile('u1')
+                profile['is_editor'] = False
+                self.assertTrue(db.is_premium('u1'))
+                self.assertTrue(db.can_manage_blogs('u1'))
+                self.assertEqual(doc_get.call_count, 1)
+                self.assertEqual((scope.reads, scope.hits), (1, 2))
+
+                # A write drops the shared copy
+                db.update_document('users', 'u1', {'is_editor': False})
+                db.get_user_profile('u1')
+                self.assertEqual(doc_get.call_count, 2)
+
+            # Outside a request, and in requests that may write, nothing is shared
+            db.get_user_profile('u1')
+            with request_scope(share_documents=False) as scope:
+                db.get_user_profile('u1')
+                db.get_user_profile('u1')
+            self.assertEqual(doc_get.call_count, 5)
+            self.assertEqual(scope.reads, 2)
+
+    def test_user_document_writers_drop_the_shared_copy(self):
+        from unittest.mock import patch
+        from core.services import db
+        from core.services.request_scope import request_scope
+        client = self._client()
+        writers = [
+            lambda: db.set_super_staff('u1', True),
+            lambda: db.set_editor('u1', False),
+            lambda: db.update_user_email('u1', 'new@example.com'),
+            lambda: db.update_user_personality('u1', 'foodie'),
+            lambda: db.remove_user_personality('u1'),
+            lambda: db.save_personality_survey('u1', 'foodie', {}, []),
+        ]
+        client.collection.return_value.add.return_value = (None, client.collection.return_value.document.return_value)
+        with patch.object(db, '_db', client), request_scope() as scope:
+            for i, write in enumerate(writers):
+                with self.subTest(writer=i):
+                    db.get_user_profile('u1')
+                    self.assertIn('users/u1', scope.documents)
+                    write()
+                    self.assertNotIn('users/u1', scope.documents)
+
+    def test_user_cards_are_read_once_per_request(self):
+        from unittest.mock import MagicMock, patch
+        from core.services import db
+        from core.services.request_scope import request_scope
+        client = MagicMock()
+        cards = client.collection.return_value.document.return_value.collection.return_value
+        cards.where.return_value.stream.return_value = [
+            MagicMock(id='gold', to_dict=MagicMock(return_value={'status': 'active'})),
+        ]
+        with patch.object(db, '_db', client), request_scope():
+            first = db.get_user_cards('u1', status='active', hydrate=False)
+            first[0]['status'] = 'changed'
+            self.assertEqual(db.get_user_cards('u1', status='active', hydrate=False)[0]['status'], 'active')
+            self.assertEqual(cards.where.return_value.stream.call_count, 1)
+            # Different arguments are a different lookup
+            db.get_user_cards('u1', status='inactive', hydrate=False)
+            self.assertEqual(cards.where.return_value.stream.call_count, 2)
+
+            db.update_card_details('u1', 'gold', {'anniversary_date': '2025-01-01'})
+            db.get_user_cards('u1', status='active', hydrate=False)
+            self.assertEqual(cards.where.return_value.stream.call_count, 3)
+
+    def test_middleware_scopes_each_request(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from core.middleware import FirestoreRequestScopeMiddleware
+        from core.services.request_scope import current_scope
+        seen = []
+
+        def view(request):
+            seen.append(current_scope())
+            return HttpResponse()
+
+        middleware = FirestoreRequestScopeMiddleware(view)
+        with self.settings(FIRESTORE_READ_HEADER=True):
+            response = middleware(RequestFactory().get('/'))
+            middleware(RequestFactory().post('/'))
+        self.assertEqual(response['X-Firestore-Reads'], '0 reads, 0 deduplicated')
+        self.assertTrue(seen[0].share_documents)
+        self.assertFalse(seen[1].share_documents)
+        self.assertIsNone(current_scope())
+
+
+class BenefitReminderCheckpointTest(TestCase):
+    def _command(self, checkpoint=None):
+        from io import StringIO
+        from unittest.mock import MagicMock
+        from django.core.management.base import OutputWrapper
+        from core.management.commands.check_unused_benefits import Command
+        command = Command()
+        command.stdout = OutputWrapper(StringIO())
+        command.should_send = True
+        command.stats = {'users': 0, 'with_cards': 0, 'emails': 0, 'errors': 0}
+        command._process_page = MagicMock()
+        client = MagicMock()
+        snapshot = MagicMock(exists=checkpoint is not None)
+        snapshot.to_dict.return_value = checkpoint
+        checkpoint_ref = client.collection.return_value.document.return_value
+        checkpoint_ref.get.return_value = snapshot
+        return command, client, checkpoint_ref
+
+    def _pages(self, *uids_per_page):
+        return [[{'id': uid} for uid in page] for page in uids_per_page]
+
+    def test_resume_starts_after_the_checkpoint(self):
+        from datetime import datetime, timedelta, timezone
+        from unittest.mock import patch
+        from core.services import db
+        now = datetime.now(timezone.utc)
+        # Started long ago but saved recently: still resumable
+        command, client, checkpoint_ref = self._command({
+            'last_uid': 'u2', 'started_at': now - timedelta(days=3), 'updated_at': now - timedelta(hours=1),
+            'completed': False, 'stats': {'users': 2},
+        })
+        with patch.object(db, '_db', client), \
+             patch.object(type(command), '_fetch_users_page', side_effect=self._pages(['u3'])) as fetch:
+            command._run_paged(page_size=2, workers=1, resume=True, max_seconds=0)
+        self.assertEqual(fetch.call_args.args, ('u2', 2))
+        self.assertTrue(checkpoint_ref.set.call_args.args[0]['completed'])
+        self.assertEqual(command.stats['users'], 2)
+
+    def test_checkpoint_not_saved_recently_expires(self):
+        from datetime import datetime, timedelta, timezone
+        from unittest.mock import patch
+        from core.services import db
+        now = datetime.now(timezone.utc)
+        command, client, _ = self._command({
+            'last_uid': 'u2', 'started_at': now - timedelta(days=2), 'updated_at': now - timedelta(hours=21),
+            'completed': False,
+        })
+        with patch.object(db, '_db', client), \
+             patch.object(type(command), '_fetch_users_page', side_effect=self._pages(['u1'])) as fetch:
+            command._run_paged(page_size=2, workers=1, resume=True, max_seconds=0)
+        self.assertEqual(fetch.call_args.args, (None, 2))
+
+    def test_deadline_queues_a_continuation_that_owns_the_run(self):
+        from unittest.mock import patch
+        from core.services import db
+        command, client, checkpoint_ref = self._command()
+        with patch.object(db, '_db', client), \
+             patch.object(db, 'enqueue_job', return_value='job-1') as enqueue, \
+             patch.object(type(command), '_fetch_users_page', side_effect=self._pages(['u1', 'u2'], ['u3', 'u4'])) as fetch:
+            command._run_paged(page_size=2, workers=1, resume=True, max_seconds=1e-9, continue_as_job=True)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(enqueue.call_args.args[0], 'benefit_reminders')
+        saved = checkpoint_ref.set.call_args.args[0]
+        self.assertEqual((saved['last_uid'], saved['continuation_job_id'], saved['completed']), ('u2', 'job-1', False))
+
+        # The next cron call leaves the run to the queued job...
+        command, client, _ = self._command(saved)
+        with patch.object(db, '_db', client), \
+             patch.object(db, 'get_job', return_value={'status': 'queued'}), \
+             patch.object(type(command), '_fetch_users_page') as fetch:
+            command._run_paged(page_size=2, workers=1, resume=True, max_seconds=0)
+        fetch.assert_not_called()
+
+        # ...which resumes after u2
+        command, client, _ = self._command(saved)
+        with patch.object(db, '_db', client), \
+             patch.object(db, 'get_job', return_value={'status': 'running'}), \
+             patch.object(type(command), '_fetch_users_page', side_effect=self._pages(['u3'])) as fetch:
+            command._run_paged(page_size=2, workers=1, resume=True, max_seconds=0, job_id='job-1')
+        self.assertEqual(fetch.call_args.args, ('u2', 2))
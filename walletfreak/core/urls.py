@@ -13,6 +13,7 @@ urlpatterns = [
     path('cron/email-cleanup/', views.run_cleanup_cron, name='cron_cleanup'),
     path('cron/update-premium-cards/', views.run_card_update_cron, name='cron_card_update'),
     path('cron/generate-blog/', views.run_blog_generation_cron, name='cron_blog'),
+    path('cron/run-jobs/', views.run_jobs_cron, name='cron_jobs'),
     
     # Pricing
     path('pricing/', views.pricing, name='pricing'),
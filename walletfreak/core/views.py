@@ -152,7 +152,15 @@ def run_notification_cron(request):
         # We catch output to return it
         from io import StringIO
         out = StringIO()
-        call_command('check_unused_benefits', send_email=True, stdout=out)
+        # Stay inside the request timeout; whatever is left continues as a queued job
+        call_command(
+            'check_unused_benefits',
+            send_email=True,
+            resume=True,
+            max_seconds=getattr(settings, 'BENEFIT_REMINDER_MAX_SECONDS', 240),
+            continue_as_job=True,
+            stdout=out,
+        )
         
         return JsonResponse({
             'status': 'success', 
@@ -185,6 +193,37 @@ def run_cleanup_cron(request):
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
+@csrf_exempt
+def run_jobs_cron(request):
+    """
+    Cron endpoint that runs due background jobs, including ones orphaned by a
+    worker that shut down mid-job.
+    Protected by secret.
+    Usage: /cron/run-jobs/?secret=YOUR_CRON_SECRET
+    """
+    import os
+    from django.core.management import call_command
+    from io import StringIO
+
+    cron_secret = os.environ.get('CRON_SECRET', 'temp_insecure_secret_change_me')
+    request_secret = request.GET.get('secret')
+
+    if request_secret != cron_secret:
+        return JsonResponse({'status': 'error', 'message': 'Unauthorized'}, status=401)
+
+    try:
+        out = StringIO()
+        call_command(
+            'run_jobs',
+            once=True,
+            prune_days=7,
+            max_seconds=getattr(settings, 'JOBS_CRON_MAX_SECONDS', 240),
+            stdout=out,
+        )
+        return JsonResponse({'status': 'success', 'output': out.getvalue()})
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
 @csrf_exempt
 def run_card_update_cron(request):
     """
@@ -200,6 +200,7 @@ def admin_run_bulk_update(request):
     premium_only = data.get('premium_only', False)
     batch_size = data.get('batch_size', 3)
     update_types = data.get('update_types', 'benefits,rates,bonus')
+    workers = data.get('workers', getattr(settings, 'GROK_PIPELINE_WORKERS', 4))
 
     from django.core.management import call_command
     from io import StringIO
@@ -210,6 +211,7 @@ def admin_run_bulk_update(request):
             'auto_seed': True,
             'update_types': update_types,
             'batch_size': batch_size,
+            'workers': workers,
             'stdout': out,
         }
         if card_ids: